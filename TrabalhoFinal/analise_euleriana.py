@@ -1,44 +1,151 @@
+"""
+Caminhos e circuitos eulerianos (percorrer cada conexão exatamente uma vez), p.ex.
+para rotas de varredura de ruas ou de recolha em circuito.
+Com dirigido=False cada conexão é uma aresta sem sentido. Com dirigido=True cada
+conexão de sentido único é um arco e cada bidirecional são dois arcos, um por
+sentido (p.ex. os dois lados da rua); por omissão usa-se o modo dirigido só se o
+grafo tiver conexões de sentido único.
+Tudo é O(V + E) e iterativo (sem recursão), sobre os arrays do Graph.
+"""
+import array
 from graph import Graph
-import collections
 
-# --- Funções para Caminho/Circuito Euleriano ---
+# --- Graus e conectividade ---
 
-def obter_graus_vertices(grafo_obj: Grafo) -> collections.defaultdict:
-    graus = collections.defaultdict(int)
-    for vertice in grafo_obj.obter_vertices():
-        graus[vertice] = len(grafo_obj.obter_vizinhos(vertice))
+def obter_graus_vertices(grafo_obj: Graph):
+    """{nome: grau} ignorando a direção; um lacete conta 2."""
+    graus = _graus_nao_dirigidos(grafo_obj)
+    return {nome: graus[v] for v, nome in enumerate(grafo_obj.names)}
+
+def obter_graus_dirigidos(grafo_obj: Graph):
+    """{nome: (grau de entrada, grau de saída)} no modo dirigido (bidirecional = um arco em cada sentido)."""
+    entrada, saida = _graus_dirigidos(grafo_obj)
+    return {nome: (entrada[v], saida[v]) for v, nome in enumerate(grafo_obj.names)}
+
+def ligado(grafo_obj: Graph) -> bool:
+    """True se todos os pontos com conexões estão na mesma componente (ignorando a direção)."""
+    offsets, targets, _ = grafo_obj.csr()
+    r_offsets, r_targets, _ = grafo_obj.reverse_csr()
+    n = grafo_obj.num_vertices()
+    com_arestas = [v for v in range(n) if offsets[v + 1] > offsets[v] or r_offsets[v + 1] > r_offsets[v]]
+    if not com_arestas: return True
+    visto = bytearray(n)
+    visto[com_arestas[0]] = 1
+    pilha = [com_arestas[0]]
+    while pilha:
+        u = pilha.pop()
+        for offs, alvos in ((offsets, targets), (r_offsets, r_targets)):
+            for i in range(offs[u], offs[u + 1]):
+                v = alvos[i]
+                if not visto[v]: visto[v] = 1; pilha.append(v)
+    return all(visto[v] for v in com_arestas)
+
+# --- Existência ---
+
+def analisar(grafo_obj: Graph, dirigido: bool = None):
+    """
+    (tipo, início): tipo é 'circuito', 'caminho' ou None (não há); início é o id do
+    ponto onde a rota tem de começar (qualquer ponto com conexões, num circuito).
+    """
+    dirigido = _modo(grafo_obj, dirigido)
+    n = grafo_obj.num_vertices()
+    if grafo_obj.num_edges() == 0: return (None, None) if n != 1 else ('caminho', 0)
+    if not ligado(grafo_obj): return None, None
+    if dirigido:
+        entrada, saida = _graus_dirigidos(grafo_obj)
+        inicios = [v for v in range(n) if saida[v] - entrada[v] == 1]
+        fins = [v for v in range(n) if entrada[v] - saida[v] == 1]
+        if any(abs(saida[v] - entrada[v]) > 1 for v in range(n)): return None, None
+        if not inicios and not fins: return 'circuito', next(v for v in range(n) if saida[v])
+        if len(inicios) == 1 and len(fins) == 1: return 'caminho', inicios[0]
+        return None, None
+    graus = _graus_nao_dirigidos(grafo_obj)
+    impares = [v for v in range(n) if graus[v] % 2]
+    if not impares: return 'circuito', next(v for v in range(n) if graus[v])
+    if len(impares) == 2: return 'caminho', impares[0]
+    return None, None
+
+def tem_caminho_euleriano(grafo_obj: Graph, dirigido: bool = None) -> bool:
+    """Um circuito também conta como caminho; um grafo com um só ponto e sem conexões também."""
+    return analisar(grafo_obj, dirigido)[0] is not None
+
+def tem_circuito_euleriano(grafo_obj: Graph, dirigido: bool = None) -> bool:
+    return analisar(grafo_obj, dirigido)[0] == 'circuito'
+
+# --- Construção (Hierholzer) ---
+
+def caminho_euleriano(grafo_obj: Graph, dirigido: bool = None):
+    """
+    Lista de nomes dos pontos pela ordem da rota (o circuito começa e acaba no mesmo
+    ponto), ou [] se não houver caminho euleriano.
+    """
+    dirigido = _modo(grafo_obj, dirigido)
+    tipo, inicio = analisar(grafo_obj, dirigido)
+    if tipo is None: return []
+    if grafo_obj.num_edges() == 0: return [grafo_obj.name_of(inicio)]
+    rota = _hierholzer_dirigido(grafo_obj, inicio) if dirigido else _hierholzer_nao_dirigido(grafo_obj, inicio)
+    names = grafo_obj.names
+    return [names[v] for v in rota]
+
+def _hierholzer_dirigido(grafo_obj: Graph, inicio: int):
+    """Os arcos do modo dirigido são exatamente o CSR de saída: basta um cursor por ponto."""
+    offsets, targets, _ = grafo_obj.csr()
+    proximo = array.array('i', offsets)
+    pilha, rota = [inicio], []
+    while pilha:
+        v = pilha[-1]
+        if proximo[v] < offsets[v + 1]:
+            pilha.append(targets[proximo[v]]); proximo[v] += 1
+        else: rota.append(pilha.pop())
+    rota.reverse()
+    return rota
+
+def _hierholzer_nao_dirigido(grafo_obj: Graph, inicio: int):
+    """Cada aresta aparece na lista das duas pontas; `usada` evita percorrê-la duas vezes."""
+    origens, destinos, _, _ = grafo_obj.edges()
+    n, m = grafo_obj.num_vertices(), len(origens)
+    # Lista de incidência (ids de arestas por ponto) em formato CSR
+    offsets = array.array('i', [0]) * (n + 1)
+    for e in range(m):
+        offsets[origens[e] + 1] += 1; offsets[destinos[e] + 1] += 1
+    for v in range(n): offsets[v + 1] += offsets[v]
+    incidentes = array.array('i', [0]) * (2 * m)
+    pos = array.array('i', offsets)
+    for e in range(m):
+        incidentes[pos[origens[e]]] = e; pos[origens[e]] += 1
+        incidentes[pos[destinos[e]]] = e; pos[destinos[e]] += 1
+    usada = bytearray(m)
+    proximo = array.array('i', offsets)
+    pilha, rota = [inicio], []
+    while pilha:
+        v = pilha[-1]
+        i, fim = proximo[v], offsets[v + 1]
+        while i < fim and usada[incidentes[i]]: i += 1
+        if i < fim:
+            e = incidentes[i]
+            usada[e] = 1; proximo[v] = i + 1
+            pilha.append(origens[e] ^ destinos[e] ^ v)  # a outra ponta (num lacete, o próprio v)
+        else:
+            proximo[v] = i; rota.append(pilha.pop())
+    rota.reverse()
+    return rota
+
+# --- Internos ---
+
+def _modo(grafo_obj: Graph, dirigido):
+    return (0 in grafo_obj.edges()[3]) if dirigido is None else dirigido
+
+def _graus_nao_dirigidos(grafo_obj: Graph):
+    origens, destinos, _, _ = grafo_obj.edges()
+    graus = array.array('i', [0]) * grafo_obj.num_vertices()
+    for u in origens: graus[u] += 1
+    for v in destinos: graus[v] += 1
     return graus
 
-def tem_caminho_euleriano(grafo_obj: Grafo) -> bool:
-    if not grafo_obj.obter_vertices():
-        return False
-    tem_arestas = False
-    for v in grafo_obj.obter_vertices():
-        if grafo_obj.obter_vizinhos(v):
-            tem_arestas = True
-            break
-    if not tem_arestas and len(grafo_obj.obter_vertices()) > 1:
-        return False
-    if not tem_arestas and len(grafo_obj.obter_vertices()) == 1:
-        return True
-
-
-    graus = obter_graus_vertices(grafo_obj)
-    contagem_grau_impar = 0
-    for vertice in grafo_obj.obter_vertices():
-        if graus[vertice] % 2 != 0:
-            contagem_grau_impar += 1
-    return contagem_grau_impar == 0 or contagem_grau_impar == 2
-
-def tem_circuito_euleriano(grafo_obj: Grafo) -> bool:
-    if not grafo_obj.obter_vertices():
-        return False
-
-    graus = obter_graus_vertices(grafo_obj)
-    if not any(g > 0 for g in graus.values()):
-        return False
-
-    for vertice in grafo_obj.obter_vertices():
-        if graus[vertice] % 2 != 0:
-            return False
-    return True
\ No newline at end of file
+def _graus_dirigidos(grafo_obj: Graph):
+    offsets, _, _ = grafo_obj.csr()
+    r_offsets, _, _ = grafo_obj.reverse_csr()
+    n = grafo_obj.num_vertices()
+    saida = [offsets[v + 1] - offsets[v] for v in range(n)]
+    entrada = [r_offsets[v + 1] - r_offsets[v] for v in range(n)]
+    return entrada, saida
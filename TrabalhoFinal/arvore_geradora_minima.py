@@ -1,45 +1,190 @@
-from grafo import Grafo
+"""
+Árvore (floresta) geradora mínima sobre o Graph, ignorando a direção das conexões.
+kruskal() ordena as arestas uma vez (com NumPy, se existir) e junta componentes
+com uma union-find em arrays; prim() cresce a árvore a partir de cada componente
+com um heap sobre a adjacência CSR, o que evita ordenar todas as arestas em grafos
+densos. Ambas retornam (agm, custo_total), com agm = [{'u', 'v', 'weight'}, ...].
+arvore_steiner() liga só um subconjunto de pontos (p.ex. os depósitos) com a
+aproximação de Mehlhorn (custo no máximo 2x o ótimo), no mesmo formato.
+"""
+import array
 import heapq
+import math
+from graph import Graph
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional; sem ele a ordenação é feita com sorted()
+    np = None
 
 class DSU:
-    def __init__(self, vertices):
-        self.pai = {v: v for v in vertices}
-        self.rank = {v: 0 for v in vertices}
+    """Union-find em arrays, com compressão por divisão de caminho e união por tamanho (sem recursão)."""
+    def __init__(self, n):
+        self.pai = array.array('i', range(n))
+        self.tamanho = array.array('i', [1]) * n
 
     def encontrar(self, item):
-        if self.pai[item] == item:
-            return item
-        self.pai[item] = self.encontrar(self.pai[item])
-        return self.pai[item]
-
-    def unir(self, raiz_conjunto1, raiz_conjunto2):
-        if self.rank[raiz_conjunto1] < self.rank[raiz_conjunto2]:
-            self.pai[raiz_conjunto1] = raiz_conjunto2
-        elif self.rank[raiz_conjunto1] > self.rank[raiz_conjunto2]:
-            self.pai[raiz_conjunto2] = raiz_conjunto1
-        else:
-            self.pai[raiz_conjunto2] = raiz_conjunto1
-            self.rank[raiz_conjunto1] += 1
-
-def kruskal(grafo_obj: Grafo):
+        pai = self.pai
+        while pai[item] != item:
+            pai[item] = pai[pai[item]]
+            item = pai[item]
+        return item
+
+    def unir(self, a, b) -> bool:
+        """Junta os conjuntos de `a` e `b`; False se já eram o mesmo."""
+        raiz_a, raiz_b = self.encontrar(a), self.encontrar(b)
+        if raiz_a == raiz_b: return False
+        if self.tamanho[raiz_a] < self.tamanho[raiz_b]: raiz_a, raiz_b = raiz_b, raiz_a
+        self.pai[raiz_b] = raiz_a
+        self.tamanho[raiz_a] += self.tamanho[raiz_b]
+        return True
+
+def ordem_por_peso(pesos):
+    """Índices das arestas por peso crescente (estável); `pesos` é o array('d') de Graph.edges()."""
+    if np is not None and len(pesos):
+        return np.argsort(np.frombuffer(pesos, dtype=np.float64), kind='stable').tolist()
+    return sorted(range(len(pesos)), key=pesos.__getitem__)
+
+def kruskal(grafo_obj: Graph):
+    """
+    Árvore (floresta) geradora mínima sobre os arrays de arestas do grafo.
+    Cada aresta é considerada uma única vez, ignorando a direção.
+    """
+    agm = []
+    custo_total = 0
+    origens, destinos, pesos, _ = grafo_obj.edges()
+    n = grafo_obj.num_vertices()
+    dsu = DSU(n)
+    pai, tamanho = dsu.pai, dsu.tamanho
+    nomes = grafo_obj.names
+
+    for e in ordem_por_peso(pesos):
+        # encontrar/unir em linha: é o ciclo quente
+        a = origens[e]
+        while pai[a] != a: pai[a] = pai[pai[a]]; a = pai[a]
+        b = destinos[e]
+        while pai[b] != b: pai[b] = pai[pai[b]]; b = pai[b]
+        if a == b: continue
+        if tamanho[a] < tamanho[b]: a, b = b, a
+        pai[b] = a; tamanho[a] += tamanho[b]
+        agm.append({'u': nomes[origens[e]], 'v': nomes[destinos[e]], 'weight': pesos[e]})
+        custo_total += pesos[e]
+        if len(agm) == n - 1: break
+    return agm, custo_total
+
+def prim(grafo_obj: Graph):
+    """
+    Mesmo resultado (em custo) que kruskal(), com Prim e um heap: cada componente
+    cresce a partir do seu primeiro vértice e só se empilha um vértice quando a sua
+    melhor ligação à árvore melhora. Conexões de sentido único entram pelas duas
+    pontas (CSR transposto), o que só é preciso se existirem.
+    """
     agm = []
     custo_total = 0
-    arestas = []
-
-    pares_processados = set()
-    for u in grafo_obj.obter_vertices():
-        for info_aresta in grafo_obj.obter_vizinhos(u):
-            v = info_aresta['node']
-            peso = info_aresta['weight']
-            if tuple(sorted((u, v))) not in pares_processados:
-                arestas.append((peso, u, v))
-                pares_processados.add(tuple(sorted((u,v))))
-    arestas.sort()
-    
-    dsu = DSU(grafo_obj.obter_vertices())
-    
-    for peso, u, v in arestas:
-        if dsu.encontrar(u) != dsu.encontrar(v):
-            dsu.unir(dsu.encontrar(u), dsu.encontrar(v))
-            agm.append({'u': u, 'v': v, 'weight': peso})
-            custo_total += peso
\ No newline at end of file
+    n = grafo_obj.num_vertices()
+    adjacencias = [grafo_obj.csr()]
+    if 0 in grafo_obj.edges()[3]: adjacencias.append(grafo_obj.reverse_csr())
+    nomes = grafo_obj.names
+    na_arvore = bytearray(n)
+    melhor = [float('inf')] * n
+    ligacao = [-1] * n
+
+    for raiz in range(n):
+        if na_arvore[raiz]: continue
+        heap = [(0.0, raiz)]
+        while heap:
+            peso, u = heapq.heappop(heap)
+            if na_arvore[u]: continue
+            na_arvore[u] = 1
+            if ligacao[u] >= 0:
+                agm.append({'u': nomes[ligacao[u]], 'v': nomes[u], 'weight': peso})
+                custo_total += peso
+            for offsets, alvos, pesos in adjacencias:
+                for i in range(offsets[u], offsets[u + 1]):
+                    v, w = alvos[i], pesos[i]
+                    if w < melhor[v] and not na_arvore[v]:
+                        melhor[v] = w; ligacao[v] = u
+                        heapq.heappush(heap, (w, v))
+    return agm, custo_total
+
+def arvore_steiner(grafo_obj: Graph, terminais):
+    """
+    Rede de custo mínimo (aproximada) que liga os pontos `terminais`, podendo passar
+    por outros pontos, ignorando a direção das conexões (algoritmo de Mehlhorn):
+    1. um Dijkstra com todos os terminais como origem dá, para cada ponto, o terminal
+       mais próximo (a sua região de Voronoi), a distância e o predecessor;
+    2. cada conexão entre regiões diferentes liga esses dois terminais com custo
+       d(u) + peso + d(v), e a AGM (Kruskal) destas ligações escolhe as que ficam;
+    3. cada ligação escolhida é expandida nos caminhos mínimos até aos seus terminais.
+    Nunca constrói a matriz de distâncias entre terminais: O(E log V) no total.
+    Terminais sem caminho entre si ficam em árvores separadas; nomes desconhecidos são ignorados.
+    """
+    n = grafo_obj.num_vertices()
+    fontes = {v for v in map(grafo_obj.index_of, terminais) if v is not None}
+    if len(fontes) < 2: return [], 0
+    distancia, regiao, predecessor, peso_pred = _dijkstra_multiorigem(grafo_obj, fontes)
+
+    # 2. Melhor conexão entre cada par de regiões vizinhas
+    origens, destinos, pesos, _ = grafo_obj.edges()
+    melhores = {}  # (terminal menor, terminal maior) -> (custo, aresta)
+    for e in range(len(pesos)):
+        u, v = origens[e], destinos[e]
+        a, b = regiao[u], regiao[v]
+        if a == b or a < 0 or b < 0: continue
+        chave = (a, b) if a < b else (b, a)
+        custo = distancia[u] + pesos[e] + distancia[v]
+        anterior = melhores.get(chave)
+        if anterior is None or custo < anterior[0]: melhores[chave] = (custo, e)
+    ligacoes = list(melhores.items())
+    dsu = DSU(n)
+    escolhidas = []
+    for i in ordem_por_peso(array.array('d', (custo for _, (custo, _) in ligacoes))):
+        (a, b), (_, e) = ligacoes[i]
+        if dsu.unir(a, b):
+            escolhidas.append(e)
+            if len(escolhidas) == len(fontes) - 1: break
+
+    # 3. Expansão: a conexão entre regiões e os caminhos de cada ponta até ao seu terminal.
+    # Os caminhos pertencem à floresta de caminhos mínimos e cada região liga-se às outras
+    # só pelas ligações da AGM, por isso o resultado já é uma árvore com folhas terminais.
+    nomes = grafo_obj.names
+    arvore, custo_total = [], 0
+    no_caminho = bytearray(n)  # pontos cuja aresta para o predecessor já foi incluída
+    for e in escolhidas:
+        arvore.append({'u': nomes[origens[e]], 'v': nomes[destinos[e]], 'weight': pesos[e]})
+        custo_total += pesos[e]
+        for v in (origens[e], destinos[e]):
+            while predecessor[v] >= 0 and not no_caminho[v]:
+                no_caminho[v] = 1
+                arvore.append({'u': nomes[predecessor[v]], 'v': nomes[v], 'weight': peso_pred[v]})
+                custo_total += peso_pred[v]
+                v = predecessor[v]
+    return arvore, custo_total
+
+def rede_entre_depositos(grafo_obj: Graph, atributos, tipo: str = "Depósito"):
+    """arvore_steiner() com os pontos de `tipo` (node_attributes: nome -> {'type': ...}) como terminais."""
+    return arvore_steiner(grafo_obj, [nome for nome, a in atributos.items() if a.get('type') == tipo])
+
+def _dijkstra_multiorigem(grafo_obj: Graph, fontes):
+    """Listas (distância, terminal mais próximo, predecessor, peso da aresta ao predecessor) por ponto; -1 se nenhum."""
+    n = grafo_obj.num_vertices()
+    adjacencias = [grafo_obj.csr()]
+    if 0 in grafo_obj.edges()[3]: adjacencias.append(grafo_obj.reverse_csr())
+    distancia, regiao = [math.inf] * n, [-1] * n
+    predecessor, peso_pred = [-1] * n, [0.0] * n
+    heap = []
+    for f in fontes:
+        distancia[f] = 0.0; regiao[f] = f
+        heap.append((0.0, f))
+    heapq.heapify(heap)
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > distancia[u]: continue
+        for offsets, alvos, pesos in adjacencias:
+            for i in range(offsets[u], offsets[u + 1]):
+                v, nd = alvos[i], d + pesos[i]
+                if nd < distancia[v]:
+                    distancia[v] = nd; regiao[v] = regiao[u]
+                    predecessor[v] = u; peso_pred[v] = pesos[i]
+                    heapq.heappush(heap, (nd, v))
+    return distancia, regiao, predecessor, peso_pred
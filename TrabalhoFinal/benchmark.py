@@ -0,0 +1,118 @@
+"""
+Benchmarks dos algoritmos de grafos sobre redes sintéticas.
+Uso: python benchmark.py [dijkstra|a_estrela|bidirecional|agm]
+"""
+import random
+import sys
+import time
+from graph import Graph
+from caminho_mais_curto import dijkstra, dijkstra_bidirecional, HeuristicaEuclidiana, _a_estrela_ids
+from arvore_geradora_minima import kruskal, prim
+
+def gerar_grafo_grelha(lado: int, seed: int = 42) -> Graph:
+    """
+    Grelha lado x lado com pontos a 10 unidades e pesos entre 10 e 15 km,
+    aproximando uma malha rodoviária. Coordenadas em coords_grelha().
+    """
+    rng = random.Random(seed)
+    g = Graph()
+    for i in range(lado):
+        for j in range(lado):
+            g.add_vertex(f"P{i}_{j}")
+    for i in range(lado):
+        for j in range(lado):
+            if i + 1 < lado: g.add_edge(f"P{i}_{j}", f"P{i+1}_{j}", rng.uniform(10, 15))
+            if j + 1 < lado: g.add_edge(f"P{i}_{j}", f"P{i}_{j+1}", rng.uniform(10, 15))
+    return g
+
+def gerar_grafo_denso(n: int, densidade: float, seed: int = 42) -> Graph:
+    """n pontos com cada par ligado com probabilidade `densidade` (pesos entre 10 e 500 km)."""
+    rng = random.Random(seed)
+    g = Graph()
+    for i in range(n): g.add_vertex(f"D{i}")
+    for i in range(n):
+        for j in range(i + 1, n):
+            if rng.random() < densidade: g.add_edge(f"D{i}", f"D{j}", rng.uniform(10, 500))
+    return g
+
+def coords_grelha(lado: int):
+    return {f"P{i}_{j}": (10 * i, 10 * j) for i in range(lado) for j in range(lado)}
+
+def _pares_proximos(lado: int, n_consultas: int, raio: int, rng):
+    pares = []
+    for _ in range(n_consultas):
+        i, j = rng.randrange(lado), rng.randrange(lado)
+        k, l = min(lado - 1, i + rng.randint(0, raio)), min(lado - 1, j + rng.randint(0, raio))
+        pares.append((f"P{i}_{j}", f"P{k}_{l}"))
+    return pares
+
+def _pares_aleatorios(lado: int, n_consultas: int, rng):
+    return [(f"P{rng.randrange(lado)}_{rng.randrange(lado)}", f"P{rng.randrange(lado)}_{rng.randrange(lado)}")
+            for _ in range(n_consultas)]
+
+def medir(funcao, consultas) -> float:
+    """Latência média por consulta, em milissegundos."""
+    inicio = time.perf_counter()
+    for origem, destino in consultas:
+        funcao(origem, destino)
+    return (time.perf_counter() - inicio) * 1000 / max(1, len(consultas))
+
+def benchmark_dijkstra(lados=(30, 100, 200, 300), n_consultas=200):
+    print(f"{'vértices':>10} {'arestas':>10} {'próximos (ms)':>15} {'aleatórios (ms)':>16}")
+    for lado in lados:
+        g = gerar_grafo_grelha(lado)
+        g.csr()
+        rng = random.Random(7)
+        proximos = _pares_proximos(lado, n_consultas, 5, rng)
+        aleatorios = _pares_aleatorios(lado, max(10, n_consultas // 10), rng)
+        t_prox = medir(lambda o, d: dijkstra(g, o, d), proximos)
+        t_alea = medir(lambda o, d: dijkstra(g, o, d), aleatorios)
+        print(f"{g.num_vertices():>10} {g.num_edges():>10} {t_prox:>15.3f} {t_alea:>16.3f}")
+
+def benchmark_a_estrela(lados=(100, 200, 300), n_consultas=30):
+    """Compara vértices assentados e tempo do A* euclidiano com h = 0 (Dijkstra)."""
+    sem_heuristica = lambda u, alvo: 0
+    print(f"{'vértices':>10} {'assent. dijkstra':>17} {'assent. A*':>11} {'dijkstra (ms)':>14} {'A* (ms)':>9}")
+    for lado in lados:
+        g = gerar_grafo_grelha(lado)
+        h = HeuristicaEuclidiana(g, coords_grelha(lado))
+        csr = g.csr()
+        consultas = [(g.index_of(o), g.index_of(d)) for o, d in _pares_aleatorios(lado, n_consultas, random.Random(7))]
+        assent_d = sum(_a_estrela_ids(csr, o, d, sem_heuristica)[2] for o, d in consultas)
+        assent_a = sum(_a_estrela_ids(csr, o, d, h)[2] for o, d in consultas)
+        t_d = medir(lambda o, d: _a_estrela_ids(csr, o, d, sem_heuristica), consultas)
+        t_a = medir(lambda o, d: _a_estrela_ids(csr, o, d, h), consultas)
+        print(f"{g.num_vertices():>10} {assent_d // n_consultas:>17} {assent_a // n_consultas:>11} {t_d:>14.3f} {t_a:>9.3f}")
+
+def benchmark_bidirecional(lados=(100, 200, 300), n_consultas=20):
+    print(f"{'vértices':>10} {'dijkstra (ms)':>14} {'bidirecional (ms)':>18}")
+    for lado in lados:
+        g = gerar_grafo_grelha(lado)
+        g.csr(); g.reverse_csr()
+        consultas = _pares_aleatorios(lado, n_consultas, random.Random(7))
+        t_d = medir(lambda o, d: dijkstra(g, o, d), consultas)
+        t_b = medir(lambda o, d: dijkstra_bidirecional(g, o, d), consultas)
+        print(f"{g.num_vertices():>10} {t_d:>14.3f} {t_b:>18.3f}")
+
+def benchmark_agm(lados=(100, 200, 300), densos=((500, 0.5), (1000, 0.5))):
+    """Kruskal contra Prim em grelhas (esparsas, como a rede) e em grafos densos; tempos com o CSR já construído."""
+    print(f"{'vértices':>10} {'arestas':>10} {'kruskal (ms)':>13} {'prim (ms)':>10} {'custo igual':>12}")
+    grafos = [gerar_grafo_grelha(lado) for lado in lados] + [gerar_grafo_denso(n, d) for n, d in densos]
+    for g in grafos:
+        g.csr(); g.reverse_csr()
+        inicio = time.perf_counter(); _, custo_k = kruskal(g); t_k = (time.perf_counter() - inicio) * 1000
+        inicio = time.perf_counter(); _, custo_p = prim(g); t_p = (time.perf_counter() - inicio) * 1000
+        print(f"{g.num_vertices():>10} {g.num_edges():>10} {t_k:>13.1f} {t_p:>10.1f} {str(abs(custo_k - custo_p) < 1e-6):>12}")
+
+BENCHMARKS = {
+    'dijkstra': benchmark_dijkstra,
+    'a_estrela': benchmark_a_estrela,
+    'bidirecional': benchmark_bidirecional,
+    'agm': benchmark_agm,
+}
+
+if __name__ == "__main__":
+    nomes = sys.argv[1:] or list(BENCHMARKS)
+    for nome in nomes:
+        print(f"\n=== {nome} ===")
+        BENCHMARKS[nome]()
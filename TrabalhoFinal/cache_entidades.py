@@ -0,0 +1,184 @@
+"""
+Cache em memória das leituras de camiões, motoristas e cargas.
+As listas e as consultas por id passam pela cache (read-through) e expiram ao
+fim de `ttl` segundos. As escritas feitas através dela vão diretas à BD
+(write-through) e invalidam as entradas afetadas; alterações feitas por outros
+clientes chegam pela sincronização (invalidar_deltas) ou pelo TTL.
+As linhas devolvidas são partilhadas: tratar como só de leitura.
+Guardam-se no máximo MAX_LISTAS listas (a menos usada recentemente sai primeiro);
+as páginas de cargas a seguir à primeira não são guardadas.
+"""
+from collections import OrderedDict
+import threading
+import time
+import database_manager as db_manager
+
+TTL_PADRAO = 30.0  # segundos
+MAX_LISTAS = 64    # combinações de tabela/filtros guardadas ao mesmo tempo
+
+# As linhas de cargas mostram a matrícula do camião e o nome do motorista
+_DEPENDENTES = {'camioes': ('cargas',), 'motoristas': ('cargas',), 'cargas': ()}
+_FUNCOES_POR_ID = {
+    'camioes': ('obter_camiao_por_id_db',),
+    'motoristas': ('obter_motorista_por_id_db',),
+    'cargas': ('obter_carga_por_id_db_detalhado', 'obter_carga_por_id_db'),
+}
+
+class CacheEntidades:
+    """
+    Pode ser usada a partir de várias threads. Uma leitura que corre enquanto
+    a tabela é invalidada não guarda o resultado (pode já estar desatualizado).
+    """
+    def __init__(self, ttl: float = TTL_PADRAO, relogio=time.monotonic, max_listas: int = MAX_LISTAS):
+        self.ttl = ttl
+        self.max_listas = max_listas
+        self.relogio = relogio
+        self.acertos = 0
+        self.falhas = 0
+        self._listas = OrderedDict()                 # (tabela, parâmetros) -> (expira, linhas), da menos para a mais usada
+        self._por_id = {f: {} for fs in _FUNCOES_POR_ID.values() for f in fs}  # função -> {id: (expira, linha)}
+        self._versoes = dict.fromkeys(_DEPENDENTES, 0)
+        self._lock = threading.Lock()
+
+    # --- Leituras ---
+
+    def obter_todos_camioes_db(self):
+        return self._lista('camioes', db_manager.obter_todos_camioes_db, 'obter_camiao_por_id_db')
+
+    def obter_camiao_por_id_db(self, camiao_id: int):
+        return self._linha('camioes', db_manager.obter_camiao_por_id_db, camiao_id)
+
+    def obter_todos_motoristas_db(self):
+        return self._lista('motoristas', db_manager.obter_todos_motoristas_db, 'obter_motorista_por_id_db')
+
+    def obter_motorista_por_id_db(self, motorista_id: int):
+        return self._linha('motoristas', db_manager.obter_motorista_por_id_db, motorista_id)
+
+    def obter_todas_cargas_db_detalhado(self):
+        return self._lista('cargas', db_manager.obter_todas_cargas_db_detalhado, 'obter_carga_por_id_db_detalhado')
+
+    def obter_cargas_filtradas_db(self, **filtro):
+        """
+        Cada combinação de filtros é uma entrada própria, invalidada com a tabela. As páginas
+        seguintes (`apos`) vão sempre à BD: quem pagina raramente volta à mesma página.
+        """
+        if filtro.get('apos') is not None: return db_manager.obter_cargas_filtradas_db(**filtro)
+        parametros = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in filtro.items()))
+        return self._lista('cargas', lambda: db_manager.obter_cargas_filtradas_db(**filtro),
+                           'obter_carga_por_id_db_detalhado', parametros)
+
+    def obter_carga_por_id_db_detalhado(self, carga_id: int):
+        return self._linha('cargas', db_manager.obter_carga_por_id_db_detalhado, carga_id)
+
+    def obter_carga_por_id_db(self, carga_id: int):
+        return self._linha('cargas', db_manager.obter_carga_por_id_db, carga_id)
+
+    # --- Escritas (write-through) ---
+
+    def adicionar_camiao_db(self, *args, **kwargs):
+        return self._escrever('camioes', None, db_manager.adicionar_camiao_db(*args, **kwargs))
+
+    def atualizar_camiao_db(self, cam_id: int, dados):
+        return self._escrever('camioes', cam_id, db_manager.atualizar_camiao_db(cam_id, dados))
+
+    def remover_camiao_db(self, cam_id: int):
+        return self._escrever('camioes', cam_id, db_manager.remover_camiao_db(cam_id))
+
+    def adicionar_motorista_db(self, *args, **kwargs):
+        return self._escrever('motoristas', None, db_manager.adicionar_motorista_db(*args, **kwargs))
+
+    def atualizar_motorista_db(self, mot_id: int, dados):
+        return self._escrever('motoristas', mot_id, db_manager.atualizar_motorista_db(mot_id, dados))
+
+    def remover_motorista_db(self, mot_id: int):
+        return self._escrever('motoristas', mot_id, db_manager.remover_motorista_db(mot_id))
+
+    def adicionar_carga_db(self, *args, **kwargs):
+        return self._escrever('cargas', None, db_manager.adicionar_carga_db(*args, **kwargs))
+
+    def adicionar_cargas_bulk(self, cargas):
+        return self._escrever('cargas', None, db_manager.adicionar_cargas_bulk(cargas))
+
+    def atualizar_carga_db(self, carga_id: int, dados):
+        return self._escrever('cargas', carga_id, db_manager.atualizar_carga_db(carga_id, dados))
+
+    def remover_carga_db(self, carga_id: int):
+        return self._escrever('cargas', carga_id, db_manager.remover_carga_db(carga_id))
+
+    # --- Invalidação ---
+
+    def invalidar(self, tabela=None, ids=None):
+        """Esquece `ids` de `tabela` (ou a tabela toda, ou tudo se tabela=None) e as listas respetivas."""
+        with self._lock:
+            for t in ([tabela] if tabela else list(_DEPENDENTES)):
+                self._invalidar(t, ids)
+
+    def invalidar_deltas(self, deltas):
+        """Aplica as deltas de SincronizadorBD.alteracoes(); mudanças em pontos afetam nomes em camiões e cargas."""
+        with self._lock:
+            for tabela, delta in deltas.items():
+                if tabela in _DEPENDENTES:
+                    self._invalidar(tabela, [l['id'] for l in delta.alterados] + list(delta.removidos))
+                elif tabela == 'pontos':
+                    self._invalidar('camioes'); self._invalidar('cargas')
+
+    def estatisticas(self):
+        with self._lock:
+            return {'acertos': self.acertos, 'falhas': self.falhas,
+                    'listas': len(self._listas), 'linhas': sum(len(d) for d in self._por_id.values())}
+
+    # --- Internos ---
+
+    def _lista(self, tabela, funcao, funcao_por_id, parametros=()):
+        """Lista (completa ou filtrada); as linhas também servem as consultas por id de `funcao_por_id`."""
+        chave = (tabela, parametros)
+        with self._lock:
+            entrada = self._listas.get(chave)
+            if entrada is not None and entrada[0] > self.relogio():
+                self.acertos += 1
+                self._listas.move_to_end(chave)
+                return entrada[1]
+            self.falhas += 1
+            versao = self._versoes[tabela]
+        linhas = funcao()
+        with self._lock:
+            if linhas is not None and self._versoes[tabela] == versao:
+                agora = self.relogio()
+                expira = agora + self.ttl
+                for c in [c for c, (e, _) in self._listas.items() if e <= agora]: del self._listas[c]
+                self._listas[chave] = (expira, linhas)
+                self._listas.move_to_end(chave)
+                while len(self._listas) > self.max_listas: self._listas.popitem(last=False)
+                self._por_id[funcao_por_id].update((linha['id'], (expira, linha)) for linha in linhas)
+        return linhas
+
+    def _linha(self, tabela, funcao, registo_id):
+        cache = self._por_id[funcao.__name__]
+        with self._lock:
+            entrada = cache.get(registo_id)
+            if entrada is not None and entrada[0] > self.relogio():
+                self.acertos += 1
+                return entrada[1]
+            self.falhas += 1
+            versao = self._versoes[tabela]
+        linha = funcao(registo_id)
+        with self._lock:
+            if linha is not None and self._versoes[tabela] == versao:
+                cache[registo_id] = (self.relogio() + self.ttl, linha)
+        return linha
+
+    def _escrever(self, tabela, registo_id, resultado):
+        with self._lock:
+            self._invalidar(tabela, None if registo_id is None else [registo_id])
+        return resultado
+
+    def _invalidar(self, tabela, ids=None):
+        for funcao in _FUNCOES_POR_ID[tabela]:
+            if ids is None: self._por_id[funcao].clear()
+            else:
+                for registo_id in ids: self._por_id[funcao].pop(registo_id, None)
+        for t in (tabela,) + _DEPENDENTES[tabela]:
+            self._versoes[t] += 1
+            for chave in [c for c in self._listas if c[0] == t]: del self._listas[chave]
+            if t != tabela:
+                for funcao in _FUNCOES_POR_ID[t]: self._por_id[funcao].clear()
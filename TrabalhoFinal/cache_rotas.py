@@ -0,0 +1,158 @@
+import collections
+import math
+import threading
+from graph import Graph
+from caminho_mais_curto import dijkstra, dijkstra_arvore, a_estrela, dijkstra_bidirecional
+
+class CacheRotas:
+    """
+    Cache de caminhos mínimos em torno de `dijkstra`.
+    - Pares (origem, destino) ficam numa LRU com tamanho máximo configurável.
+    - Origens quentes (ex.: depósitos) guardam a árvore completa de caminhos
+      mínimos, respondendo a qualquer destino sem nova busca.
+    As alterações ao mapa invalidam só as entradas que podem ter mudado.
+    As falhas de pares usam `motor` (por omissão dijkstra_bidirecional); se
+    houver `heuristica` admissível e o motor não se declarar `pronto`
+    (ex.: MotorCH a reconstruir a hierarquia), usa-se A*.
+    Pode ser consultada de várias threads: as buscas correm fora do lock e o
+    resultado só é guardado se nenhuma invalidação ocorreu entretanto.
+    """
+    def __init__(self, graph: Graph, tamanho_max: int = 1024, origens_quentes=(), heuristica=None,
+                 motor=dijkstra_bidirecional):
+        self.graph = graph
+        self.heuristica = heuristica
+        self.motor = motor
+        self.tamanho_max = tamanho_max
+        self._pares = collections.OrderedDict()   # (o, d) -> (dist, caminho)
+        self._origens_quentes = set(origens_quentes)
+        self._arvores = {}                        # origem -> (distâncias, predecessores)
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.RLock()
+        self._versao = 0                          # incrementada a cada invalidação
+
+    def rota(self, origem: str, destino: str):
+        """Mesmo contrato de dijkstra: (distância, caminho) ou (math.inf, [])."""
+        if origem not in self.graph or destino not in self.graph:
+            return dijkstra(self.graph, origem, destino)
+
+        chave = (origem, destino)
+        with self._lock:
+            graph, versao = self.graph, self._versao
+            quente = origem in self._origens_quentes
+            if quente:
+                arvore = self._arvores.get(origem)
+                if arvore is not None:
+                    self.acertos += 1
+                    return _caminho_da_arvore(arvore, destino)
+            else:
+                resultado = self._pares.get(chave)
+                if resultado is not None:
+                    self.acertos += 1
+                    self._pares.move_to_end(chave)
+                    return resultado
+            self.falhas += 1
+
+        if quente:
+            arvore = dijkstra_arvore(graph, origem)
+            with self._lock:
+                if self._versao == versao: self._arvores[origem] = arvore
+            return _caminho_da_arvore(arvore, destino)
+        if self.heuristica is not None and not getattr(self.motor, 'pronto', False) and self.heuristica.admissivel:
+            resultado = a_estrela(graph, origem, destino, self.heuristica)
+        else:
+            resultado = self.motor(graph, origem, destino)
+        with self._lock:
+            if self._versao == versao:
+                self._pares[chave] = resultado
+                if len(self._pares) > self.tamanho_max:
+                    self._pares.popitem(last=False)
+        return resultado
+
+    def definir_origens_quentes(self, origens):
+        origens = set(origens)
+        with self._lock:
+            self._origens_quentes = origens
+            for origem in list(self._arvores):
+                if origem not in self._origens_quentes: del self._arvores[origem]
+
+    def adicionar_origem_quente(self, origem: str):
+        with self._lock:
+            self._origens_quentes.add(origem)
+            for chave in [c for c in self._pares if c[0] == origem]:
+                del self._pares[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._versao += 1
+            self._pares.clear(); self._arvores.clear()
+
+    def ao_adicionar_vertice(self, nome: str):
+        """Um ponto novo ainda isolado não altera nenhum caminho existente."""
+        with self._lock:
+            self._versao += 1
+            for chave in [c for c in self._pares if nome in c]:
+                del self._pares[chave]
+
+    def ao_adicionar_aresta(self, u: str, v: str, peso: float, bidirectional: bool = True):
+        with self._lock:
+            self._versao += 1
+            self._invalidar_aresta(u, v, peso, bidirectional)
+
+    def _invalidar_aresta(self, u, v, peso, bidirectional):
+        arcos = [(u, v)] + ([(v, u)] if bidirectional else [])
+        for origem, (dist, _) in list(self._arvores.items()):
+            # Exato: a árvore só muda se a nova aresta encurtar algum vértice.
+            if any(dist.get(a, math.inf) + peso < dist.get(b, math.inf) for a, b in arcos):
+                del self._arvores[origem]
+        for chave, (dist, _) in list(self._pares.items()):
+            # d(o,u) >= 0 e d(v,d) >= 0, logo só caminhos mais longos que o peso podem melhorar.
+            if peso < dist:
+                del self._pares[chave]
+
+    def ao_recarregar(self, novo_grafo: Graph):
+        """Compara o grafo antigo com o recarregado e aplica só a diferença."""
+        antigos, novos = _arcos(self.graph), _arcos(novo_grafo)
+        removidos = {a for a, w in antigos.items() if novos.get(a, math.inf) > w}
+        adicionados = [(a, w) for a, w in novos.items() if w < antigos.get(a, math.inf)]
+        with self._lock:
+            self._versao += 1
+            self.graph = novo_grafo
+            for chave, (_, caminho) in list(self._pares.items()):
+                if chave[0] not in novo_grafo or chave[1] not in novo_grafo or \
+                        any((caminho[i], caminho[i + 1]) in removidos for i in range(len(caminho) - 1)):
+                    del self._pares[chave]
+            for origem, (_, pred) in list(self._arvores.items()):
+                if origem not in novo_grafo or any(pred.get(b) == a for a, b in removidos):
+                    del self._arvores[origem]
+            for (a, b), peso in adicionados:
+                self._invalidar_aresta(a, b, peso, bidirectional=False)
+
+    def estatisticas(self):
+        with self._lock:
+            return {'acertos': self.acertos, 'falhas': self.falhas,
+                    'pares': len(self._pares), 'arvores': len(self._arvores)}
+
+def _caminho_da_arvore(arvore, destino):
+    dist, pred = arvore
+    if destino not in dist:
+        return math.inf, []
+    caminho = []
+    atual = destino
+    while atual is not None:
+        caminho.append(atual)
+        atual = pred[atual]
+    caminho.reverse()
+    return dist[destino], caminho
+
+def _arcos(graph: Graph):
+    """Arcos dirigidos do grafo com o menor peso entre arestas paralelas."""
+    offsets, targets, weights = graph.csr()
+    names = graph.names
+    arcos = {}
+    for u in range(graph.num_vertices()):
+        for i in range(offsets[u], offsets[u + 1]):
+            chave = (names[u], names[targets[i]])
+            if weights[i] < arcos.get(chave, math.inf):
+                arcos[chave] = weights[i]
+    return arcos
@@ -1,5 +1,6 @@
 import heapq
 import math
+import threading
 from graph import Graph
 
 def dijkstra(graph: Graph, start_node: str, end_node: str):
@@ -7,16 +8,44 @@ def dijkstra(graph: Graph, start_node: str, end_node: str):
     Calcula o caminho mais curto entre start_node e end_node usando o algoritmo de Dijkstra.
     Retorna uma tupla (distância_total, caminho_reconstruído).
     Se não houver caminho, retorna (math.inf, []).
+    Só os vértices alcançados pela busca entram nos mapas de distância/predecessor.
     """
-    if start_node not in graph.get_vertices() or end_node not in graph.get_vertices():
+    if start_node not in graph or end_node not in graph:
         print(f"Erro: Nó inicial '{start_node}' ou final '{end_node}' não existe no grafo.")
         return math.inf, []
 
-    distances = {vertex: math.inf for vertex in graph.get_vertices()}
-    predecessors = {vertex: None for vertex in graph.get_vertices()}
-    distances[start_node] = 0
+    start, end = graph.index_of(start_node), graph.index_of(end_node)
+    distances, predecessors = _dijkstra_ids(graph.csr(), start, end)
 
-    priority_queue = [(0, start_node)]
+    if end not in distances:
+        return math.inf, []
+
+    return distances[end], _reconstruir_caminho(graph, predecessors, end)
+
+def dijkstra_arvore(graph: Graph, start_node: str):
+    """
+    Árvore completa de caminhos mínimos a partir de start_node.
+    Retorna (distâncias, predecessores) indexados pelo nome do ponto; o
+    predecessor da origem é None e pontos inalcançáveis não aparecem.
+    """
+    if start_node not in graph:
+        return {}, {}
+    distances, predecessors = _dijkstra_ids(graph.csr(), graph.index_of(start_node))
+    names = graph.names
+    dist_nomes = {names[v]: d for v, d in distances.items()}
+    pred_nomes = {names[v]: (names[p] if p != -1 else None) for v, p in predecessors.items()}
+    return dist_nomes, pred_nomes
+
+def _dijkstra_ids(csr, start, end=None):
+    """
+    Núcleo do Dijkstra sobre os arrays CSR. Pára ao assentar `end`
+    (ou esgota a componente se end for None). Predecessor da origem é -1.
+    """
+    offsets, targets, weights = csr
+    distances = {start: 0}
+    predecessors = {start: -1}
+
+    priority_queue = [(0, start)]
 
     while priority_queue:
         current_distance, current_node = heapq.heappop(priority_queue)
@@ -24,29 +53,215 @@ def dijkstra(graph: Graph, start_node: str, end_node: str):
         if current_distance > distances[current_node]:
             continue
 
-        if current_node == end_node:
+        if current_node == end:
             break
 
-        for neighbor_info in graph.get_neighbors(current_node):
-            neighbor_node = neighbor_info['node']
-            weight = neighbor_info['weight']
-            distance_through_current = current_distance + weight
+        for i in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor_node = targets[i]
+            distance_through_current = current_distance + weights[i]
 
-            if distance_through_current < distances[neighbor_node]:
+            if distance_through_current < distances.get(neighbor_node, math.inf):
                 distances[neighbor_node] = distance_through_current
                 predecessors[neighbor_node] = current_node
                 heapq.heappush(priority_queue, (distance_through_current, neighbor_node))
 
+    return distances, predecessors
+
+def _reconstruir_caminho(graph: Graph, predecessors, end):
+    """Segue os predecessores a partir de `end` e inverte no final (O(k))."""
     path = []
-    current = end_node
-    if distances[current] == math.inf:
+    current = end
+    while current != -1:
+        path.append(graph.name_of(current))
+        current = predecessors[current]
+    path.reverse()
+    return path
+
+class HeuristicaEuclidiana:
+    """
+    h(u) = distância euclidiana entre coordenadas * menor razão km/unidade
+    observada nas arestas. Como nenhuma aresta é mais curta que a sua reta
+    escalada por essa razão, h nunca sobrestima (admissível e consistente).
+    `coords` é um dicionário nome -> (x, y) ou nome -> {'coords': (x, y)}.
+    Acompanha o grafo de forma incremental (só olha para arestas novas).
+    Pode ser partilhada entre threads: as atualizações são feitas sob um lock e
+    publicadas como uma tabela nova (instantaneo()), que cada consulta usa do
+    princípio ao fim, mesmo que entretanto as coordenadas sejam recalculadas.
+    """
+    def __init__(self, graph: Graph, coords):
+        self.graph = graph
+        self.coords = coords
+        self._lock = threading.Lock()
+        self.recalcular()
+
+    def recalcular(self):
+        """Refaz tudo; usar quando as coordenadas dos pontos mudam."""
+        with self._lock:
+            self._xs, self._ys = [], []  # listas novas: as tabelas já publicadas continuam com as antigas
+            self._arestas_vistas = 0
+            self._razao = math.inf
+            self._sem_coords = False
+            self._sincronizar()
+
+    @property
+    def razao(self):
+        return self.instantaneo().razao
+
+    @property
+    def admissivel(self):
+        return self.instantaneo().admissivel
+
+    def instantaneo(self):
+        """Tabela imutável da heurística para o grafo atual (usar uma por consulta)."""
+        with self._lock:
+            self._sincronizar()
+            return self._tabela
+
+    def __call__(self, u: int, alvo: int) -> float:
+        return self._tabela(u, alvo)
+
+    def _coords_de(self, nome):
+        c = self.coords.get(nome)
+        if isinstance(c, dict): c = c.get('coords')
+        return c
+
+    def _sincronizar(self):
+        """Chamar com o lock. As listas só crescem, por isso tabelas antigas nunca veem valores mudar."""
+        names = self.graph.names
+        for vid in range(len(self._xs), len(names)):
+            c = self._coords_de(names[vid])
+            if c is None or c[0] is None or c[1] is None:
+                self._xs.append(math.nan); self._ys.append(math.nan)
+            else:
+                self._xs.append(float(c[0])); self._ys.append(float(c[1]))
+        origens, destinos, pesos, _ = self.graph.edges()
+        xs, ys = self._xs, self._ys
+        for e in range(self._arestas_vistas, len(pesos)):
+            u, v = origens[e], destinos[e]
+            reta = math.hypot(xs[u] - xs[v], ys[u] - ys[v])
+            if math.isnan(reta): self._sem_coords = True
+            elif reta > 0: self._razao = min(self._razao, pesos[e] / reta)
+        self._arestas_vistas = len(pesos)
+        self._tabela = _TabelaHeuristica(xs, ys, self._razao, self._sem_coords)
+
+class _TabelaHeuristica:
+    """Estado da HeuristicaEuclidiana num instante; razao e sem_coords não mudam depois de criada."""
+    __slots__ = ('xs', 'ys', 'razao', 'sem_coords')
+
+    def __init__(self, xs, ys, razao, sem_coords):
+        self.xs, self.ys, self.razao, self.sem_coords = xs, ys, razao, sem_coords
+
+    @property
+    def admissivel(self):
+        return not self.sem_coords and 0 < self.razao < math.inf
+
+    def __call__(self, u: int, alvo: int) -> float:
+        return self.razao * math.hypot(self.xs[u] - self.xs[alvo], self.ys[u] - self.ys[alvo])
+
+def a_estrela(graph: Graph, start_node: str, end_node: str, heuristica=None):
+    """
+    A* entre start_node e end_node. `heuristica` é chamada com ids inteiros
+    (u, alvo) e deve expor `admissivel`; se não for possível garantir que é
+    admissível (ou não houver heurística) usa-se dijkstra. Mesmo retorno de dijkstra.
+    """
+    csr = graph.csr()
+    if heuristica is not None and hasattr(heuristica, 'instantaneo'):
+        heuristica = heuristica.instantaneo()  # lida depois do CSR: cobre todas as arestas que a busca vê
+    if heuristica is None or not getattr(heuristica, 'admissivel', False):
+        return dijkstra(graph, start_node, end_node)
+    if start_node not in graph or end_node not in graph:
+        print(f"Erro: Nó inicial '{start_node}' ou final '{end_node}' não existe no grafo.")
         return math.inf, []
 
-    while current is not None:
-        path.insert(0, current)
-        current = predecessors[current]
+    start, end = graph.index_of(start_node), graph.index_of(end_node)
+    distances, predecessors, _ = _a_estrela_ids(csr, start, end, heuristica)
+
+    if end not in distances:
+        return math.inf, []
+
+    return distances[end], _reconstruir_caminho(graph, predecessors, end)
+
+def _a_estrela_ids(csr, start, end, heuristica):
+    """Núcleo do A*; devolve também o número de vértices assentados."""
+    offsets, targets, weights = csr
+    distances = {start: 0}
+    predecessors = {start: -1}
+    assentados = 0
+
+    priority_queue = [(heuristica(start, end), 0, start)]
+
+    while priority_queue:
+        _, current_distance, current_node = heapq.heappop(priority_queue)
+
+        if current_distance > distances[current_node]:
+            continue
+        assentados += 1
+
+        if current_node == end:
+            break
+
+        for i in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor_node = targets[i]
+            distance_through_current = current_distance + weights[i]
+
+            if distance_through_current < distances.get(neighbor_node, math.inf):
+                distances[neighbor_node] = distance_through_current
+                predecessors[neighbor_node] = current_node
+                heapq.heappush(priority_queue, (distance_through_current + heuristica(neighbor_node, end),
+                                                distance_through_current, neighbor_node))
+
+    return distances, predecessors, assentados
+
+def dijkstra_bidirecional(graph: Graph, start_node: str, end_node: str):
+    """
+    Dijkstra bidirecional: uma frente a partir da origem sobre csr() e outra a
+    partir do destino sobre reverse_csr(), o que respeita arestas de sentido
+    único. Pára quando topo_frente + topo_trás >= melhor distância encontrada.
+    Mesmo retorno de dijkstra.
+    """
+    if start_node not in graph or end_node not in graph:
+        print(f"Erro: Nó inicial '{start_node}' ou final '{end_node}' não existe no grafo.")
+        return math.inf, []
+
+    start, end = graph.index_of(start_node), graph.index_of(end_node)
+    if start == end:
+        return 0, [start_node]
+
+    csrs = (graph.csr(), graph.reverse_csr())
+    distances = ({start: 0}, {end: 0})
+    predecessors = ({start: -1}, {end: -1})
+    queues = ([(0, start)], [(0, end)])
+    best, meeting = math.inf, -1
+
+    while queues[0] and queues[1]:
+        if queues[0][0][0] + queues[1][0][0] >= best:
+            break
+        lado = 0 if queues[0][0][0] <= queues[1][0][0] else 1
+        offsets, targets, weights = csrs[lado]
+        dist, pred, outra = distances[lado], predecessors[lado], distances[1 - lado]
+
+        current_distance, current_node = heapq.heappop(queues[lado])
+        if current_distance > dist[current_node]:
+            continue
+
+        for i in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor_node = targets[i]
+            distance_through_current = current_distance + weights[i]
+
+            if distance_through_current < dist.get(neighbor_node, math.inf):
+                dist[neighbor_node] = distance_through_current
+                pred[neighbor_node] = current_node
+                heapq.heappush(queues[lado], (distance_through_current, neighbor_node))
+            if neighbor_node in outra and distance_through_current + outra[neighbor_node] < best:
+                best = distance_through_current + outra[neighbor_node]
+                meeting = neighbor_node
+
+    if meeting == -1:
+        return math.inf, []
 
-    if path[0] == start_node:
-        return distances[end_node], path
-    else:
-        return math.inf, []
\ No newline at end of file
+    path = _reconstruir_caminho(graph, predecessors[0], meeting)
+    current = predecessors[1][meeting]
+    while current != -1:
+        path.append(graph.name_of(current))
+        current = predecessors[1][current]
+    return best, path
@@ -1,7 +1,11 @@
 import mysql.connector
-from mysql.connector import errorcode
+from mysql.connector import errorcode, pooling
 from typing import List, Dict, Any, Tuple, Optional
+from contextlib import contextmanager
+import datetime
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,6 +17,26 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME'),
 }
 
+def _tamanho_pool(padrao: int = 8) -> int:
+    """DB_POOL_SIZE limitado a 1..32 (o máximo de mysql.connector); o padrão se não for um inteiro."""
+    try: return max(1, min(32, int(os.getenv('DB_POOL_SIZE', padrao))))
+    except ValueError:
+        print(f"Aviso: DB_POOL_SIZE inválido, a usar {padrao}."); return padrao
+
+# Pool de ligações
+POOL_CONFIG = {
+    'pool_name': os.getenv('DB_POOL_NAME', 'logistica_pool'),
+    'pool_size': _tamanho_pool(),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '5')),       # segundos à espera de uma ligação livre
+    'ping_intervalo': float(os.getenv('DB_POOL_PING', '30')),  # segundos sem uso antes de testar a ligação
+}
+
+BULK_CHUNK = 1000  # linhas por instrução nas operações em lote
+
+_pool = None
+_pool_lock = threading.Lock()
+_ultimo_uso = {}  # connection_id -> último uso; o id muda ao religar
+
 SQL_CREATE_PONTOS = """
 CREATE TABLE IF NOT EXISTS pontos (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -97,328 +121,792 @@ CREATE TABLE IF NOT EXISTS cargas (
 ) ENGINE=InnoDB;
 """
 
+# Migrações do esquema: (versão, descrição, instruções), aplicadas por ordem e
+# registadas na tabela `migracoes`. Uma migração publicada não se altera; cria-se outra.
+SQL_CREATE_MIGRACOES = """
+CREATE TABLE IF NOT EXISTS migracoes (
+    versao INT PRIMARY KEY,
+    descricao VARCHAR(255) NOT NULL,
+    data_aplicacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+"""
+
+MIGRACOES = (
+    # Consultas filtradas de cargas (obter_cargas_filtradas_db): todos terminam em
+    # (data_criacao, id) para servirem a ordenação e a paginação por keyset.
+    (1, "Índices das listas filtradas de cargas", (
+        "CREATE INDEX idx_cargas_data ON cargas (data_criacao, id)",
+        "CREATE INDEX idx_cargas_estado_data ON cargas (estado, data_criacao, id)",
+        "CREATE INDEX idx_cargas_cliente_data ON cargas (cliente_nome, data_criacao, id)",
+        "CREATE INDEX idx_cargas_origem_data ON cargas (ponto_origem_id, data_criacao, id)",
+        "CREATE INDEX idx_cargas_destino_data ON cargas (ponto_destino_id, data_criacao, id)",
+    )),
+    # Filtros por estado, prazos de entrega e adjacência inversa (conexões que chegam a um
+    # ponto); o índice de conexoes cobre a consulta sem ler as linhas da tabela.
+    (2, "Índices de estado, prazo de entrega e adjacência inversa", (
+        "CREATE INDEX idx_camioes_estado ON camioes (estado)",
+        "CREATE INDEX idx_motoristas_estado ON motoristas (estado)",
+        "CREATE INDEX idx_cargas_estado_entrega ON cargas (estado, data_prevista_entrega)",
+        "CREATE INDEX idx_conexoes_destino_origem ON conexoes (ponto_destino_id, ponto_origem_id, distancia, bidirecional)",
+    )),
+    # Carimbo de versão do mapa (obter_versao_mapa_db): conexoes não tinha data de modificação
+    # e as de pontos tinham resolução de segundos (duas alterações no mesmo segundo não se distinguiam).
+    (3, "Datas de modificação ao microssegundo em pontos e conexões", (
+        "ALTER TABLE pontos MODIFY data_modificacao TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)",
+        "ALTER TABLE conexoes ADD COLUMN data_modificacao TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)",
+        "CREATE INDEX idx_pontos_modificacao ON pontos (data_modificacao)",      # MAX() lido só do índice
+        "CREATE INDEX idx_conexoes_modificacao ON conexoes (data_modificacao)",
+    )),
+)
+VERSAO_ESQUEMA = MIGRACOES[-1][0]
+PAGINA_CARGAS = 200  # linhas por página nas listas de cargas
+ESTADOS_CARGA_EM_ABERTO = ('Pendente', 'Agendada', 'Coletada', 'Em Trânsito')
+
+# Registo de alterações, preenchido por triggers, para a sincronização incremental
+TABELAS_SINCRONIZADAS = ('pontos', 'conexoes', 'camioes', 'motoristas', 'cargas')
+RETENCAO_ALTERACOES_DIAS = 7
+
+SQL_CREATE_ALTERACOES = """
+CREATE TABLE IF NOT EXISTS alteracoes (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    tabela VARCHAR(20) NOT NULL,
+    registo_id INT NOT NULL,
+    operacao ENUM('I', 'U', 'D') NOT NULL,
+    data TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_alteracoes_data (data)
+) ENGINE=InnoDB;
+"""
+
+def _triggers_alteracoes():
+    """(nome, SQL) dos triggers AFTER INSERT/UPDATE/DELETE de cada tabela sincronizada."""
+    for tabela in TABELAS_SINCRONIZADAS:
+        for evento, op, linha in (('INSERT', 'I', 'NEW'), ('UPDATE', 'U', 'NEW'), ('DELETE', 'D', 'OLD')):
+            nome = f"trg_alteracoes_{tabela}_{op.lower()}"
+            yield nome, (f"CREATE TRIGGER {nome} AFTER {evento} ON {tabela} FOR EACH ROW "
+                         f"INSERT INTO alteracoes (tabela, registo_id, operacao) VALUES ('{tabela}', {linha}.id, '{op}')")
+
+def _reportar_erro_ligacao(err):
+    if err.errno == errorcode.ER_ACCESS_DENIED_ERROR: print("Erro: Utilizador ou senha MySQL incorretos.")
+    elif err.errno == errorcode.ER_BAD_DB_ERROR: print(f"Erro: Base de dados '{DB_CONFIG['database']}' não existe.")
+    else: print(f"Erro ao conectar à BD: {err}")
+
+def _obter_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(pool_name=POOL_CONFIG['pool_name'],
+                                                pool_size=POOL_CONFIG['pool_size'], **DB_CONFIG)
+        return _pool
+
 def get_db_connection():
+    """
+    Retira uma ligação do pool (conn.close() devolve-a). Espera até
+    POOL_CONFIG['timeout'] segundos por uma ligação livre e testa com ping as
+    ligações paradas há mais de POOL_CONFIG['ping_intervalo'] segundos.
+    """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
+        pool = _obter_pool()
     except mysql.connector.Error as err:
-        if err.errno == errorcode.ER_ACCESS_DENIED_ERROR: print("Erro: Utilizador ou senha MySQL incorretos.")
-        elif err.errno == errorcode.ER_BAD_DB_ERROR: print(f"Erro: Base de dados '{DB_CONFIG['database']}' não existe.")
-        else: print(f"Erro ao conectar à BD: {err}")
-        return None
-
-def initialize_database():
+        _reportar_erro_ligacao(err); return None
+    limite = time.monotonic() + POOL_CONFIG['timeout']
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except pooling.PoolError:
+            if time.monotonic() >= limite:
+                print(f"Erro: Nenhuma ligação livre no pool após {POOL_CONFIG['timeout']}s."); return None
+            time.sleep(0.02)
+        except mysql.connector.Error as err:
+            _reportar_erro_ligacao(err); return None
+    chave = conn.connection_id
+    if time.monotonic() - _ultimo_uso.get(chave, 0) > POOL_CONFIG['ping_intervalo']:
+        try: conn.ping(reconnect=True, attempts=2, delay=0)
+        except mysql.connector.Error as err:
+            _ultimo_uso.pop(chave, None); conn.close(); _reportar_erro_ligacao(err); return None
+        if conn.connection_id != chave: _ultimo_uso.pop(chave, None); chave = conn.connection_id
+    _ultimo_uso[chave] = time.monotonic()
+    if len(_ultimo_uso) > POOL_CONFIG['pool_size']:  # ids de ligações religadas por outra via
+        usos = sorted(list(_ultimo_uso.items()), key=lambda u: u[1])
+        for antiga, _ in usos[:len(usos) - POOL_CONFIG['pool_size']]: _ultimo_uso.pop(antiga, None)
+    return conn
+
+@contextmanager
+def db_cursor(dictionary: bool = False, buffered: Optional[bool] = None, prepared: bool = False):
+    """
+    Ligação do pool + cursor para uma operação; (None, None) se não houver ligação.
+    `prepared` usa um cursor de instruções preparadas (protocolo binário, tuplos).
+    À saída fecha o cursor e devolve a ligação ao pool.
+    """
     conn = get_db_connection()
-    if conn is None: return False
-    cursor = conn.cursor()
+    cursor = None
     try:
-        print(f"A usar a base de dados: {DB_CONFIG['database']}")
-        cursor.execute(SQL_CREATE_PONTOS); print("Tabela 'pontos' OK.")
-        cursor.execute(SQL_CREATE_CONEXOES); print("Tabela 'conexoes' OK.")
-        cursor.execute(SQL_CREATE_CAMIOES); print("Tabela 'camioes' OK.")
-        cursor.execute(SQL_CREATE_MOTORISTAS); print("Tabela 'motoristas' OK.")
-        cursor.execute(SQL_CREATE_CARGAS); print("Tabela 'cargas' OK.")
-        conn.commit()
+        if conn is not None: cursor = conn.cursor(dictionary=dictionary or None, buffered=buffered, prepared=prepared or None)
+        yield conn, cursor
+    finally:
+        try:
+            if cursor is not None: cursor.close()
+        except mysql.connector.Error: pass
+        if conn is not None: conn.close()
+
+# --- Leituras em streaming ---
+# Para leituras grandes (mapa completo, exportações): tuplos em vez de dicts, só as
+# colunas pedidas e um cursor sem buffer lido em lotes à medida que se itera.
+
+ErroBD = mysql.connector.Error
+
+COLUNAS_TABELAS = {
+    'pontos': ('id', 'nome', 'tipo', 'coord_x', 'coord_y', 'data_criacao', 'data_modificacao'),
+    'conexoes': ('id', 'ponto_origem_id', 'ponto_destino_id', 'distancia', 'bidirecional', 'data_criacao', 'data_modificacao'),
+    'camioes': ('id', 'matricula', 'nome_descricao', 'capacidade', 'unidade_capacidade', 'tipo_veiculo', 'estado',
+                'localizacao_atual_ponto_id', 'observacoes', 'data_criacao', 'data_modificacao'),
+    'motoristas': ('id', 'nome_completo', 'cnh', 'categoria_cnh', 'validade_cnh', 'telefone', 'email', 'estado',
+                   'observacoes', 'data_criacao', 'data_modificacao'),
+    'cargas': ('id', 'descricao', 'tipo_carga', 'peso_kg', 'volume_m3', 'ponto_origem_id', 'ponto_destino_id',
+               'cliente_nome', 'data_prevista_coleta', 'data_prevista_entrega', 'estado', 'camiao_atribuido_id',
+               'motorista_atribuido_id', 'observacoes', 'data_criacao', 'data_modificacao'),
+    'alteracoes': ('id', 'tabela', 'registo_id', 'operacao', 'data'),
+}
+COLUNAS_ARESTAS = ('ponto_origem_id', 'ponto_destino_id', 'distancia', 'bidirecional')  # para Graph.from_id_rows
+
+def iterar_consulta_db(sql: str, params: tuple = (), tamanho_lote: int = BULK_CHUNK, prepared: bool = False):
+    """
+    Gerador dos tuplos de `sql`, lidos do servidor em lotes de `tamanho_lote` sem
+    materializar o resultado. A ligação fica ocupada até ao fim da iteração (ou até o
+    gerador ser fechado), por isso não deixar geradores a meio. Ao contrário das
+    outras funções, erros (incluindo a falta de ligação) são lançados como ErroBD.
+    """
+    with db_cursor(buffered=False, prepared=prepared) as (conn, cursor):
+        if not cursor: raise ErroBD("Sem ligação à base de dados.")
+        lido = False
+        try:
+            cursor.execute(sql, params)
+            while True:
+                linhas = cursor.fetchmany(tamanho_lote)
+                if not linhas: break
+                yield from linhas
+            lido = True
+        finally:
+            if not lido:  # iteração interrompida: o resto tem de ser lido antes de a ligação voltar ao pool
+                try:
+                    while cursor.fetchmany(tamanho_lote): pass
+                except ErroBD: pass
+
+def iterar_tabela_db(tabela: str, colunas: Tuple[str, ...], ordem: Optional[str] = None,
+                     tamanho_lote: int = BULK_CHUNK, prepared: bool = True):
+    """
+    Tuplos com `colunas` (por essa ordem) de todas as linhas de `tabela`, em streaming
+    (ver iterar_consulta_db). Sem `ordem` o servidor pode ler só um índice que cubra as
+    colunas, mas a ordem das linhas não é garantida. Ex.: for p_id, nome in iterar_tabela_db('pontos', ('id', 'nome')): ...
+    """
+    permitidas = COLUNAS_TABELAS.get(tabela)
+    if permitidas is None: raise ValueError(f"Tabela desconhecida: {tabela}")
+    invalidas = [c for c in (*colunas, *([ordem] if ordem else [])) if c not in permitidas]
+    if invalidas: raise ValueError(f"Colunas desconhecidas em '{tabela}': {', '.join(invalidas)}")
+    sql = f"SELECT {', '.join(colunas)} FROM {tabela}" + (f" ORDER BY {ordem}" if ordem else "")
+    return iterar_consulta_db(sql, (), tamanho_lote, prepared)
+
+def _lotes(linhas, tamanho: int = BULK_CHUNK):
+    linhas = list(linhas)
+    for i in range(0, len(linhas), tamanho):
+        yield linhas[i:i + tamanho]
+
+def initialize_database():
+    with db_cursor() as (conn, cursor):
+        if conn is None: return False
+        try:
+            print(f"A usar a base de dados: {DB_CONFIG['database']}")
+            cursor.execute(SQL_CREATE_PONTOS); print("Tabela 'pontos' OK.")
+            cursor.execute(SQL_CREATE_CONEXOES); print("Tabela 'conexoes' OK.")
+            cursor.execute(SQL_CREATE_CAMIOES); print("Tabela 'camioes' OK.")
+            cursor.execute(SQL_CREATE_MOTORISTAS); print("Tabela 'motoristas' OK.")
+            cursor.execute(SQL_CREATE_CARGAS); print("Tabela 'cargas' OK.")
+            cursor.execute(SQL_CREATE_ALTERACOES); print("Tabela 'alteracoes' OK.")
+            conn.commit()
+        except mysql.connector.Error as err:
+            print(f"Erro ao inicializar tabelas: {err}")
+            conn.rollback()
+            return False
+        try: _aplicar_migracoes(conn, cursor); print(f"Esquema na versão {VERSAO_ESQUEMA}.")
+        except mysql.connector.Error as err:
+            print(f"Aviso: falha ao migrar o esquema ({err}); algumas consultas serão mais lentas.")
+            conn.rollback()
+        _inicializar_triggers(conn, cursor)
         print("Inicialização da base de dados concluída.")
         return True
+
+def _aplicar_migracoes(conn, cursor):
+    """
+    Aplica as MIGRACOES ainda não registadas. O DDL do MySQL não é transacional:
+    uma migração interrompida volta a correr e salta os índices e colunas que já
+    existem (também os criados por versões anteriores a este mecanismo).
+    """
+    cursor.execute(SQL_CREATE_MIGRACOES)
+    cursor.execute("SELECT versao FROM migracoes")
+    aplicadas = {versao for (versao,) in cursor}
+    for versao, descricao, instrucoes in MIGRACOES:
+        if versao in aplicadas: continue
+        for sql in instrucoes:
+            try: cursor.execute(sql)
+            except mysql.connector.Error as err:
+                if err.errno not in (errorcode.ER_DUP_KEYNAME, errorcode.ER_DUP_FIELDNAME): raise
+        cursor.execute("INSERT INTO migracoes (versao, descricao) VALUES (%s, %s)", (versao, descricao))
+        conn.commit(); print(f"Migração {versao} aplicada: {descricao}")
+
+def _inicializar_triggers(conn, cursor):
+    """Cria os triggers em falta; sem eles (p.ex. sem privilégio TRIGGER) a sincronização recorre a recargas completas."""
+    try:
+        cursor.execute("SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE()")
+        existentes = {nome for (nome,) in cursor}
+        for nome, sql in _triggers_alteracoes():
+            if nome not in existentes: cursor.execute(sql)
+        cursor.execute("DELETE FROM alteracoes WHERE data < NOW() - INTERVAL %s DAY", (RETENCAO_ALTERACOES_DIAS,))
+        conn.commit(); print("Triggers de sincronização OK.")
     except mysql.connector.Error as err:
-        print(f"Erro ao inicializar tabelas: {err}")
+        print(f"Aviso: triggers de sincronização indisponíveis ({err}); serão feitas recargas completas.")
         conn.rollback()
-        return False
-    finally:
-        if conn.is_connected(): cursor.close(); conn.close()
+
+def alteracoes_ativas_db() -> bool:
+    """True se todos os triggers do registo de alterações existem."""
+    with db_cursor() as (conn, cursor):
+        if not cursor: return False
+        nomes = [nome for nome, _ in _triggers_alteracoes()]
+        sql = f"SELECT COUNT(*) FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME IN ({', '.join(['%s'] * len(nomes))})"
+        try: cursor.execute(sql, tuple(nomes)); return cursor.fetchone()[0] == len(nomes)
+        except mysql.connector.Error as err: print(f"Erro verificar triggers: {err}"); return False
+
+def obter_ultima_alteracao_db() -> Optional[int]:
+    with db_cursor() as (conn, cursor):
+        if not cursor: return None
+        try: cursor.execute("SELECT COALESCE(MAX(id), 0) FROM alteracoes"); return cursor.fetchone()[0]
+        except mysql.connector.Error as err: print(f"Erro obter última alteração: {err}"); return None
+
+def obter_alteracoes_db(desde_id: int, ids_em_falta=()) -> Optional[List[Tuple[int, str, int, str]]]:
+    """
+    Entradas (id, tabela, registo_id, operacao) do registo com id > desde_id ou em
+    `ids_em_falta` (ids abaixo de desde_id ainda por confirmar), por ordem; None em erro.
+    """
+    with db_cursor() as (conn, cursor):
+        if not cursor: return None
+        sql, parametros = "SELECT id, tabela, registo_id, operacao FROM alteracoes WHERE id > %s", (desde_id,)
+        if ids_em_falta:
+            marcadores, ids = _em_ids(ids_em_falta)
+            sql += f" OR id IN ({marcadores})"; parametros += ids
+        try:
+            cursor.execute(sql + " ORDER BY id", parametros)
+            return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter alterações: {err}"); return None
+
+def _em_ids(ids) -> Tuple[str, tuple]:
+    ids = tuple(ids)
+    return ", ".join(["%s"] * len(ids)), ids
 
 def adicionar_ponto_db(nome: str, tipo: str, coord_x: Optional[int] = None, coord_y: Optional[int] = None) -> Optional[int]:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor: return None
-    sql = "INSERT INTO pontos (nome, tipo, coord_x, coord_y) VALUES (%s, %s, %s, %s)"
-    try:
-        cursor.execute(sql, (nome, tipo, coord_x, coord_y)); conn.commit(); return cursor.lastrowid
-    except mysql.connector.Error as err: print(f"Erro add ponto '{nome}': {err}"); conn.rollback(); return None
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor: return None
+        sql = "INSERT INTO pontos (nome, tipo, coord_x, coord_y) VALUES (%s, %s, %s, %s)"
+        try:
+            cursor.execute(sql, (nome, tipo, coord_x, coord_y)); conn.commit(); return cursor.lastrowid
+        except mysql.connector.Error as err: print(f"Erro add ponto '{nome}': {err}"); conn.rollback(); return None
 
 def obter_ponto_por_nome_db(nome: str) -> Optional[Dict[str, Any]]:
-    conn = get_db_connection(); cursor = conn.cursor(dictionary=True) if conn else None
-    if not cursor: return None
-    try: cursor.execute("SELECT * FROM pontos WHERE nome = %s", (nome,)); return cursor.fetchone()
-    except mysql.connector.Error as err: print(f"Erro obter ponto '{nome}': {err}"); return None
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        try: cursor.execute("SELECT * FROM pontos WHERE nome = %s", (nome,)); return cursor.fetchone()
+        except mysql.connector.Error as err: print(f"Erro obter ponto '{nome}': {err}"); return None
 
 def obter_ponto_por_id_db(ponto_id: int) -> Optional[Dict[str, Any]]:
-    conn = get_db_connection(); cursor = conn.cursor(dictionary=True) if conn else None
-    if not cursor: return None
-    try: cursor.execute("SELECT * FROM pontos WHERE id = %s", (ponto_id,)); return cursor.fetchone()
-    except mysql.connector.Error as err: print(f"Erro obter ponto ID '{ponto_id}': {err}"); return None
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        try: cursor.execute("SELECT * FROM pontos WHERE id = %s", (ponto_id,)); return cursor.fetchone()
+        except mysql.connector.Error as err: print(f"Erro obter ponto ID '{ponto_id}': {err}"); return None
 
 def obter_todos_pontos_db() -> List[Dict[str, Any]]:
-    conn = get_db_connection(); cursor = conn.cursor(dictionary=True) if conn else None
-    if not cursor: return []
-    try: cursor.execute("SELECT * FROM pontos ORDER BY nome"); return cursor.fetchall()
-    except mysql.connector.Error as err: print(f"Erro obter todos pontos: {err}"); return []
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return []
+        try: cursor.execute("SELECT * FROM pontos ORDER BY nome"); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter todos pontos: {err}"); return []
+
+def obter_pontos_por_ids_db(ponto_ids: List[int]) -> Optional[List[Dict[str, Any]]]:
+    if not ponto_ids: return []
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        marcadores, params = _em_ids(ponto_ids)
+        try: cursor.execute(f"SELECT * FROM pontos WHERE id IN ({marcadores})", params); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter pontos por ids: {err}"); return None
+
+def obter_ids_pontos_db() -> Dict[str, int]:
+    """Mapa nome -> id de todos os pontos (só estas duas colunas)."""
+    with db_cursor() as (conn, cursor):
+        if not cursor: return {}
+        try: cursor.execute("SELECT id, nome FROM pontos"); return {nome: p_id for p_id, nome in cursor}
+        except mysql.connector.Error as err: print(f"Erro obter ids pontos: {err}"); return {}
 
 def atualizar_ponto_coords_db(ponto_id: int, coord_x: int, coord_y: int) -> bool:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor: return False
-    sql = "UPDATE pontos SET coord_x = %s, coord_y = %s WHERE id = %s"
-    try: cursor.execute(sql, (coord_x, coord_y, ponto_id)); conn.commit(); return cursor.rowcount > 0
-    except mysql.connector.Error as err: print(f"Erro update coords ponto {ponto_id}: {err}"); conn.rollback(); return False
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor: return False
+        sql = "UPDATE pontos SET coord_x = %s, coord_y = %s WHERE id = %s"
+        try: cursor.execute(sql, (coord_x, coord_y, ponto_id)); conn.commit(); return cursor.rowcount > 0
+        except mysql.connector.Error as err: print(f"Erro update coords ponto {ponto_id}: {err}"); conn.rollback(); return False
 
 def remover_ponto_db(ponto_id: int) -> bool:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor: return False
-    try: cursor.execute("DELETE FROM pontos WHERE id = %s", (ponto_id,)); conn.commit(); return cursor.rowcount > 0
-    except mysql.connector.Error as err: print(f"Erro remover ponto {ponto_id}: {err}"); conn.rollback(); return False
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor: return False
+        try: cursor.execute("DELETE FROM pontos WHERE id = %s", (ponto_id,)); conn.commit(); return cursor.rowcount > 0
+        except mysql.connector.Error as err: print(f"Erro remover ponto {ponto_id}: {err}"); conn.rollback(); return False
+
+def adicionar_pontos_bulk(pontos: List[Tuple[str, str, Optional[int], Optional[int]]]) -> Optional[Dict[str, int]]:
+    """Insere (nome, tipo, coord_x, coord_y) numa só transação; retorna {nome: id} ou None em erro."""
+    if not pontos: return {}
+    with db_cursor() as (conn, cursor):
+        if not cursor: return None
+        ids = {}
+        try:
+            for lote in _lotes(pontos):
+                valores = ", ".join(["(%s, %s, %s, %s)"] * len(lote))
+                cursor.execute(f"INSERT INTO pontos (nome, tipo, coord_x, coord_y) VALUES {valores}",
+                               tuple(v for p in lote for v in p))
+                nomes = [p[0] for p in lote]
+                cursor.execute(f"SELECT id, nome FROM pontos WHERE nome IN ({', '.join(['%s'] * len(nomes))})", tuple(nomes))
+                ids.update({nome: p_id for p_id, nome in cursor.fetchall()})
+            conn.commit(); return ids
+        except mysql.connector.Error as err: print(f"Erro add pontos em lote: {err}"); conn.rollback(); return None
+
+def atualizar_coords_bulk(coords: List[Tuple[int, int, int]]) -> int:
+    """Atualiza (ponto_id, coord_x, coord_y) numa só transação; retorna o nº de pontos alterados (-1 em erro)."""
+    if not coords: return 0
+    with db_cursor() as (conn, cursor):
+        if not cursor: return -1
+        alterados = 0
+        try:
+            for lote in _lotes(coords):
+                casos = " ".join(["WHEN %s THEN %s"] * len(lote))
+                ids = [c[0] for c in lote]
+                sql = f"""UPDATE pontos SET coord_x = CASE id {casos} END, coord_y = CASE id {casos} END
+                        WHERE id IN ({', '.join(['%s'] * len(lote))})"""
+                params = [v for p_id, x, _ in lote for v in (p_id, x)] + [v for p_id, _, y in lote for v in (p_id, y)] + ids
+                cursor.execute(sql, tuple(params)); alterados += cursor.rowcount
+            conn.commit(); return alterados
+        except mysql.connector.Error as err: print(f"Erro update coords em lote: {err}"); conn.rollback(); return -1
+
+def remover_pontos_bulk(ponto_ids: List[int]) -> int:
+    """Remove os pontos (e, em cascata, as suas conexões) numa só transação; retorna o nº removido (-1 em erro)."""
+    if not ponto_ids: return 0
+    with db_cursor() as (conn, cursor):
+        if not cursor: return -1
+        removidos = 0
+        try:
+            for lote in _lotes(ponto_ids):
+                cursor.execute(f"DELETE FROM pontos WHERE id IN ({', '.join(['%s'] * len(lote))})", tuple(lote))
+                removidos += cursor.rowcount
+            conn.commit(); return removidos
+        except mysql.connector.Error as err: print(f"Erro remover pontos em lote: {err}"); conn.rollback(); return -1
+
+def limpar_mapa_db() -> Optional[Tuple[int, int]]:
+    """
+    Limpa o mapa em duas instruções: apaga todas as conexões e todos os pontos
+    que não são origem/destino de cargas (essas FKs são RESTRICT, por isso um
+    TRUNCATE não é possível). Retorna (pontos_removidos, pontos_mantidos) ou None em erro.
+    """
+    with db_cursor() as (conn, cursor):
+        if not cursor: return None
+        try:
+            cursor.execute("DELETE FROM conexoes")
+            cursor.execute("""DELETE FROM pontos WHERE NOT EXISTS (
+                                SELECT 1 FROM cargas c WHERE c.ponto_origem_id = pontos.id OR c.ponto_destino_id = pontos.id)""")
+            removidos = cursor.rowcount
+            cursor.execute("SELECT COUNT(*) FROM pontos"); mantidos = cursor.fetchone()[0]
+            conn.commit(); return removidos, mantidos
+        except mysql.connector.Error as err: print(f"Erro limpar mapa: {err}"); conn.rollback(); return None
 
 def adicionar_conexao_db(p_orig_id: int, p_dest_id: int, dist: float, bidir: bool = True) -> Optional[int]:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor: return None
-    sql = "INSERT INTO conexoes (ponto_origem_id, ponto_destino_id, distancia, bidirecional) VALUES (%s, %s, %s, %s)"
-    try: cursor.execute(sql, (p_orig_id, p_dest_id, dist, bidir)); conn.commit(); return cursor.lastrowid
-    except mysql.connector.Error as err:
-        if err.errno == errorcode.ER_DUP_ENTRY: print(f"Erro: Conexão {p_orig_id}->{p_dest_id} já existe.")
-        else: print(f"Erro add conexão: {err}")
-        conn.rollback(); return None
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor: return None
+        sql = "INSERT INTO conexoes (ponto_origem_id, ponto_destino_id, distancia, bidirecional) VALUES (%s, %s, %s, %s)"
+        try: cursor.execute(sql, (p_orig_id, p_dest_id, dist, bidir)); conn.commit(); return cursor.lastrowid
+        except mysql.connector.Error as err:
+            if err.errno == errorcode.ER_DUP_ENTRY: print(f"Erro: Conexão {p_orig_id}->{p_dest_id} já existe.")
+            else: print(f"Erro add conexão: {err}")
+            conn.rollback(); return None
 
 def obter_todas_conexoes_db() -> List[Dict[str, Any]]:
-    conn = get_db_connection(); cursor = conn.cursor(dictionary=True) if conn else None
-    if not cursor: return []
-    sql = """SELECT c.id, c.ponto_origem_id, po.nome as nome_origem, c.ponto_destino_id,
-                pd.nome as nome_destino, c.distancia, c.bidirecional
-        FROM conexoes c JOIN pontos po ON c.ponto_origem_id = po.id JOIN pontos pd ON c.ponto_destino_id = pd.id
-        ORDER BY po.nome, pd.nome"""
-    try: cursor.execute(sql); return cursor.fetchall()
-    except mysql.connector.Error as err: print(f"Erro obter todas conexões: {err}"); return []
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return []
+        sql = """SELECT c.id, c.ponto_origem_id, po.nome as nome_origem, c.ponto_destino_id,
+                    pd.nome as nome_destino, c.distancia, c.bidirecional
+            FROM conexoes c JOIN pontos po ON c.ponto_origem_id = po.id JOIN pontos pd ON c.ponto_destino_id = pd.id
+            ORDER BY po.nome, pd.nome"""
+        try: cursor.execute(sql); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter todas conexões: {err}"); return []
+
+def obter_conexoes_por_ids_db(conexao_ids: List[int]) -> Optional[List[Dict[str, Any]]]:
+    if not conexao_ids: return []
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        marcadores, params = _em_ids(conexao_ids)
+        sql = f"""SELECT c.id, c.ponto_origem_id, po.nome as nome_origem, c.ponto_destino_id,
+                    pd.nome as nome_destino, c.distancia, c.bidirecional
+            FROM conexoes c JOIN pontos po ON c.ponto_origem_id = po.id JOIN pontos pd ON c.ponto_destino_id = pd.id
+            WHERE c.id IN ({marcadores})"""
+        try: cursor.execute(sql, params); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter conexões por ids: {err}"); return None
+
+def obter_conexoes_de_entrada_db(ponto_id: int) -> Optional[List[Dict[str, Any]]]:
+    """Conexões que chegam a `ponto_id` (adjacência inversa), com o nome da origem; None em erro."""
+    sql, params = _sql_conexoes_de_entrada(ponto_id)
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        try: cursor.execute(sql, params); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter conexões de entrada do ponto {ponto_id}: {err}"); return None
+
+def _sql_conexoes_de_entrada(ponto_id: int) -> Tuple[str, tuple]:
+    return """SELECT c.id, c.ponto_origem_id, po.nome as nome_origem, c.ponto_destino_id, c.distancia, c.bidirecional
+            FROM conexoes c JOIN pontos po ON c.ponto_origem_id = po.id
+            WHERE c.ponto_destino_id = %s""", (ponto_id,)
+
+def obter_versao_mapa_db() -> Optional[str]:
+    """
+    Carimbo de versão do mapa: contagens e ids máximos (inserções e remoções), a
+    última data de modificação de pontos e de conexões (qualquer UPDATE que mude
+    uma linha, ao microssegundo; migração 3). None em caso de erro.
+    """
+    with db_cursor() as (conn, cursor):
+        if not cursor: return None
+        sql = """SELECT (SELECT COUNT(*) FROM pontos), (SELECT MAX(id) FROM pontos), (SELECT MAX(data_modificacao) FROM pontos),
+                    (SELECT COUNT(*) FROM conexoes), (SELECT MAX(id) FROM conexoes), (SELECT MAX(data_modificacao) FROM conexoes)"""
+        try: cursor.execute(sql); return "|".join(str(v) for v in cursor.fetchone())
+        except mysql.connector.Error as err: print(f"Erro obter versão do mapa: {err}"); return None
+
+def adicionar_conexoes_bulk(conexoes: List[Tuple[int, int, float, bool]], ignorar_duplicados: bool = True) -> int:
+    """
+    Insere (ponto_origem_id, ponto_destino_id, distancia, bidirecional) numa só transação.
+    Com ignorar_duplicados, pares já existentes em idx_origem_destino são saltados.
+    Retorna o nº de conexões inseridas (-1 em erro).
+    """
+    if not conexoes: return 0
+    with db_cursor() as (conn, cursor):
+        if not cursor: return -1
+        inseridas = 0
+        ignore = "IGNORE " if ignorar_duplicados else ""
+        try:
+            for lote in _lotes(conexoes):
+                valores = ", ".join(["(%s, %s, %s, %s)"] * len(lote))
+                cursor.execute(f"INSERT {ignore}INTO conexoes (ponto_origem_id, ponto_destino_id, distancia, bidirecional) VALUES {valores}",
+                               tuple(v for c in lote for v in c))
+                inseridas += cursor.rowcount
+            conn.commit(); return inseridas
+        except mysql.connector.Error as err: print(f"Erro add conexões em lote: {err}"); conn.rollback(); return -1
 
 def adicionar_camiao_db(mat: str, nome: str, cap: float, unid: str, tipo: str, est: str = 'Disponível',
                         loc_id: Optional[int] = None, obs: str = "") -> Optional[int]:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor: return None
-    sql = """INSERT INTO camioes (matricula, nome_descricao, capacidade, unidade_capacidade, tipo_veiculo,
-                                estado, localizacao_atual_ponto_id, observacoes)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
-    try:
-        cursor.execute(sql, (mat, nome, cap, unid, tipo, est, loc_id, obs)); conn.commit(); return cursor.lastrowid
-    except mysql.connector.Error as err: print(f"Erro add camião '{mat}': {err}"); conn.rollback(); return None
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor: return None
+        sql = """INSERT INTO camioes (matricula, nome_descricao, capacidade, unidade_capacidade, tipo_veiculo,
+                                    estado, localizacao_atual_ponto_id, observacoes)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
+        try:
+            cursor.execute(sql, (mat, nome, cap, unid, tipo, est, loc_id, obs)); conn.commit(); return cursor.lastrowid
+        except mysql.connector.Error as err: print(f"Erro add camião '{mat}': {err}"); conn.rollback(); return None
 
 def obter_camiao_por_id_db(camiao_id: int) -> Optional[Dict[str, Any]]: # Nova função
-    conn = get_db_connection(); cursor = conn.cursor(dictionary=True) if conn else None
-    if not cursor: return None
-    sql = """SELECT ca.*, p.nome as nome_localizacao_atual
-            FROM camioes ca LEFT JOIN pontos p ON ca.localizacao_atual_ponto_id = p.id
-            WHERE ca.id = %s"""
-    try: cursor.execute(sql, (camiao_id,)); return cursor.fetchone()
-    except mysql.connector.Error as err: print(f"Erro obter camião ID {camiao_id}: {err}"); return None
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        sql = """SELECT ca.*, p.nome as nome_localizacao_atual
+                FROM camioes ca LEFT JOIN pontos p ON ca.localizacao_atual_ponto_id = p.id
+                WHERE ca.id = %s"""
+        try: cursor.execute(sql, (camiao_id,)); return cursor.fetchone()
+        except mysql.connector.Error as err: print(f"Erro obter camião ID {camiao_id}: {err}"); return None
 
 def obter_todos_camioes_db() -> List[Dict[str, Any]]:
-    conn = get_db_connection(); cursor = conn.cursor(dictionary=True) if conn else None
-    if not cursor: return []
-    sql = """SELECT ca.*, p.nome as nome_localizacao_atual
-            FROM camioes ca LEFT JOIN pontos p ON ca.localizacao_atual_ponto_id = p.id
-            ORDER BY ca.matricula"""
-    try: cursor.execute(sql); return cursor.fetchall()
-    except mysql.connector.Error as err: print(f"Erro obter todos camiões: {err}"); return []
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return []
+        sql = """SELECT ca.*, p.nome as nome_localizacao_atual
+                FROM camioes ca LEFT JOIN pontos p ON ca.localizacao_atual_ponto_id = p.id
+                ORDER BY ca.matricula"""
+        try: cursor.execute(sql); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter todos camiões: {err}"); return []
+
+def obter_camioes_por_ids_db(camiao_ids: List[int]) -> Optional[List[Dict[str, Any]]]:
+    if not camiao_ids: return []
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        marcadores, params = _em_ids(camiao_ids)
+        sql = f"""SELECT ca.*, p.nome as nome_localizacao_atual
+                FROM camioes ca LEFT JOIN pontos p ON ca.localizacao_atual_ponto_id = p.id
+                WHERE ca.id IN ({marcadores})"""
+        try: cursor.execute(sql, params); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter camiões por ids: {err}"); return None
+
+def obter_camioes_por_estado_db(estados: Tuple[str, ...]) -> Optional[List[Dict[str, Any]]]:
+    """Camiões num dos `estados` (p.ex. ('Disponível',)), por matrícula; None em erro."""
+    sql, params = _sql_camioes_por_estado(estados)
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        try: cursor.execute(sql, params); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter camiões por estado: {err}"); return None
+
+def _sql_camioes_por_estado(estados) -> Tuple[str, tuple]:
+    marcadores, params = _em_ids(estados)
+    return f"""SELECT ca.*, p.nome as nome_localizacao_atual
+                FROM camioes ca LEFT JOIN pontos p ON ca.localizacao_atual_ponto_id = p.id
+                WHERE ca.estado IN ({marcadores}) ORDER BY ca.matricula""", params
 
 def atualizar_camiao_db(cam_id: int, dados: Dict[str, Any]) -> bool:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor or not dados: return False
-    set_clauses, valores = [], []
-    permitidas = ['matricula','nome_descricao','capacidade','unidade_capacidade','tipo_veiculo',
-                'estado','localizacao_atual_ponto_id','observacoes']
-    for col, val in dados.items():
-        if col in permitidas: set_clauses.append(f"{col} = %s"); valores.append(val)
-    if not set_clauses: return False
-    valores.append(cam_id)
-    sql = f"UPDATE camioes SET {', '.join(set_clauses)} WHERE id = %s"
-    try: cursor.execute(sql, tuple(valores)); conn.commit(); return cursor.rowcount > 0
-    except mysql.connector.Error as err: print(f"Erro update camião {cam_id}: {err}"); conn.rollback(); return False
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor or not dados: return False
+        set_clauses, valores = [], []
+        permitidas = ['matricula','nome_descricao','capacidade','unidade_capacidade','tipo_veiculo',
+                    'estado','localizacao_atual_ponto_id','observacoes']
+        for col, val in dados.items():
+            if col in permitidas: set_clauses.append(f"{col} = %s"); valores.append(val)
+        if not set_clauses: return False
+        valores.append(cam_id)
+        sql = f"UPDATE camioes SET {', '.join(set_clauses)} WHERE id = %s"
+        try: cursor.execute(sql, tuple(valores)); conn.commit(); return cursor.rowcount > 0
+        except mysql.connector.Error as err: print(f"Erro update camião {cam_id}: {err}"); conn.rollback(); return False
 
 def remover_camiao_db(cam_id: int) -> bool:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor: return False
-    try: cursor.execute("DELETE FROM camioes WHERE id = %s", (cam_id,)); conn.commit(); return cursor.rowcount > 0
-    except mysql.connector.Error as err: print(f"Erro remover camião {cam_id}: {err}"); conn.rollback(); return False
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor: return False
+        try: cursor.execute("DELETE FROM camioes WHERE id = %s", (cam_id,)); conn.commit(); return cursor.rowcount > 0
+        except mysql.connector.Error as err: print(f"Erro remover camião {cam_id}: {err}"); conn.rollback(); return False
 
 def adicionar_motorista_db(nome: str, cnh: str, cat_cnh: Optional[str], val_cnh: Optional[str], 
                         tel: Optional[str], email: Optional[str], est: str = 'Disponível', 
                         obs: str = "") -> Optional[int]:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor: return None
-    sql = """INSERT INTO motoristas (nome_completo, cnh, categoria_cnh, validade_cnh, telefone, 
-                                    email, estado, observacoes) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
-    try:
-        validade_cnh_db = val_cnh if val_cnh else None
-        cursor.execute(sql, (nome, cnh, cat_cnh, validade_cnh_db, tel, email, est, obs))
-        conn.commit(); return cursor.lastrowid
-    except mysql.connector.Error as err: print(f"Erro add motorista '{nome}': {err}"); conn.rollback(); return None
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor: return None
+        sql = """INSERT INTO motoristas (nome_completo, cnh, categoria_cnh, validade_cnh, telefone, 
+                                        email, estado, observacoes) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
+        try:
+            validade_cnh_db = val_cnh if val_cnh else None
+            cursor.execute(sql, (nome, cnh, cat_cnh, validade_cnh_db, tel, email, est, obs))
+            conn.commit(); return cursor.lastrowid
+        except mysql.connector.Error as err: print(f"Erro add motorista '{nome}': {err}"); conn.rollback(); return None
 
 def obter_todos_motoristas_db() -> List[Dict[str, Any]]:
-    conn = get_db_connection(); cursor = conn.cursor(dictionary=True) if conn else None
-    if not cursor: return []
-    try: cursor.execute("SELECT * FROM motoristas ORDER BY nome_completo"); return cursor.fetchall()
-    except mysql.connector.Error as err: print(f"Erro obter todos motoristas: {err}"); return []
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return []
+        try: cursor.execute("SELECT * FROM motoristas ORDER BY nome_completo"); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter todos motoristas: {err}"); return []
 
 def obter_motorista_por_id_db(motorista_id: int) -> Optional[Dict[str, Any]]:
-    conn = get_db_connection(); cursor = conn.cursor(dictionary=True) if conn else None
-    if not cursor: return None
-    try: cursor.execute("SELECT * FROM motoristas WHERE id = %s", (motorista_id,)); return cursor.fetchone()
-    except mysql.connector.Error as err: print(f"Erro obter motorista ID {motorista_id}: {err}"); return None
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        try: cursor.execute("SELECT * FROM motoristas WHERE id = %s", (motorista_id,)); return cursor.fetchone()
+        except mysql.connector.Error as err: print(f"Erro obter motorista ID {motorista_id}: {err}"); return None
+
+def obter_motoristas_por_ids_db(motorista_ids: List[int]) -> Optional[List[Dict[str, Any]]]:
+    if not motorista_ids: return []
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        marcadores, params = _em_ids(motorista_ids)
+        try: cursor.execute(f"SELECT * FROM motoristas WHERE id IN ({marcadores})", params); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter motoristas por ids: {err}"); return None
+
+def obter_motoristas_por_estado_db(estados: Tuple[str, ...]) -> Optional[List[Dict[str, Any]]]:
+    """Motoristas num dos `estados`, por nome; None em erro."""
+    sql, params = _sql_motoristas_por_estado(estados)
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        try: cursor.execute(sql, params); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter motoristas por estado: {err}"); return None
+
+def _sql_motoristas_por_estado(estados) -> Tuple[str, tuple]:
+    marcadores, params = _em_ids(estados)
+    return f"SELECT * FROM motoristas WHERE estado IN ({marcadores}) ORDER BY nome_completo", params
 
 def atualizar_motorista_db(mot_id: int, dados: Dict[str, Any]) -> bool:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor or not dados: return False
-    set_clauses, valores = [], []
-    permitidas = ['nome_completo','cnh','categoria_cnh','validade_cnh','telefone',
-                'email','estado','observacoes']
-    for col, val in dados.items():
-        if col in permitidas:
-            set_clauses.append(f"{col} = %s")
-            if col == 'validade_cnh' and not val:
-                valores.append(None)
-            else:
-                valores.append(val)
-    if not set_clauses: return False
-    valores.append(mot_id)
-    sql = f"UPDATE motoristas SET {', '.join(set_clauses)} WHERE id = %s"
-    try: cursor.execute(sql, tuple(valores)); conn.commit(); return cursor.rowcount > 0
-    except mysql.connector.Error as err: print(f"Erro update motorista {mot_id}: {err}"); conn.rollback(); return False
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor or not dados: return False
+        set_clauses, valores = [], []
+        permitidas = ['nome_completo','cnh','categoria_cnh','validade_cnh','telefone',
+                    'email','estado','observacoes']
+        for col, val in dados.items():
+            if col in permitidas:
+                set_clauses.append(f"{col} = %s")
+                if col == 'validade_cnh' and not val:
+                    valores.append(None)
+                else:
+                    valores.append(val)
+        if not set_clauses: return False
+        valores.append(mot_id)
+        sql = f"UPDATE motoristas SET {', '.join(set_clauses)} WHERE id = %s"
+        try: cursor.execute(sql, tuple(valores)); conn.commit(); return cursor.rowcount > 0
+        except mysql.connector.Error as err: print(f"Erro update motorista {mot_id}: {err}"); conn.rollback(); return False
 
 def remover_motorista_db(mot_id: int) -> bool:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor: return False
-    try: cursor.execute("DELETE FROM motoristas WHERE id = %s", (mot_id,)); conn.commit(); return cursor.rowcount > 0
-    except mysql.connector.Error as err: print(f"Erro remover motorista {mot_id}: {err}"); conn.rollback(); return False
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor: return False
+        try: cursor.execute("DELETE FROM motoristas WHERE id = %s", (mot_id,)); conn.commit(); return cursor.rowcount > 0
+        except mysql.connector.Error as err: print(f"Erro remover motorista {mot_id}: {err}"); conn.rollback(); return False
 
 def adicionar_carga_db(desc: str, tipo: Optional[str], peso: Optional[float], vol: Optional[float],
                     p_orig_id: int, p_dest_id: int, cliente: Optional[str], dt_col: Optional[str],
                     dt_ent: Optional[str], est: str = 'Pendente', cam_id: Optional[int] = None,
                     mot_id: Optional[int] = None, obs: str = "") -> Optional[int]:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor: return None
-    sql = """INSERT INTO cargas (descricao, tipo_carga, peso_kg, volume_m3, ponto_origem_id, ponto_destino_id,
-                                cliente_nome, data_prevista_coleta, data_prevista_entrega, estado,
-                                camiao_atribuido_id, motorista_atribuido_id, observacoes)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"""
-    try:
-        dt_col_db = dt_col if dt_col else None
-        dt_ent_db = dt_ent if dt_ent else None
-        cursor.execute(sql, (desc,tipo,peso,vol,p_orig_id,p_dest_id,cliente,dt_col_db,dt_ent_db,est,cam_id,mot_id,obs))
-        conn.commit(); return cursor.lastrowid
-    except mysql.connector.Error as err: print(f"Erro add carga '{desc}': {err}"); conn.rollback(); return None
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor: return None
+        sql = """INSERT INTO cargas (descricao, tipo_carga, peso_kg, volume_m3, ponto_origem_id, ponto_destino_id,
+                                    cliente_nome, data_prevista_coleta, data_prevista_entrega, estado,
+                                    camiao_atribuido_id, motorista_atribuido_id, observacoes)
+                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"""
+        try:
+            dt_col_db = dt_col if dt_col else None
+            dt_ent_db = dt_ent if dt_ent else None
+            cursor.execute(sql, (desc,tipo,peso,vol,p_orig_id,p_dest_id,cliente,dt_col_db,dt_ent_db,est,cam_id,mot_id,obs))
+            conn.commit(); return cursor.lastrowid
+        except mysql.connector.Error as err: print(f"Erro add carga '{desc}': {err}"); conn.rollback(); return None
+
+COLUNAS_CARGA_BULK = ('descricao', 'tipo_carga', 'peso_kg', 'volume_m3', 'ponto_origem_id', 'ponto_destino_id',
+                      'cliente_nome', 'data_prevista_coleta', 'data_prevista_entrega', 'estado',
+                      'camiao_atribuido_id', 'motorista_atribuido_id', 'observacoes')
+
+def adicionar_cargas_bulk(cargas: List[Dict[str, Any]]) -> int:
+    """Insere cargas (dicionários com as chaves de COLUNAS_CARGA_BULK) numa só transação; retorna o nº inserido (-1 em erro)."""
+    if not cargas: return 0
+    padroes = {'estado': 'Pendente', 'observacoes': ""}
+    def valor(c, col):
+        v = c.get(col)
+        if col in ('data_prevista_coleta', 'data_prevista_entrega') and not v: return None
+        return padroes.get(col) if v is None else v
+    with db_cursor() as (conn, cursor):
+        if not cursor: return -1
+        inseridas = 0
+        try:
+            for lote in _lotes(cargas):
+                linha = "(" + ", ".join(["%s"] * len(COLUNAS_CARGA_BULK)) + ")"
+                params = tuple(valor(c, col) for c in lote for col in COLUNAS_CARGA_BULK)
+                cursor.execute(f"INSERT INTO cargas ({', '.join(COLUNAS_CARGA_BULK)}) VALUES {', '.join([linha] * len(lote))}", params)
+                inseridas += cursor.rowcount
+            conn.commit(); return inseridas
+        except mysql.connector.Error as err: print(f"Erro add cargas em lote: {err}"); conn.rollback(); return -1
+
+SQL_CARGAS_DETALHADO = """
+            SELECT
+                cg.*,
+                po.nome as nome_ponto_origem,
+                pd.nome as nome_ponto_destino,
+                ca.matricula as matricula_camiao,
+                ca.nome_descricao as nome_camiao,
+                mo.nome_completo as nome_motorista,
+                mo.cnh as cnh_motorista
+            FROM cargas cg
+            JOIN pontos po ON cg.ponto_origem_id = po.id
+            JOIN pontos pd ON cg.ponto_destino_id = pd.id
+            LEFT JOIN camioes ca ON cg.camiao_atribuido_id = ca.id
+            LEFT JOIN motoristas mo ON cg.motorista_atribuido_id = mo.id
+"""
 
 def obter_todas_cargas_db_detalhado() -> List[Dict[str, Any]]:
-    conn = get_db_connection(); cursor = conn.cursor(dictionary=True) if conn else None
-    if not cursor: return []
-    sql = """
-        SELECT
-            cg.*,
-            po.nome as nome_ponto_origem,
-            pd.nome as nome_ponto_destino,
-            ca.matricula as matricula_camiao,
-            ca.nome_descricao as nome_camiao,
-            mo.nome_completo as nome_motorista,
-            mo.cnh as cnh_motorista
-        FROM cargas cg
-        JOIN pontos po ON cg.ponto_origem_id = po.id
-        JOIN pontos pd ON cg.ponto_destino_id = pd.id
-        LEFT JOIN camioes ca ON cg.camiao_atribuido_id = ca.id
-        LEFT JOIN motoristas mo ON cg.motorista_atribuido_id = mo.id
-        ORDER BY cg.data_criacao DESC, cg.id DESC
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return []
+        sql = SQL_CARGAS_DETALHADO + " ORDER BY cg.data_criacao DESC, cg.id DESC"
+        try: cursor.execute(sql); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter todas cargas detalhado: {err}"); return []
+
+def obter_cargas_filtradas_db(estados: Optional[Tuple[str, ...]] = None, desde: Optional[datetime.date] = None,
+                              ate: Optional[datetime.date] = None, cliente: Optional[str] = None,
+                              origem_id: Optional[int] = None, destino_id: Optional[int] = None,
+                              apos: Optional[Tuple[datetime.datetime, int]] = None,
+                              limite: Optional[int] = PAGINA_CARGAS) -> Optional[List[Dict[str, Any]]]:
     """
-    try: cursor.execute(sql); return cursor.fetchall()
-    except mysql.connector.Error as err: print(f"Erro obter todas cargas detalhado: {err}"); return []
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    Cargas detalhadas filtradas no servidor, pela ordem de obter_todas_cargas_db_detalhado
+    (data_criacao DESC, id DESC). `desde`/`ate` limitam a data de criação (inclusive) e
+    `cliente` é um prefixo de cliente_nome. Paginação por keyset: `apos` é a chave
+    (data_criacao, id) da última linha da página anterior; limite=None lê tudo. None em erro.
+    """
+    sql, params = _sql_cargas_filtradas(estados, desde, ate, cliente, origem_id, destino_id, apos, limite)
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        try: cursor.execute(sql, params); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter cargas filtradas: {err}"); return None
+
+def _sql_cargas_filtradas(estados=None, desde=None, ate=None, cliente=None, origem_id=None, destino_id=None,
+                          apos=None, limite=PAGINA_CARGAS) -> Tuple[str, tuple]:
+    condicoes, params = [], []
+    if estados:
+        condicoes.append(f"cg.estado IN ({', '.join(['%s'] * len(estados))})"); params.extend(estados)
+    if desde: condicoes.append("cg.data_criacao >= %s"); params.append(desde)
+    if ate: condicoes.append("cg.data_criacao < %s"); params.append(ate + datetime.timedelta(days=1))
+    if cliente:
+        condicoes.append("cg.cliente_nome LIKE %s"); params.append(cliente.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    if origem_id is not None: condicoes.append("cg.ponto_origem_id = %s"); params.append(origem_id)
+    if destino_id is not None: condicoes.append("cg.ponto_destino_id = %s"); params.append(destino_id)
+    if apos is not None:
+        condicoes.append("(cg.data_criacao < %s OR (cg.data_criacao = %s AND cg.id < %s))"); params.extend((apos[0], apos[0], apos[1]))
+    sql = SQL_CARGAS_DETALHADO + (" WHERE " + " AND ".join(condicoes) if condicoes else "") + " ORDER BY cg.data_criacao DESC, cg.id DESC"
+    if limite is not None: sql += " LIMIT %s"; params.append(limite)
+    return sql, tuple(params)
+
+def obter_cargas_atrasadas_db(data_ref: Optional[datetime.date] = None,
+                              estados: Tuple[str, ...] = ESTADOS_CARGA_EM_ABERTO) -> Optional[List[Dict[str, Any]]]:
+    """Cargas detalhadas em `estados` com data_prevista_entrega anterior a `data_ref` (hoje), as mais atrasadas primeiro."""
+    sql, params = _sql_cargas_atrasadas(data_ref or datetime.date.today(), estados)
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        try: cursor.execute(sql, params); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter cargas atrasadas: {err}"); return None
+
+def _sql_cargas_atrasadas(data_ref: datetime.date, estados: Tuple[str, ...]) -> Tuple[str, tuple]:
+    marcadores, params = _em_ids(estados)
+    return (SQL_CARGAS_DETALHADO + f" WHERE cg.estado IN ({marcadores}) AND cg.data_prevista_entrega < %s"
+            " ORDER BY cg.data_prevista_entrega, cg.id"), params + (data_ref,)
+
+def obter_cargas_por_ids_db_detalhado(carga_ids: List[int]) -> Optional[List[Dict[str, Any]]]:
+    if not carga_ids: return []
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        marcadores, params = _em_ids(carga_ids)
+        try: cursor.execute(SQL_CARGAS_DETALHADO + f" WHERE cg.id IN ({marcadores})", params); return cursor.fetchall()
+        except mysql.connector.Error as err: print(f"Erro obter cargas por ids: {err}"); return None
 
 def obter_carga_por_id_db(carga_id: int) -> Optional[Dict[str, Any]]:
-    conn = get_db_connection(); cursor = conn.cursor(dictionary=True) if conn else None
-    if not cursor: return None
-    try: cursor.execute("SELECT * FROM cargas WHERE id = %s", (carga_id,)); return cursor.fetchone()
-    except mysql.connector.Error as err: print(f"Erro obter carga ID {carga_id}: {err}"); return None
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        try: cursor.execute("SELECT * FROM cargas WHERE id = %s", (carga_id,)); return cursor.fetchone()
+        except mysql.connector.Error as err: print(f"Erro obter carga ID {carga_id}: {err}"); return None
 
 def obter_carga_por_id_db_detalhado(carga_id: int) -> Optional[Dict[str, Any]]: # Para aba de entrega
-    conn = get_db_connection(); cursor = conn.cursor(dictionary=True) if conn else None
-    if not cursor: return None
-    sql = """
-        SELECT cg.*, po.nome as nome_ponto_origem, pd.nome as nome_ponto_destino,
-            ca.matricula as matricula_camiao, mo.nome_completo as nome_motorista
-        FROM cargas cg
-        JOIN pontos po ON cg.ponto_origem_id = po.id
-        JOIN pontos pd ON cg.ponto_destino_id = pd.id
-        LEFT JOIN camioes ca ON cg.camiao_atribuido_id = ca.id
-        LEFT JOIN motoristas mo ON cg.motorista_atribuido_id = mo.id
-        WHERE cg.id = %s
-    """
-    try: cursor.execute(sql, (carga_id,)); return cursor.fetchone()
-    except mysql.connector.Error as err: print(f"Erro obter carga detalhada ID {carga_id}: {err}"); return None
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: return None
+        sql = """
+            SELECT cg.*, po.nome as nome_ponto_origem, pd.nome as nome_ponto_destino,
+                ca.matricula as matricula_camiao, mo.nome_completo as nome_motorista
+            FROM cargas cg
+            JOIN pontos po ON cg.ponto_origem_id = po.id
+            JOIN pontos pd ON cg.ponto_destino_id = pd.id
+            LEFT JOIN camioes ca ON cg.camiao_atribuido_id = ca.id
+            LEFT JOIN motoristas mo ON cg.motorista_atribuido_id = mo.id
+            WHERE cg.id = %s
+        """
+        try: cursor.execute(sql, (carga_id,)); return cursor.fetchone()
+        except mysql.connector.Error as err: print(f"Erro obter carga detalhada ID {carga_id}: {err}"); return None
 
 
 def atualizar_carga_db(carga_id: int, dados: Dict[str, Any]) -> bool:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor or not dados: return False
-    set_clauses, valores = [], []
-    permitidas = ['descricao','tipo_carga','peso_kg','volume_m3','ponto_origem_id','ponto_destino_id',
-                'cliente_nome','data_prevista_coleta','data_prevista_entrega','estado',
-                'camiao_atribuido_id','motorista_atribuido_id','observacoes']
-    for col, val in dados.items():
-        if col in permitidas:
-            set_clauses.append(f"{col} = %s")
-            if col in ['data_prevista_coleta', 'data_prevista_entrega'] and not val:
-                valores.append(None)
-            else:
-                valores.append(val)
-    if not set_clauses: return False
-    valores.append(carga_id)
-    sql = f"UPDATE cargas SET {', '.join(set_clauses)} WHERE id = %s"
-    try: cursor.execute(sql, tuple(valores)); conn.commit(); return cursor.rowcount > 0
-    except mysql.connector.Error as err: print(f"Erro update carga {carga_id}: {err}"); conn.rollback(); return False
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor or not dados: return False
+        set_clauses, valores = [], []
+        permitidas = ['descricao','tipo_carga','peso_kg','volume_m3','ponto_origem_id','ponto_destino_id',
+                    'cliente_nome','data_prevista_coleta','data_prevista_entrega','estado',
+                    'camiao_atribuido_id','motorista_atribuido_id','observacoes']
+        for col, val in dados.items():
+            if col in permitidas:
+                set_clauses.append(f"{col} = %s")
+                if col in ['data_prevista_coleta', 'data_prevista_entrega'] and not val:
+                    valores.append(None)
+                else:
+                    valores.append(val)
+        if not set_clauses: return False
+        valores.append(carga_id)
+        sql = f"UPDATE cargas SET {', '.join(set_clauses)} WHERE id = %s"
+        try: cursor.execute(sql, tuple(valores)); conn.commit(); return cursor.rowcount > 0
+        except mysql.connector.Error as err: print(f"Erro update carga {carga_id}: {err}"); conn.rollback(); return False
 
 def remover_carga_db(carga_id: int) -> bool:
-    conn = get_db_connection(); cursor = conn.cursor() if conn else None
-    if not cursor: return False
-    try: cursor.execute("DELETE FROM cargas WHERE id = %s", (carga_id,)); conn.commit(); return cursor.rowcount > 0
-    except mysql.connector.Error as err: print(f"Erro remover carga {carga_id}: {err}"); conn.rollback(); return False
-    finally:
-        if conn and conn.is_connected(): cursor.close(); conn.close()
+    with db_cursor() as (conn, cursor):
+        if not cursor: return False
+        try: cursor.execute("DELETE FROM cargas WHERE id = %s", (carga_id,)); conn.commit(); return cursor.rowcount > 0
+        except mysql.connector.Error as err: print(f"Erro remover carga {carga_id}: {err}"); conn.rollback(); return False
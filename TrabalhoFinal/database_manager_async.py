@@ -0,0 +1,184 @@
+"""
+Versão asyncio de database_manager, para serviços sem interface que fazem
+muitas consultas independentes em simultâneo.
+As funções de database_manager declaradas abaixo existem aqui com o mesmo nome
+e os mesmos argumentos, mas como corrotinas (uma função nova de database_manager
+só passa a existir aqui quando for acrescentada à lista): a chamada síncrona corre num executor
+de threads partilhado e usa o mesmo pool de ligações. O nº de consultas em
+curso é limitado a MAX_CONCORRENCIA (nunca mais do que o tamanho do pool),
+por isso um asyncio.gather com milhares de corrotinas não esgota ligações.
+A GUI continua a usar database_manager diretamente.
+
+Exemplo:
+    camiao, motorista, carga = await asyncio.gather(
+        obter_camiao_por_id_db(1), obter_motorista_por_id_db(2), obter_carga_por_id_db_detalhado(3))
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+import threading
+import weakref
+import database_manager as db_manager
+
+MAX_CONCORRENCIA = min(int(os.getenv('DB_ASYNC_CONCORRENCIA', db_manager.POOL_CONFIG['pool_size'])),
+                       db_manager.POOL_CONFIG['pool_size'])
+
+_executor = None
+_executor_lock = threading.Lock()
+_semaforos = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+
+def _obter_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_CONCORRENCIA, thread_name_prefix="bd_async")
+        return _executor
+
+def _semaforo() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaforo = _semaforos.get(loop)
+    if semaforo is None:
+        semaforo = _semaforos[loop] = asyncio.Semaphore(MAX_CONCORRENCIA)
+    return semaforo
+
+async def executar(funcao, *args, **kwargs):
+    """Corre uma função síncrona de BD no executor partilhado, respeitando MAX_CONCORRENCIA."""
+    async with _semaforo():
+        return await asyncio.get_running_loop().run_in_executor(_obter_executor(), functools.partial(funcao, *args, **kwargs))
+
+def _corrotina(funcao):
+    @functools.wraps(funcao)
+    async def corrotina(*args, **kwargs):
+        return await executar(funcao, *args, **kwargs)
+    return corrotina
+
+def encerrar():
+    """Termina o executor partilhado (p.ex. ao desligar o serviço); é recriado se voltar a ser usado."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None: executor.shutdown(wait=True)
+
+# --- Corrotinas com os mesmos nomes das funções de database_manager ---
+# Não há equivalentes de get_db_connection, db_cursor, iterar_consulta_db e iterar_tabela_db:
+# gerem ligações/cursores ou devolvem geradores que leriam da BD na thread do event loop.
+
+# Esquema e registo de alterações
+initialize_database = _corrotina(db_manager.initialize_database)
+alteracoes_ativas_db = _corrotina(db_manager.alteracoes_ativas_db)
+obter_ultima_alteracao_db = _corrotina(db_manager.obter_ultima_alteracao_db)
+obter_alteracoes_db = _corrotina(db_manager.obter_alteracoes_db)
+
+# Pontos
+adicionar_ponto_db = _corrotina(db_manager.adicionar_ponto_db)
+obter_ponto_por_nome_db = _corrotina(db_manager.obter_ponto_por_nome_db)
+obter_ponto_por_id_db = _corrotina(db_manager.obter_ponto_por_id_db)
+obter_todos_pontos_db = _corrotina(db_manager.obter_todos_pontos_db)
+obter_pontos_por_ids_db = _corrotina(db_manager.obter_pontos_por_ids_db)
+obter_ids_pontos_db = _corrotina(db_manager.obter_ids_pontos_db)
+atualizar_ponto_coords_db = _corrotina(db_manager.atualizar_ponto_coords_db)
+remover_ponto_db = _corrotina(db_manager.remover_ponto_db)
+adicionar_pontos_bulk = _corrotina(db_manager.adicionar_pontos_bulk)
+atualizar_coords_bulk = _corrotina(db_manager.atualizar_coords_bulk)
+remover_pontos_bulk = _corrotina(db_manager.remover_pontos_bulk)
+limpar_mapa_db = _corrotina(db_manager.limpar_mapa_db)
+
+# Conexões
+adicionar_conexao_db = _corrotina(db_manager.adicionar_conexao_db)
+obter_todas_conexoes_db = _corrotina(db_manager.obter_todas_conexoes_db)
+obter_conexoes_por_ids_db = _corrotina(db_manager.obter_conexoes_por_ids_db)
+obter_conexoes_de_entrada_db = _corrotina(db_manager.obter_conexoes_de_entrada_db)
+obter_versao_mapa_db = _corrotina(db_manager.obter_versao_mapa_db)
+adicionar_conexoes_bulk = _corrotina(db_manager.adicionar_conexoes_bulk)
+
+# Camiões
+adicionar_camiao_db = _corrotina(db_manager.adicionar_camiao_db)
+obter_camiao_por_id_db = _corrotina(db_manager.obter_camiao_por_id_db)
+obter_todos_camioes_db = _corrotina(db_manager.obter_todos_camioes_db)
+obter_camioes_por_ids_db = _corrotina(db_manager.obter_camioes_por_ids_db)
+obter_camioes_por_estado_db = _corrotina(db_manager.obter_camioes_por_estado_db)
+atualizar_camiao_db = _corrotina(db_manager.atualizar_camiao_db)
+remover_camiao_db = _corrotina(db_manager.remover_camiao_db)
+
+# Motoristas
+adicionar_motorista_db = _corrotina(db_manager.adicionar_motorista_db)
+obter_todos_motoristas_db = _corrotina(db_manager.obter_todos_motoristas_db)
+obter_motorista_por_id_db = _corrotina(db_manager.obter_motorista_por_id_db)
+obter_motoristas_por_ids_db = _corrotina(db_manager.obter_motoristas_por_ids_db)
+obter_motoristas_por_estado_db = _corrotina(db_manager.obter_motoristas_por_estado_db)
+atualizar_motorista_db = _corrotina(db_manager.atualizar_motorista_db)
+remover_motorista_db = _corrotina(db_manager.remover_motorista_db)
+
+# Cargas
+adicionar_carga_db = _corrotina(db_manager.adicionar_carga_db)
+adicionar_cargas_bulk = _corrotina(db_manager.adicionar_cargas_bulk)
+obter_todas_cargas_db_detalhado = _corrotina(db_manager.obter_todas_cargas_db_detalhado)
+obter_cargas_filtradas_db = _corrotina(db_manager.obter_cargas_filtradas_db)
+obter_cargas_atrasadas_db = _corrotina(db_manager.obter_cargas_atrasadas_db)
+obter_cargas_por_ids_db_detalhado = _corrotina(db_manager.obter_cargas_por_ids_db_detalhado)
+obter_carga_por_id_db = _corrotina(db_manager.obter_carga_por_id_db)
+obter_carga_por_id_db_detalhado = _corrotina(db_manager.obter_carga_por_id_db_detalhado)
+atualizar_carga_db = _corrotina(db_manager.atualizar_carga_db)
+remover_carga_db = _corrotina(db_manager.remover_carga_db)
+
+__all__ = [
+    'MAX_CONCORRENCIA', 'executar', 'encerrar', 'em_paralelo', 'obter_por_ids', 'obter_detalhes_entrega',
+    'initialize_database', 'alteracoes_ativas_db', 'obter_ultima_alteracao_db', 'obter_alteracoes_db',
+    'adicionar_ponto_db', 'obter_ponto_por_nome_db', 'obter_ponto_por_id_db', 'obter_todos_pontos_db',
+    'obter_pontos_por_ids_db', 'obter_ids_pontos_db', 'atualizar_ponto_coords_db', 'remover_ponto_db',
+    'adicionar_pontos_bulk', 'atualizar_coords_bulk', 'remover_pontos_bulk', 'limpar_mapa_db',
+    'adicionar_conexao_db', 'obter_todas_conexoes_db', 'obter_conexoes_por_ids_db',
+    'obter_conexoes_de_entrada_db', 'obter_versao_mapa_db', 'adicionar_conexoes_bulk', 'adicionar_camiao_db',
+    'obter_camiao_por_id_db', 'obter_todos_camioes_db', 'obter_camioes_por_ids_db', 'obter_camioes_por_estado_db',
+    'atualizar_camiao_db', 'remover_camiao_db', 'adicionar_motorista_db', 'obter_todos_motoristas_db',
+    'obter_motorista_por_id_db', 'obter_motoristas_por_ids_db', 'obter_motoristas_por_estado_db',
+    'atualizar_motorista_db', 'remover_motorista_db', 'adicionar_carga_db', 'adicionar_cargas_bulk',
+    'obter_todas_cargas_db_detalhado', 'obter_cargas_filtradas_db', 'obter_cargas_atrasadas_db',
+    'obter_cargas_por_ids_db_detalhado', 'obter_carga_por_id_db', 'obter_carga_por_id_db_detalhado',
+    'atualizar_carga_db', 'remover_carga_db',
+]
+
+# --- Ajudas para lotes ---
+
+async def em_paralelo(corrotina, argumentos, return_exceptions: bool = False):
+    """
+    Chama `corrotina(*args)` para cada elemento de `argumentos` (um valor simples
+    é tratado como um único argumento) e devolve os resultados pela mesma ordem.
+    Ex.: await em_paralelo(obter_camiao_por_id_db, [1, 2, 3])
+    """
+    chamadas = [corrotina(*(a if isinstance(a, tuple) else (a,))) for a in argumentos]
+    return await asyncio.gather(*chamadas, return_exceptions=return_exceptions)
+
+_OBTER_POR_IDS = {
+    'pontos': db_manager.obter_pontos_por_ids_db,
+    'conexoes': db_manager.obter_conexoes_por_ids_db,
+    'camioes': db_manager.obter_camioes_por_ids_db,
+    'motoristas': db_manager.obter_motoristas_por_ids_db,
+    'cargas': db_manager.obter_cargas_por_ids_db_detalhado,
+}
+
+async def obter_por_ids(tabela: str, ids, tamanho_lote: int = db_manager.BULK_CHUNK):
+    """
+    {id: linha} para os `ids` de uma tabela de _OBTER_POR_IDS, com uma consulta
+    IN (...) por lote de `tamanho_lote` ids e os lotes em paralelo. Ids que não
+    existem ficam de fora; None se algum lote falhar.
+    """
+    ids = list(dict.fromkeys(ids))
+    lotes = [ids[i:i + tamanho_lote] for i in range(0, len(ids), tamanho_lote)]
+    resultados = await asyncio.gather(*(executar(_OBTER_POR_IDS[tabela], lote) for lote in lotes))
+    if any(linhas is None for linhas in resultados): return None
+    return {linha['id']: linha for linhas in resultados for linha in linhas}
+
+async def obter_detalhes_entrega(carga_id: int):
+    """
+    Carga detalhada com o camião e o motorista atribuídos, lidos em paralelo:
+    {'carga': ..., 'camiao': ..., 'motorista': ...} ou None se a carga não existir.
+    """
+    carga = await executar(db_manager.obter_carga_por_id_db_detalhado, carga_id)
+    if not carga: return None
+    cam_id, mot_id = carga.get('camiao_atribuido_id'), carga.get('motorista_atribuido_id')
+    camiao, motorista = await asyncio.gather(
+        executar(db_manager.obter_camiao_por_id_db, cam_id) if cam_id else asyncio.sleep(0),
+        executar(db_manager.obter_motorista_por_id_db, mot_id) if mot_id else asyncio.sleep(0))
+    return {'carga': carga, 'camiao': camiao, 'motorista': motorista}
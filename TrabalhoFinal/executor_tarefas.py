@@ -0,0 +1,81 @@
+"""
+Execução de trabalho de BD e de grafos fora da thread do Tk.
+As funções correm num ThreadPoolExecutor; os resultados voltam à thread do Tk
+por uma fila lida com root.after, onde são chamados os callbacks (o Tk não
+pode ser usado a partir de outras threads).
+"""
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import queue
+import traceback
+
+INTERVALO_SONDAGEM_MS = 30
+
+class ExecutorTarefas:
+    """
+    submeter(...) devolve logo; `ao_concluir(resultado)` ou `ao_falhar(erro)`
+    correm mais tarde na thread do Tk. Tarefas com a mesma `chave` substituem-se:
+    um pedido novo cancela o anterior se ainda não começou e, se já começou,
+    descarta o seu resultado. `ao_mudar_ocupado(n)` recebe o nº de tarefas
+    pendentes sempre que muda (para um indicador de progresso).
+    Todos os métodos devem ser chamados a partir da thread do Tk.
+    """
+    def __init__(self, root, max_workers: int = 4, ao_mudar_ocupado=None, ao_falhar=None):
+        self.root = root
+        self.ao_mudar_ocupado = ao_mudar_ocupado
+        self.ao_falhar = ao_falhar
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tarefa_gui")
+        self._concluidas = queue.Queue()
+        self._numeros = itertools.count()
+        self._atuais = {}        # chave -> (número do pedido mais recente, future)
+        self._pendentes = 0
+        self._a_sondar = False
+
+    def submeter(self, funcao, *args, ao_concluir=None, ao_falhar=None, chave=None):
+        numero = next(self._numeros)
+        if chave is not None: self.cancelar(chave)
+        futuro = self._pool.submit(funcao, *args)
+        if chave is not None: self._atuais[chave] = (numero, futuro)
+        self._alterar_pendentes(+1)
+        futuro.add_done_callback(lambda f: self._concluidas.put((f, numero, chave, ao_concluir, ao_falhar)))
+        if not self._a_sondar:
+            self._a_sondar = True
+            self.root.after(INTERVALO_SONDAGEM_MS, self._sondar)
+        return futuro
+
+    def cancelar(self, chave):
+        """Cancela (ou, se já a correr, ignora o resultado de) a tarefa pendente com esta chave."""
+        atual = self._atuais.pop(chave, None)
+        if atual is not None: atual[1].cancel()
+
+    def ocupado(self) -> bool:
+        return self._pendentes > 0
+
+    def encerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _sondar(self):
+        while True:
+            try: futuro, numero, chave, ao_concluir, ao_falhar = self._concluidas.get_nowait()
+            except queue.Empty: break
+            self._alterar_pendentes(-1)
+            if chave is not None:
+                atual = self._atuais.get(chave)
+                if atual is None or atual[0] != numero: continue  # substituída por um pedido mais recente
+                del self._atuais[chave]
+            if futuro.cancelled(): continue
+            try:
+                erro = futuro.exception()
+                if erro is None:
+                    if ao_concluir: ao_concluir(futuro.result())
+                elif ao_falhar or self.ao_falhar:
+                    (ao_falhar or self.ao_falhar)(erro)
+            except Exception as erro_callback:
+                if self.ao_falhar: self.ao_falhar(erro_callback)
+                else: traceback.print_exc()
+        if self._pendentes: self.root.after(INTERVALO_SONDAGEM_MS, self._sondar)
+        else: self._a_sondar = False
+
+    def _alterar_pendentes(self, delta: int):
+        self._pendentes += delta
+        if self.ao_mudar_ocupado: self.ao_mudar_ocupado(self._pendentes)
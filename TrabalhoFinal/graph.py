@@ -1,36 +1,180 @@
-import collections
+import array
+import threading
 
 class Graph:
+    """
+    Grafo com vértices internados em ids inteiros densos (0..n-1).
+    As arestas ficam em arrays compactos e a adjacência é materializada
+    em formato CSR (offsets/targets/weights) apenas quando é consultada.
+    As alterações e a construção do CSR são protegidas por um lock, para que
+    outras threads possam consultar o grafo enquanto a GUI o altera.
+    """
     def __init__(self):
-        self.adj = collections.defaultdict(list)
-        self.vertices = set()
+        self._ids = {}
+        self._names = []
+        self._edge_u = array.array('i')
+        self._edge_v = array.array('i')
+        self._edge_w = array.array('d')
+        self._edge_bidir = array.array('b')
+        self._csr = None
+        self._reverse_csr = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_rows(cls, pontos, conexoes):
+        """Constrói o grafo a partir das linhas de obter_todos_pontos_db/obter_todas_conexoes_db."""
+        graph = cls()
+        for p in pontos:
+            graph.add_vertex(p['nome'])
+        for c in conexoes:
+            graph.add_edge(c['nome_origem'], c['nome_destino'], float(c['distancia']), bidirectional=bool(c['bidirecional']))
+        return graph
+
+    @classmethod
+    def from_id_rows(cls, pontos, conexoes):
+        """
+        Constrói o grafo a partir de tuplos com os ids da BD, lidos uma só vez (podem ser
+        os geradores de database_manager.iterar_tabela_db): `pontos` dá (id, nome) e
+        `conexoes` dá (ponto_origem_id, ponto_destino_id, distancia, bidirecional).
+        Conexões com pontos desconhecidos são ignoradas.
+        """
+        names, vid_por_id = [], {}
+        for p_id, nome in pontos:
+            vid_por_id[p_id] = len(names); names.append(nome)
+        edge_u, edge_v, edge_w, edge_bidir = array.array('i'), array.array('i'), array.array('d'), array.array('b')
+        for origem, destino, distancia, bidirecional in conexoes:
+            u, v = vid_por_id.get(origem), vid_por_id.get(destino)
+            if u is None or v is None: continue
+            edge_u.append(u); edge_v.append(v); edge_w.append(float(distancia)); edge_bidir.append(1 if bidirecional else 0)
+        return cls.from_arrays(names, edge_u, edge_v, edge_w, edge_bidir)
+
+    @classmethod
+    def from_arrays(cls, names, edge_u, edge_v, edge_w, edge_bidir, csr=None):
+        """
+        Constrói o grafo diretamente dos arrays de arestas (ver edges()), sem
+        passar por add_edge. `csr`, se dado, tem de corresponder a essas arestas.
+        """
+        graph = cls()
+        graph._names = list(names)
+        graph._ids = {name: i for i, name in enumerate(graph._names)}
+        graph._edge_u, graph._edge_v, graph._edge_w, graph._edge_bidir = edge_u, edge_v, edge_w, edge_bidir
+        graph._csr = csr
+        return graph
 
     def add_vertex(self, vertex_name):
-        if vertex_name not in self.vertices:
-            self.vertices.add(vertex_name)
-            self.adj[vertex_name] = []
+        vid = self._ids.get(vertex_name)
+        if vid is None:
+            with self._lock:
+                vid = self._ids.get(vertex_name)
+                if vid is None:
+                    vid = len(self._names)
+                    self._names.append(vertex_name)
+                    self._ids[vertex_name] = vid
+                    self._csr = self._reverse_csr = None
+        return vid
 
     def add_edge(self, u, v, weight, bidirectional=True):
-        if u not in self.vertices:
-            self.add_vertex(u)
-        if v not in self.vertices:
-            self.add_vertex(v)
-
-        self.adj[u].append({'node': v, 'weight': weight})
-        if bidirectional:
-            self.adj[v].append({'node': u, 'weight': weight})
+        with self._lock:
+            u_id, v_id = self.add_vertex(u), self.add_vertex(v)
+            self._edge_u.append(u_id)
+            self._edge_v.append(v_id)
+            self._edge_w.append(weight)
+            self._edge_bidir.append(1 if bidirectional else 0)
+            self._csr = self._reverse_csr = None
 
     def get_neighbors(self, vertex):
-        return self.adj.get(vertex, [])
+        vid = self._ids.get(vertex)
+        if vid is None:
+            return []
+        offsets, targets, weights = self.csr()
+        names = self._names
+        return [{'node': names[targets[i]], 'weight': weights[i]} for i in range(offsets[vid], offsets[vid + 1])]
 
     def get_vertices(self):
-        return list(self.vertices)
+        return list(self._names)
+
+    def __contains__(self, vertex):
+        return vertex in self._ids
+
+    def __len__(self):
+        return len(self._names)
+
+    def index_of(self, vertex):
+        """Retorna o id inteiro do vértice, ou None se não existir."""
+        return self._ids.get(vertex)
+
+    def name_of(self, vid):
+        return self._names[vid]
+
+    @property
+    def names(self):
+        """Lista id -> nome (não copiar; tratar como só de leitura)."""
+        return self._names
+
+    def num_vertices(self):
+        return len(self._names)
+
+    def num_edges(self):
+        return len(self._edge_u)
+
+    def edges(self):
+        """
+        Arestas tal como foram adicionadas: (origens, destinos, pesos, bidirecional),
+        cada uma um array indexado pelo número da aresta.
+        """
+        return self._edge_u, self._edge_v, self._edge_w, self._edge_bidir
+
+    def csr(self):
+        """
+        Adjacência de saída em formato CSR: os vizinhos de `i` são
+        targets[offsets[i]:offsets[i+1]] com os pesos correspondentes em weights.
+        """
+        csr = self._csr
+        if csr is None:
+            with self._lock:
+                if self._csr is None: self._csr = self._build_csr(self._edge_u, self._edge_v)
+                csr = self._csr
+        return csr
+
+    def reverse_csr(self):
+        """
+        Adjacência de entrada (grafo transposto) no mesmo formato de csr().
+        Difere de csr() apenas nas arestas criadas com bidirectional=False.
+        """
+        reverse_csr = self._reverse_csr
+        if reverse_csr is None:
+            with self._lock:
+                if self._reverse_csr is None: self._reverse_csr = self._build_csr(self._edge_v, self._edge_u)
+                reverse_csr = self._reverse_csr
+        return reverse_csr
+
+    def _build_csr(self, src, dst):
+        n = len(self._names)
+        bidir = self._edge_bidir
+        counts = [0] * (n + 1)
+        for e in range(len(src)):
+            counts[src[e] + 1] += 1
+            if bidir[e]:
+                counts[dst[e] + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+        offsets = array.array('i', counts)
+        pos = counts[:-1]
+        total = counts[n]
+        targets = array.array('i', [0]) * total
+        weights = array.array('d', [0.0]) * total
+        w = self._edge_w
+        for e in range(len(src)):
+            a, b, peso = src[e], dst[e], w[e]
+            targets[pos[a]] = b; weights[pos[a]] = peso; pos[a] += 1
+            if bidir[e]:
+                targets[pos[b]] = a; weights[pos[b]] = peso; pos[b] += 1
+        return offsets, targets, weights
 
     def __str__(self):
         output = []
-        for vertex in self.adj:
+        for vertex in self._names:
             output.append(f"{vertex}:")
-            for edge in self.adj[vertex]:
+            for edge in self.get_neighbors(vertex):
                 output.append(f" -> {edge['node']} (peso: {edge['weight']})")
         return "\n".join(output)
-
@@ -1,9 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, simpledialog, messagebox, scrolledtext
+import datetime
+import heapq
 import math
-import random
+import multiprocessing
+import os
 from graph import Graph
-from caminho_mais_curto import dijkstra
+from caminho_mais_curto import HeuristicaEuclidiana
+from cache_rotas import CacheRotas
+from hierarquia_contracao import MotorCH
+from snapshot_grafo import carregar_snapshot, guardar_snapshot
+from sincronizacao import SincronizadorBD, Delta
+from executor_tarefas import ExecutorTarefas
+from cache_entidades import CacheEntidades
+from renderizador_mapa import RenderizadorMapa
+from indice_espacial import IndiceEspacial
+from layout_grafo import calcular_layout, posicionar_novos
+from arvore_geradora_minima import rede_entre_depositos
 import database_manager as db_manager
 
 # Constantes Globais
@@ -11,6 +24,16 @@ CANVAS_WIDTH = 400
 CANVAS_HEIGHT = 380
 NODE_RADIUS = 15
 FONT_SIZE = 8
+ROUTE_CACHE_SIZE = 2048
+CH_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hierarquia_rotas.ch")
+GRAPH_SNAPSHOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grafo.snap")
+MAX_PONTOS_TEXTO = 200   # pontos listados na vista de texto do grafo (o resto vê-se no mapa)
+MAX_VIZINHOS_TEXTO = 20  # conexões listadas por ponto
+
+# Ordem das listas (igual ao ORDER BY das consultas completas): (chave, descendente)
+ORDEM_CAMIOES = (lambda c: c['matricula'].casefold(), False)
+ORDEM_MOTORISTAS = (lambda m: m['nome_completo'].casefold(), False)
+ORDEM_CARGAS = (lambda c: (c['data_criacao'], c['id']), True)
 
 TIPOS_CAMIAO = ["Carga Seca", "Frigorífico", "Basculante", "Tanque", "Porta-Contentores", "Sider", "Outro"]
 ESTADOS_CAMIAO = ["Disponível", "Em Rota", "Em Manutenção", "Indisponível"]
@@ -19,6 +42,8 @@ CATEGORIAS_CNH = ["A", "B", "C", "D", "E", "AB", "AC", "AD", "AE"]
 ESTADOS_MOTORISTA = ["Disponível", "Em Rota", "De Folga", "Indisponível"]
 TIPOS_CARGA = ["Paletizada", "Granel Solido", "Granel Líquido", "Refrigerada", "Congelada", "Perigosa", "Viva", "Geral", "Outra"]
 ESTADOS_CARGA = ['Pendente', 'Agendada', 'Coletada', 'Em Trânsito', 'Entregue', 'Cancelada', 'Atrasada']
+ESTADOS_APTOS_ENTREGA = ('Pendente', 'Agendada')
+FILTRO_TODOS = "Todos"
 
 class CityGraphApp:
     def __init__(self, root_window):
@@ -34,6 +59,24 @@ class CityGraphApp:
 
         self.city_graph = Graph()
         self.node_attributes = {}
+        self.indice_pontos = IndiceEspacial()  # coords de node_attributes, atualizado com elas
+        self.route_engine = MotorCH(CH_CACHE_FILE)
+        self.route_cache = CacheRotas(self.city_graph, tamanho_max=ROUTE_CACHE_SIZE, motor=self.route_engine)
+        self.sincronizador = SincronizadorBD()
+        self.entidades = CacheEntidades()  # leituras de camiões/motoristas/cargas passam por aqui
+        self.camioes_por_id, self.motoristas_por_id, self.cargas_por_id = {}, {}, {}
+        # BD e rotas correm em threads de trabalho; os callbacks voltam à thread do Tk
+        self.tarefas = ExecutorTarefas(self.root, ao_mudar_ocupado=self._set_busy_gui, ao_falhar=self._on_task_error)
+        self._sync_running, self._sync_again = False, False
+        self._busy = False
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 5))
+        self.status_label = ttk.Label(status_frame, text="Pronto.")
+        self.status_label.pack(side=tk.LEFT)
+        self.progress_bar = ttk.Progressbar(status_frame, mode='indeterminate', length=160)
+        self.progress_bar.pack(side=tk.RIGHT)
         
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(expand=True, fill='both', padx=10, pady=10)
@@ -47,6 +90,13 @@ class CityGraphApp:
         self.selected_motorista_db_id = None
         self.selected_carga_db_id = None
 
+        # Lista de cargas filtrada no servidor e lida por páginas (keyset) à medida que se desce
+        self.filtro_cargas = {}
+        self.cargas_aptas = {}  # Pendente/Agendada, para a aba de entregas (independente do filtro)
+        self._cargas_ultima_chave, self._cargas_fim = None, True
+        self._cargas_geracao, self._cargas_a_carregar = 0, False
+        self.carga_filtro_widgets = {}
+
         self.tab_mapa = ttk.Frame(self.notebook, padding="10")
         self.notebook.add(self.tab_mapa, text='Gestão de Mapa (Pontos e Conexões)')
         self._setup_mapa_tab()
@@ -67,16 +117,37 @@ class CityGraphApp:
         self.notebook.add(self.tab_entregas, text='Operações de Entrega')
         self._setup_entregas_tab()
         
+        self.log_result("Interface iniciada. A carregar dados da base de dados...")
         self._load_all_initial_data()
-        self.log_result("Interface iniciada. Dados carregados da base de dados.")
 
     def _load_all_initial_data(self):
-        self._load_graph_from_db()
-        self._load_camioes_gui()
-        self._load_motoristas_gui()
-        self._load_cargas_gui()
-        self._update_carga_form_combos()
-        self._update_entrega_form_combos()
+        """Lê o mapa e as listas numa thread de trabalho e preenche a interface quando chegam."""
+        filtro, geracao = dict(self.filtro_cargas), self._reset_cargas_paging()
+        def carregar():
+            self.sincronizador.marcar()
+            self.entidades.invalidar()
+            return (self._fetch_graph_data(), self.entidades.obter_todos_camioes_db(),
+                    self.entidades.obter_todos_motoristas_db(), self._fetch_cargas(filtro))
+        def aplicar(dados):
+            grafo, camioes, motoristas, cargas = dados
+            self._apply_graph_data(grafo)
+            self._fill_camioes_gui(camioes); self._fill_motoristas_gui(motoristas)
+            if geracao == self._cargas_geracao: self._fill_cargas_gui(cargas)
+            self.log_result("Dados carregados da base de dados.")
+        self.tarefas.cancelar('grafo')
+        self.tarefas.submeter(carregar, ao_concluir=aplicar, chave='carga_completa')
+
+    def _set_busy_gui(self, pendentes: int):
+        if pendentes and not self._busy: self.progress_bar.start(15)
+        elif not pendentes and self._busy: self.progress_bar.stop()
+        self._busy = pendentes > 0
+        self.status_label.config(text=f"A trabalhar... ({pendentes} pendente{'s' if pendentes > 1 else ''})" if pendentes else "Pronto.")
+
+    def _on_task_error(self, erro):
+        self.log_result(f"Erro numa tarefa em segundo plano: {erro}"); messagebox.showerror("Erro", f"Falha: {erro}")
+
+    def _on_close(self):
+        self.tarefas.encerrar(); self.root.destroy()
 
     def _setup_mapa_tab(self):
         main_frame = self.tab_mapa
@@ -132,7 +203,11 @@ class CityGraphApp:
 
         self.map_canvas = tk.Canvas(map_frame, width=CANVAS_WIDTH, height=CANVAS_HEIGHT, bg="ivory", relief=tk.SUNKEN, borderwidth=1)
         self.map_canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        ttk.Button(map_frame, text="Reorganizar e Guardar Layout", command=self.randomize_and_save_layout_gui).pack(pady=5)
+        self.mapa = RenderizadorMapa(self.map_canvas, raio=NODE_RADIUS, tamanho_letra=FONT_SIZE)  # roda: zoom, arrastar: mover, duplo clique: ajustar
+        self.map_canvas.bind("<Button-3>", lambda e: self._pick_route_node_gui(e, self.start_node_combo))  # botão direito: partida
+        self.map_canvas.bind("<Shift-Button-3>", lambda e: self._pick_route_node_gui(e, self.end_node_combo))  # com Shift: chegada
+        ttk.Button(map_frame, text="Calcular e Guardar Layout", command=self.compute_and_save_layout_gui).pack(pady=5)
+        ttk.Button(map_frame, text="Rede Mínima entre Depósitos", command=self.compute_depot_network_gui).pack(pady=5)
     
     def _setup_camioes_tab(self):
         camioes_main_frame = ttk.Frame(self.tab_camioes)
@@ -157,6 +232,8 @@ class CityGraphApp:
                 if combo_values: widget.current(0)
             else: widget = ttk.Entry(form_frame, width=30)
             widget.grid(row=i, column=1, sticky=tk.EW, padx=5, pady=3); self.camiao_form_widgets[widget_name] = widget
+        linha_localizacao = [f[1] for f in form_fields].index("localizacao_camiao_combo")
+        ttk.Button(form_frame, text="Depósito mais próximo", command=self._nearest_depot_gui).grid(row=linha_localizacao, column=2, padx=5, pady=3)
         
         action_buttons_frame = ttk.Frame(form_frame)
         action_buttons_frame.grid(row=len(form_fields), column=0, columnspan=2, pady=10)
@@ -278,15 +355,36 @@ class CityGraphApp:
         self.clear_carga_fields_btn = ttk.Button(action_buttons_frame, text="Limpar", command=self._clear_carga_fields_gui)
         self.clear_carga_fields_btn.pack(side=tk.LEFT, padx=5)
 
+        # Filtros aplicados na BD; a lista lê as páginas seguintes ao chegar ao fim
+        filter_frame = ttk.Frame(list_frame)
+        filter_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        filtros = [("Estado:", 'estado', [FILTRO_TODOS] + ESTADOS_CARGA), ("Cliente:", 'cliente', None),
+                   ("Origem:", 'origem', []), ("Destino:", 'destino', []),
+                   ("Criada desde:", 'desde', "YYYY-MM-DD"), ("até:", 'ate', "YYYY-MM-DD")]
+        for i, (label_text, nome, valores_ou_placeholder) in enumerate(filtros):
+            ttk.Label(filter_frame, text=label_text).grid(row=i // 2, column=2 * (i % 2), sticky=tk.W, padx=5, pady=2)
+            if isinstance(valores_ou_placeholder, list):
+                widget = ttk.Combobox(filter_frame, width=25, values=valores_ou_placeholder, state="readonly")
+                if valores_ou_placeholder: widget.current(0)
+            else:
+                widget = ttk.Entry(filter_frame, width=27)
+                if valores_ou_placeholder:
+                    widget.insert(0, valores_ou_placeholder); widget.config(foreground="grey")
+                    widget.bind("<FocusIn>", lambda e, w=widget, p=valores_ou_placeholder: self._clear_placeholder(e, w, p))
+                    widget.bind("<FocusOut>", lambda e, w=widget, p=valores_ou_placeholder: self._add_placeholder(e, w, p))
+            widget.grid(row=i // 2, column=2 * (i % 2) + 1, sticky=tk.W, padx=5, pady=2); self.carga_filtro_widgets[nome] = widget
+        ttk.Button(filter_frame, text="Filtrar", command=self._apply_carga_filter_gui).grid(row=0, column=4, padx=5, pady=2)
+        ttk.Button(filter_frame, text="Limpar Filtros", command=self._clear_carga_filter_gui).grid(row=1, column=4, padx=5, pady=2)
+
         cols = ("id", "descricao", "origem", "destino", "estado_carga", "camiao", "motorista")
         col_names = ("ID", "Descrição", "Origem", "Destino", "Estado", "Camião", "Motorista")
         col_widths = (40, 200, 120, 120, 100, 100, 150)
         self.cargas_treeview = ttk.Treeview(list_frame, columns=cols, show="headings", height=15)
         for i, col_name in enumerate(col_names):
             self.cargas_treeview.heading(cols[i], text=col_name); self.cargas_treeview.column(cols[i], width=col_widths[i], anchor=tk.W)
-        ys = ttk.Scrollbar(list_frame, orient="vertical", command=self.cargas_treeview.yview)
+        self.cargas_scrollbar = ys = ttk.Scrollbar(list_frame, orient="vertical", command=self.cargas_treeview.yview)
         xs = ttk.Scrollbar(list_frame, orient="horizontal", command=self.cargas_treeview.xview)
-        self.cargas_treeview.configure(yscrollcommand=ys.set, xscrollcommand=xs.set)
+        self.cargas_treeview.configure(yscrollcommand=self._on_cargas_scroll, xscrollcommand=xs.set)
         ys.pack(side=tk.RIGHT, fill=tk.Y); xs.pack(side=tk.BOTTOM, fill=tk.X); self.cargas_treeview.pack(fill=tk.BOTH, expand=True)
         self.cargas_treeview.bind("<<TreeviewSelect>>", self._on_carga_select)
 
@@ -323,6 +421,8 @@ class CityGraphApp:
         map_entrega_frame.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
         self.entrega_map_canvas = tk.Canvas(map_entrega_frame, width=CANVAS_WIDTH+100, height=CANVAS_HEIGHT+50, bg="lightyellow", relief=tk.SUNKEN, borderwidth=1)
         self.entrega_map_canvas.pack(fill=tk.BOTH, expand=True)
+        self.entrega_mapa = RenderizadorMapa(self.entrega_map_canvas, cor_destaque="dodgerblue", desenhar_arestas=False,
+                                             mensagem_vazio="Selecione uma carga.", raio=NODE_RADIUS, tamanho_letra=FONT_SIZE)
         
         ttk.Label(entregas_main_frame, text="Detalhes da Rota Calculada:").pack(anchor=tk.W, padx=10, pady=(5,0))
         self.entrega_rota_details_text = scrolledtext.ScrolledText(entregas_main_frame, width=80, height=5, wrap=tk.WORD)
@@ -335,58 +435,272 @@ class CityGraphApp:
     def _add_placeholder(self, event, widget, placeholder_text):
         if not widget.get(): widget.insert(0, placeholder_text); widget.config(foreground="grey")
 
+    def _sync_from_db(self):
+        """
+        Aplica só as linhas alteradas desde a última sincronização; sem registo de
+        alterações, recarrega tudo. As deltas são lidas numa thread de trabalho e
+        pedidos feitos enquanto uma sincronização corre juntam-se numa só seguinte.
+        """
+        if self._sync_running: self._sync_again = True; return
+        self._sync_running = True
+        def terminar():
+            self._sync_running = False
+            if self._sync_again: self._sync_again = False; self._sync_from_db()
+        def concluir(resultado):
+            try: self._apply_sync_deltas(*resultado)
+            finally: terminar()
+        def falhar(erro):
+            terminar(); self._on_task_error(erro)
+        # Cópia rasa dos atributos: a thread de trabalho pode posicionar pontos novos sem coords
+        self.tarefas.submeter(self._fetch_sync_deltas, dict(self.node_attributes), ao_concluir=concluir, ao_falhar=falhar)
+
+    def _fetch_sync_deltas(self, attributes):
+        """Parte de _sync_from_db feita na thread de trabalho: retorna (deltas, avisos)."""
+        deltas = self.sincronizador.alteracoes()
+        if not deltas: return deltas, []
+        self.entidades.invalidar_deltas(deltas)
+        avisos = []
+        if 'pontos' in deltas and not self._assign_missing_coords(deltas, attributes):
+            avisos.append("Aviso: Falha ao guardar coords dos pontos novos.")
+        self._merge_dependent_cargas(deltas)
+        return deltas, avisos
+
+    def _apply_sync_deltas(self, deltas, avisos):
+        for aviso in avisos: self.log_result(aviso)
+        if deltas is None: self._load_all_initial_data(); return
+        if not deltas: return
+        pontos = deltas.get('pontos')
+        nome_por_id = {a['id']: n for n, a in self.node_attributes.items()}
+        nomes_mudaram = pontos is not None and (bool(pontos.removidos) or any(nome_por_id.get(p['id'], p['nome']) != p['nome'] for p in pontos.alterados))
+        if pontos or 'conexoes' in deltas:
+            self._apply_graph_delta(pontos, deltas.get('conexoes'))
+        if nomes_mudaram:
+            # Nomes de pontos aparecem nas listas e o ON DELETE SET NULL de camioes não dispara triggers
+            self._load_camioes_gui(); self._load_cargas_gui()
+        else:
+            if 'camioes' in deltas:
+                self._apply_treeview_delta(self.camioes_treeview, self.camioes_por_id, deltas['camioes'], self._camiao_row_values, *ORDEM_CAMIOES)
+            if 'cargas' in deltas: self._apply_cargas_delta(deltas['cargas'])
+        if 'motoristas' in deltas:
+            self._apply_treeview_delta(self.motoristas_treeview, self.motoristas_por_id, deltas['motoristas'], self._motorista_row_values, *ORDEM_MOTORISTAS)
+        if nomes_mudaram or deltas.keys() & {'camioes', 'motoristas', 'cargas'}:
+            self._update_carga_form_combos(); self._update_entrega_form_combos()
+        self.log_result("Sincronizado: " + ", ".join(f"{t} +{len(d.alterados)}/-{len(d.removidos)}" for t, d in deltas.items()))
+
+    def _assign_missing_coords(self, deltas, attributes) -> bool:
+        """
+        Posiciona junto dos vizinhos (e guarda na BD) os pontos novos das deltas que não
+        têm coords, contando com as conexões que chegam na mesma sincronização; False se a gravação falhar.
+        """
+        sem_coords = [p for p in deltas['pontos'].alterados if p.get('coord_x') is None or p.get('coord_y') is None]
+        if not sem_coords: return True
+        conexoes = deltas['conexoes'].alterados if 'conexoes' in deltas else []
+        novas = posicionar_novos(self.city_graph, attributes, [p['nome'] for p in sem_coords],
+                                 arestas_extra=[(c['nome_origem'], c['nome_destino']) for c in conexoes])
+        for p in sem_coords: p['coord_x'], p['coord_y'] = novas[p['nome']]
+        return db_manager.atualizar_coords_bulk([(p['id'], p['coord_x'], p['coord_y']) for p in sem_coords]) >= 0
+
+    def _merge_dependent_cargas(self, deltas):
+        """
+        As linhas de cargas mostram a matrícula e o nome do motorista: relê as que
+        dependem de um que mudou. Corre na thread de trabalho; só lê os dicionários
+        por id, que a thread do Tk não altera enquanto a sincronização decorre.
+        """
+        def mudou(antigos, delta, campo):
+            return {r['id'] for r in delta.alterados if r['id'] in antigos and antigos[r['id']].get(campo) != r.get(campo)} | set(delta.removidos)
+        cam_ids = mudou(self.camioes_por_id, deltas['camioes'], 'matricula') if 'camioes' in deltas else set()
+        mot_ids = mudou(self.motoristas_por_id, deltas['motoristas'], 'nome_completo') if 'motoristas' in deltas else set()
+        if not cam_ids and not mot_ids: return
+        ja_lidas = {c['id'] for c in deltas['cargas'].alterados} if 'cargas' in deltas else set()
+        conhecidas = {**self.cargas_aptas, **self.cargas_por_id}
+        dependentes = [c_id for c_id, c in conhecidas.items() if c_id not in ja_lidas and
+                       (c.get('camiao_atribuido_id') in cam_ids or c.get('motorista_atribuido_id') in mot_ids)]
+        linhas = db_manager.obter_cargas_por_ids_db_detalhado(dependentes)
+        if not linhas: return
+        anterior = deltas.get('cargas')
+        deltas['cargas'] = Delta((anterior.alterados if anterior else []) + linhas, anterior.removidos if anterior else set())
+
+    def _apply_graph_delta(self, pontos, conexoes):
+        """
+        Aplica as deltas de pontos/conexões ao Graph e a node_attributes. O Graph
+        só cresce, por isso remoções, renomeações e conexões alteradas levam a
+        _load_graph_from_db (que usa o snapshot se a versão do mapa o permitir).
+        """
+        if (pontos and pontos.removidos) or (conexoes and conexoes.removidos):
+            self._load_graph_from_db(); return
+        nome_por_id = {a['id']: n for n, a in self.node_attributes.items()}
+        novos, coords_mudaram, tipos_mudaram = 0, False, False
+        for p in (pontos.alterados if pontos else []):
+            nome, cx, cy = p['nome'], p.get('coord_x'), p.get('coord_y')
+            if nome_por_id.get(p['id'], nome) != nome: self._load_graph_from_db(); return
+            attrs = self.node_attributes.get(nome)
+            if attrs is None:
+                self.city_graph.add_vertex(nome); self.route_cache.ao_adicionar_vertice(nome)
+                self.node_attributes[nome] = {'id': p['id'], 'type': p['tipo'], 'coords': (cx, cy)}
+                if cx is not None and cy is not None: self.indice_pontos.inserir(nome, cx, cy)
+                if p['tipo'] == "Depósito": self.route_cache.adicionar_origem_quente(nome)
+                self.mapa.adicionar_no(nome); novos += 1
+                continue
+            if cx is not None and cy is not None and attrs['coords'] != (cx, cy):
+                attrs['coords'] = (cx, cy); self.indice_pontos.inserir(nome, cx, cy); coords_mudaram = True
+            if attrs['type'] != p['tipo']: attrs['type'] = p['tipo']; tipos_mudaram = True
+
+        if conexoes and conexoes.alterados:
+            origens, destinos, pesos, bidir = self.city_graph.edges()
+            existentes = {(origens[e], destinos[e]): (pesos[e], bool(bidir[e])) for e in range(len(pesos))}
+            for c in conexoes.alterados:
+                n_o, n_d = c['nome_origem'], c['nome_destino']
+                dist, bidir_c = float(c['distancia']), bool(c['bidirecional'])
+                chave = (self.city_graph.index_of(n_o), self.city_graph.index_of(n_d))
+                if None in chave: self._load_graph_from_db(); return
+                if chave in existentes:
+                    if existentes[chave] != (dist, bidir_c): self._load_graph_from_db(); return
+                    continue
+                self.city_graph.add_edge(n_o, n_d, dist, bidirectional=bidir_c)
+                self.route_cache.ao_adicionar_aresta(n_o, n_d, dist, bidirectional=bidir_c)
+                self.mapa.adicionar_aresta(n_o, n_d)
+                existentes[chave] = (dist, bidir_c); novos += 1
+
+        if novos: self.route_engine.agendar_reconstrucao(self.city_graph)
+        if coords_mudaram and self.route_cache.heuristica: self.route_cache.heuristica.recalcular()
+        if tipos_mudaram:
+            self.route_cache.definir_origens_quentes(n for n, a in self.node_attributes.items() if a.get('type') == "Depósito")
+        if coords_mudaram or tipos_mudaram: self.mapa.atualizar()
+        if novos or coords_mudaram or tipos_mudaram:
+            self.update_graph_display_gui(); self.update_all_node_comboboxes_gui()
+
+    def _apply_treeview_delta(self, treeview, por_id, delta, row_values, sort_key, descending):
+        for row_id in delta.removidos:
+            por_id.pop(row_id, None)
+            if treeview.exists(str(row_id)): treeview.delete(str(row_id))
+        for row in delta.alterados:
+            por_id[row['id']] = row
+            if treeview.exists(str(row['id'])): treeview.item(str(row['id']), values=row_values(row))
+            else: treeview.insert("", tk.END, iid=str(row['id']), values=row_values(row))
+        # Reposiciona só as linhas alteradas: desliga-as e volta a ligá-las por ordem crescente de posição final
+        posicoes = {row['id']: i for i, row in enumerate(sorted(por_id.values(), key=sort_key, reverse=descending))}
+        alteradas = sorted({row['id'] for row in delta.alterados}, key=posicoes.get)
+        for row_id in alteradas: treeview.detach(str(row_id))
+        for row_id in alteradas: treeview.move(str(row_id), "", posicoes[row_id])
+
     def _load_graph_from_db(self):
         self.log_result("A carregar grafo da base de dados...")
-        self.city_graph = Graph(); self.node_attributes = {}
-        pontos_db = db_manager.obter_todos_pontos_db()
-        if pontos_db is None: messagebox.showerror("Erro BD", "Falha ao carregar pontos."); return
-        for p_data in pontos_db:
-            nome, db_id, tipo = p_data['nome'], p_data['id'], p_data['tipo']
-            cx, cy = p_data.get('coord_x'), p_data.get('coord_y')
-            self.city_graph.add_vertex(nome)
-            self.node_attributes[nome] = {
-                'id': db_id, 'type': tipo,
-                'coords': (cx, cy) if cx is not None and cy is not None \
-                        else self._assign_and_save_random_coords(db_id, nome)
-            }
-        conexoes_db = db_manager.obter_todas_conexoes_db()
-        if conexoes_db is None: messagebox.showerror("Erro BD", "Falha ao carregar conexões."); return
-        for c_data in conexoes_db:
-            n_o, n_d = c_data['nome_origem'], c_data['nome_destino']
-            dist, bidir = float(c_data['distancia']), bool(c_data['bidirecional'])
-            if n_o in self.city_graph.get_vertices() and n_d in self.city_graph.get_vertices():
-                self.city_graph.add_edge(n_o, n_d, dist, bidirectional=bidir)
-        self.update_graph_display_gui(); self.update_all_node_comboboxes_gui(); self.redraw_canvas_gui()
-        self.log_result(f"{len(pontos_db)} pontos e {len(conexoes_db)} conexões carregadas.")
-
-    def _assign_and_save_random_coords(self, db_id: int, node_name: str) -> tuple[int, int]:
-        pad = NODE_RADIUS + 10; x,y = random.randint(pad, CANVAS_WIDTH-pad), random.randint(pad, CANVAS_HEIGHT-pad)
-        if db_manager.atualizar_ponto_coords_db(db_id, x, y): self.log_result(f"Coords para '{node_name}' guardadas.")
-        else: self.log_result(f"Aviso: Falha ao guardar coords para '{node_name}'.")
-        return (x,y)
-
-    def randomize_and_save_layout_gui(self):
+        self.tarefas.submeter(self._fetch_graph_data, ao_concluir=self._apply_graph_data, chave='grafo')
+
+    def _fetch_graph_data(self):
+        """
+        Lê o mapa (snapshot ou BD) e valida a hierarquia de rotas guardada. Corre numa thread
+        de trabalho e não toca no Tk nem no estado da app: retorna um dict aplicado depois por
+        _apply_graph_data.
+        """
+        mensagens = []
+        carimbo = db_manager.obter_versao_mapa_db()
+        snapshot = carregar_snapshot(GRAPH_SNAPSHOT_FILE, carimbo) if carimbo else None
+        if snapshot is not None:
+            graph, attributes = snapshot
+            mensagens.append(f"{len(graph)} pontos e {graph.num_edges()} conexões carregadas do snapshot.")
+        else:
+            reconstruido = self._rebuild_graph_from_db(mensagens)
+            if isinstance(reconstruido, str): return {'erro': reconstruido, 'mensagens': mensagens}
+            graph, attributes, coords_guardadas = reconstruido
+            if coords_guardadas: carimbo = db_manager.obter_versao_mapa_db()  # a gravação das coords mudou o carimbo
+            if carimbo:
+                try: guardar_snapshot(GRAPH_SNAPSHOT_FILE, graph, attributes, carimbo)
+                except OSError as err: mensagens.append(f"Aviso: Falha ao guardar snapshot do grafo: {err}")
+        return {'erro': None, 'mensagens': mensagens, 'graph': graph, 'attributes': attributes,
+                'hierarquia': self.route_engine.hierarquia_para(graph), 'heuristica': HeuristicaEuclidiana(graph, attributes), 'indice': IndiceEspacial.de_atributos(attributes)}
+
+    def _apply_graph_data(self, dados):
+        for msg in dados['mensagens']: self.log_result(msg)
+        if dados['erro']: messagebox.showerror("Erro BD", dados['erro']); return
+        self.city_graph, self.node_attributes, self.indice_pontos = dados['graph'], dados['attributes'], dados['indice']
+        self.route_engine.preparar(self.city_graph, dados['hierarquia'])
+        self.route_cache.ao_recarregar(self.city_graph)
+        self.route_cache.heuristica = dados['heuristica']
+        self.route_cache.definir_origens_quentes(n for n, a in self.node_attributes.items() if a.get('type') == "Depósito")
+        self.update_graph_display_gui(); self.update_all_node_comboboxes_gui()
+        self.mapa.carregar(self.city_graph, self.node_attributes, self.indice_pontos)
+
+    def _rebuild_graph_from_db(self, mensagens):
+        """Reconstrói o grafo a partir da BD: (graph, attributes, nº de coords novas guardadas), ou a mensagem de erro."""
+        attributes, sem_coords, coords_guardadas = {}, [], 0
+        def pontos():
+            # Lidos em streaming; os atributos de cada ponto são registados à passagem
+            for db_id, nome, tipo, cx, cy in db_manager.iterar_tabela_db('pontos', ('id', 'nome', 'tipo', 'coord_x', 'coord_y'), ordem='nome'):
+                if cx is None or cy is None: sem_coords.append(nome)
+                attributes[nome] = {'id': db_id, 'type': tipo, 'coords': None if cx is None or cy is None else (cx, cy)}
+                yield db_id, nome
+        try: graph = Graph.from_id_rows(pontos(), db_manager.iterar_tabela_db('conexoes', db_manager.COLUNAS_ARESTAS, ordem='id'))
+        except db_manager.ErroBD as err: return f"Falha ao carregar o mapa: {err}"
+        coords_novas = []
+        if sem_coords:  # p.ex. uma rede importada sem coords: layout por forças junto dos vizinhos
+            for nome, xy in posicionar_novos(graph, attributes, sem_coords).items():
+                attributes[nome]['coords'] = xy; coords_novas.append((attributes[nome]['id'], *xy))
+        if coords_novas:
+            if db_manager.atualizar_coords_bulk(coords_novas) >= 0:
+                coords_guardadas = len(coords_novas); mensagens.append(f"Coords para {len(coords_novas)} pontos guardadas.")
+            else: mensagens.append("Aviso: Falha ao guardar coords dos pontos novos.")
+        mensagens.append(f"{len(graph)} pontos e {graph.num_edges()} conexões carregadas.")
+        return graph, attributes, coords_guardadas
+
+    def compute_and_save_layout_gui(self):
         if not self.city_graph.get_vertices(): messagebox.showinfo("Info", "Grafo vazio."); return
-        up_c = 0
-        for n_name, attrs in self.node_attributes.items():
-            if 'id' in attrs:
-                db_id = attrs['id']; pad = NODE_RADIUS + 10
-                nx, ny = random.randint(pad,CANVAS_WIDTH-pad), random.randint(pad,CANVAS_HEIGHT-pad)
-                if db_manager.atualizar_ponto_coords_db(db_id, nx, ny): attrs['coords']=(nx,ny); up_c+=1
-        self.redraw_canvas_gui(); self.log_result(f"Layout reorganizado, {up_c} coords atualizadas na BD.")
+        graph, attributes = self.city_graph, dict(self.node_attributes)
+        def calcular():
+            """Thread de trabalho: layout por forças a partir das posições atuais, guardado num só lote."""
+            novas = calcular_layout(graph, attributes)
+            indice = IndiceEspacial.de_pontos((n, x, y) for n, (x, y) in novas.items())
+            return novas, indice, db_manager.atualizar_coords_bulk([(attributes[n]['id'], x, y) for n, (x, y) in novas.items()
+                                                                    if 'id' in attributes.get(n, {})])
+        def concluido(resultado):
+            novas, indice, up_c = resultado
+            if up_c < 0: messagebox.showerror("Erro BD", "Falha ao guardar o novo layout."); return
+            for n_name, xy in novas.items():
+                if n_name in self.node_attributes: self.node_attributes[n_name]['coords'] = xy
+            for n_name, attrs in self.node_attributes.items():  # pontos que chegaram durante o cálculo
+                if n_name not in novas and attrs.get('coords') and None not in attrs['coords']: indice.inserir(n_name, *attrs['coords'])
+            for n_name in set(novas) - set(self.node_attributes): indice.remover(n_name)
+            self.indice_pontos = indice
+            if self.route_cache.heuristica: self.route_cache.heuristica.recalcular()
+            self.mapa.carregar(self.city_graph, self.node_attributes, self.indice_pontos); self.mapa.ajustar_vista(); self.log_result(f"Layout calculado, {up_c} coords atualizadas na BD.")
+        self.log_result(f"A calcular o layout de {len(graph)} pontos...")
+        self.tarefas.submeter(calcular, ao_concluir=concluido, chave='layout')
+
+    def compute_depot_network_gui(self):
+        depositos = sum(1 for a in self.node_attributes.values() if a.get('type') == "Depósito")
+        if depositos < 2: messagebox.showinfo("Info", "São precisos pelo menos 2 depósitos."); return
+        def mostrar(resultado):
+            arestas, custo = resultado
+            if not arestas: messagebox.showinfo("Rede de Depósitos", "Os depósitos não estão ligados entre si."); self.mapa.destacar(None); return
+            intermedios = {n for a in arestas for n in (a['u'], a['v'])
+                           if self.node_attributes.get(n, {}).get('type') != "Depósito"}
+            self.log_result(f"Rede mínima entre {depositos} depósitos: {len(arestas)} conexões, "
+                            f"{len(intermedios)} pontos intermédios, {custo:.2f} km.")
+            self.mapa.destacar(arestas=[(a['u'], a['v']) for a in arestas])
+        self.log_result("A calcular a rede mínima entre depósitos...")
+        self.tarefas.submeter(rede_entre_depositos, self.city_graph, dict(self.node_attributes), ao_concluir=mostrar, chave='rede_depositos')
 
     def add_vertex_gui(self):
         nome, tipo = self.vertex_name_entry.get().strip(), self.vertex_type_combo.get()
         if not nome: messagebox.showerror("Erro", "Nome do ponto vazio."); return
-        if db_manager.obter_ponto_por_nome_db(nome): messagebox.showwarning("Aviso", f"Ponto '{nome}' já existe."); return
-        pad = NODE_RADIUS + 10; cx,cy = random.randint(pad,CANVAS_WIDTH-pad), random.randint(pad,CANVAS_HEIGHT-pad)
-        db_id = db_manager.adicionar_ponto_db(nome, tipo, cx, cy)
-        if db_id:
-            self.city_graph.add_vertex(nome); self.node_attributes[nome] = {'id':db_id,'type':tipo,'coords':(cx,cy)}
-            self.vertex_name_entry.delete(0,tk.END)
-            self.update_graph_display_gui(); self.update_all_node_comboboxes_gui(); self.redraw_canvas_gui()
+        if nome in self.node_attributes: messagebox.showwarning("Aviso", f"Ponto '{nome}' já existe."); return
+        graph, attributes = self.city_graph, dict(self.node_attributes)
+        def adicionar():
+            if db_manager.obter_ponto_por_nome_db(nome): return True, None, None
+            cx, cy = posicionar_novos(graph, attributes, [nome])[nome]  # ainda sem conexões: num espaço livre do mapa
+            return False, db_manager.adicionar_ponto_db(nome, tipo, cx, cy), (cx, cy)
+        def concluido(resultado):
+            existe, db_id, coords = resultado
+            if existe: messagebox.showwarning("Aviso", f"Ponto '{nome}' já existe."); return
+            if not db_id: messagebox.showerror("Erro BD", f"Falha ao adicionar '{nome}'."); return
+            self.city_graph.add_vertex(nome); self.node_attributes[nome] = {'id':db_id,'type':tipo,'coords':coords}
+            self.indice_pontos.inserir(nome, *coords)
+            self.route_cache.ao_adicionar_vertice(nome); self.route_engine.agendar_reconstrucao(self.city_graph)
+            if tipo == "Depósito": self.route_cache.adicionar_origem_quente(nome)
+            if self.vertex_name_entry.get().strip() == nome: self.vertex_name_entry.delete(0,tk.END)
+            self.update_graph_display_gui(); self.update_all_node_comboboxes_gui(); self.mapa.adicionar_no(nome)
             self.log_result(f"{tipo} '{nome}' (ID:{db_id}) adicionado.")
-        else: messagebox.showerror("Erro BD", f"Falha ao adicionar '{nome}'.")
+        self.tarefas.submeter(adicionar, ao_concluir=concluido)
 
     def add_edge_gui(self):
         u_n, v_n = self.edge_u_combo.get().split(" (")[0], self.edge_v_combo.get().split(" (")[0]
@@ -398,122 +712,65 @@ class CityGraphApp:
         except: messagebox.showerror("Erro", "Distância deve ser número positivo."); return
         u_a, v_a = self.node_attributes.get(u_n), self.node_attributes.get(v_n)
         if not u_a or 'id' not in u_a or not v_a or 'id' not in v_a: messagebox.showerror("Erro", "ID BD não encontrado."); return
-        if db_manager.adicionar_conexao_db(u_a['id'], v_a['id'], dist, bidir):
+        def concluido(ok):
+            if not ok: messagebox.showwarning("Aviso BD", "Falha ao adicionar conexão."); return
             self.city_graph.add_edge(u_n,v_n,dist,bidirectional=bidir); self.edge_weight_entry.delete(0,tk.END)
-            self.update_graph_display_gui(); self.redraw_canvas_gui()
+            self.route_cache.ao_adicionar_aresta(u_n, v_n, dist, bidirectional=bidir)
+            self.route_engine.agendar_reconstrucao(self.city_graph)
+            self.update_graph_display_gui(); self.mapa.adicionar_aresta(u_n, v_n)
             self.log_result(f"Conexão '{u_n}' {'<-->' if bidir else '-->'} '{v_n}' adicionada.")
-        else: messagebox.showwarning("Aviso BD", "Falha ao adicionar conexão.")
-
-    def redraw_canvas_gui(self, highlight_path=None, canvas_widget=None, node_attrs_override=None):
-        target_canvas = canvas_widget if canvas_widget else self.map_canvas
-        target_node_attrs = node_attrs_override if node_attrs_override else self.node_attributes
-        
-        target_canvas.delete("all")
-        if not self.city_graph.get_vertices() and not node_attrs_override : 
-            target_canvas.create_text(target_canvas.winfo_width()/2 if target_canvas.winfo_width() > 1 else CANVAS_WIDTH/2, 
-                                    target_canvas.winfo_height()/2 if target_canvas.winfo_height() > 1 else CANVAS_HEIGHT/2, 
-                                    text="Grafo vazio", font=("Arial", 12), fill="grey"); return
-        if canvas_widget == self.entrega_map_canvas and not target_node_attrs:
-            target_canvas.create_text(target_canvas.winfo_width()/2 if target_canvas.winfo_width() > 1 else (CANVAS_WIDTH+100)/2, 
-                                    target_canvas.winfo_height()/2 if target_canvas.winfo_height() > 1 else (CANVAS_HEIGHT+50)/2, 
-                                    text="Selecione uma carga.", font=("Arial", 12), fill="grey"); return
-
-        drawn_edges_base = set() 
-        nodes_to_iterate_for_edges = self.city_graph.get_vertices() if target_canvas == self.map_canvas else (highlight_path if highlight_path else [])
-        for u_name in nodes_to_iterate_for_edges:
-            u_attrs = target_node_attrs.get(u_name)
-            if not u_attrs or 'coords' not in u_attrs or u_attrs['coords'] is None: continue
-            ux, uy = u_attrs['coords']
-            neighbors_to_draw = []
-            if target_canvas == self.entrega_map_canvas and highlight_path:
-                if u_name in highlight_path:
-                    try:
-                        u_idx = highlight_path.index(u_name)
-                        if u_idx < len(highlight_path) -1: neighbors_to_draw = [{'node': highlight_path[u_idx+1]}]
-                    except ValueError: pass
-            else: neighbors_to_draw = self.city_graph.get_neighbors(u_name)
-
-            for edge_info in neighbors_to_draw:
-                v_name = edge_info['node']
-                v_attrs = target_node_attrs.get(v_name)
-                if not v_attrs or 'coords' not in v_attrs or v_attrs['coords'] is None: continue
-                vx, vy = v_attrs['coords']
-                edge_key_sorted = tuple(sorted((u_name, v_name)))
-                if target_canvas == self.map_canvas and edge_key_sorted not in drawn_edges_base:
-                    target_canvas.create_line(ux, uy, vx, vy, fill="lightgrey", width=1.5, tags="edge_base")
-                    drawn_edges_base.add(edge_key_sorted)
-
-        if highlight_path and len(highlight_path) >= 2:
-            for i in range(len(highlight_path) - 1):
-                u_p, v_p = highlight_path[i], highlight_path[i+1]
-                u_a_p, v_a_p = target_node_attrs.get(u_p), target_node_attrs.get(v_p)
-                if u_a_p and v_a_p and u_a_p.get('coords') and v_a_p.get('coords'):
-                    ux_p, uy_p = u_a_p['coords']; vx_p, vy_p = v_a_p['coords']
-                    target_canvas.create_line(ux_p, uy_p, vx_p, vy_p, fill="blue", width=3, arrow=tk.LAST, tags="edge_highlight")
-
-        nodes_to_draw_on_canvas = target_node_attrs.keys() if target_canvas == self.entrega_map_canvas and target_node_attrs else self.node_attributes.keys()
-        for node_name in nodes_to_draw_on_canvas:
-            attrs = target_node_attrs.get(node_name)
-            if not attrs or 'coords' not in attrs or attrs['coords'] is None: continue
-            x, y = attrs['coords']
-            node_type = attrs.get("type", "N/D")
-            is_highlighted = highlight_path and node_name in highlight_path
-            default_fill, deposito_fill, cidade_fill = "skyblue", "khaki", "lightgreen"
-            highlight_node_fill = "dodgerblue" if target_canvas == self.entrega_map_canvas else "orangered"
-            fill_color = highlight_node_fill if is_highlighted else \
-                        (deposito_fill if node_type == "Depósito" else \
-                        (cidade_fill if node_type == "Cidade" else default_fill))
-            text_color = "white" if is_highlighted else "black"
-            target_canvas.create_oval(x-NODE_RADIUS,y-NODE_RADIUS,x+NODE_RADIUS,y+NODE_RADIUS,fill=fill_color,outline="black",width=1.5,tags="node")
-            target_canvas.create_text(x,y,text=node_name,font=("Arial",FONT_SIZE,"bold"),fill=text_color,tags="node_text")
+        self.tarefas.submeter(db_manager.adicionar_conexao_db, u_a['id'], v_a['id'], dist, bidir, ao_concluir=concluido)
 
     def clear_graph_gui(self):
         if messagebox.askyesno("Confirmar Limpeza", "Isto removerá PONTOS e CONEXÕES da BD. Continuar?"):
             self.log_result("A limpar pontos e conexões da BD...")
-            pontos = db_manager.obter_todos_pontos_db()
-            err = 0
-            if pontos:
-                for p in pontos:
-                    if not db_manager.remover_ponto_db(p['id']): err+=1
-            self.log_result("Pontos e conexões removidos." if not err else f"{err} erros ao remover.")
-            self.city_graph,self.node_attributes=Graph(),{}; self._load_all_initial_data()
+            def concluido(resultado):
+                if resultado is None: self.log_result("Erro ao limpar o mapa na BD.")
+                else:
+                    removidos, mantidos = resultado
+                    self.log_result(f"{removidos} pontos e todas as conexões removidos." +
+                                    (f" {mantidos} pontos mantidos (usados em cargas)." if mantidos else ""))
+                self.route_cache.limpar()
+                self._sync_from_db()
+            self.tarefas.submeter(db_manager.limpar_mapa_db, ao_concluir=concluido)
 
     def run_dijkstra_gui(self):
         start_f, end_f = self.start_node_combo.get(), self.end_node_combo.get()
-        if not start_f or not end_f: messagebox.showerror("Erro", "Selecione partida e chegada."); self.redraw_canvas_gui(canvas_widget=self.map_canvas); return
+        if not start_f or not end_f: messagebox.showerror("Erro", "Selecione partida e chegada."); self.mapa.destacar(None); return
         start_n, end_n = start_f.split(" (")[0], end_f.split(" (")[0]
         self.log_result(f"\n--- Dijkstra (Mapa Geral): '{start_n}' -> '{end_n}' ---")
-        dist, path = dijkstra(self.city_graph, start_n, end_n)
-        if dist == math.inf:
-            msg = f"Caminho de '{start_n}' para '{end_n}' não encontrado."
-            self.log_result(msg); messagebox.showinfo("Dijkstra", msg); self.redraw_canvas_gui(canvas_widget=self.map_canvas)
-        else:
-            p_log = " -> ".join([f"{p} ({self.node_attributes.get(p,{}).get('type','N/D')})" for p in path])
-            r_log = f"Caminho (Mapa): {p_log}\nDistância: {dist} km"
-            self.log_result(r_log); messagebox.showinfo("Dijkstra", f"Caminho: {' -> '.join(path)}\nDistância: {dist} km")
-            self.redraw_canvas_gui(highlight_path=path, canvas_widget=self.map_canvas)
+        def mostrar(resultado):
+            dist, path = resultado
+            if dist == math.inf:
+                msg = f"Caminho de '{start_n}' para '{end_n}' não encontrado."
+                self.log_result(msg); messagebox.showinfo("Dijkstra", msg); self.mapa.destacar(None)
+            else:
+                p_log = " -> ".join([f"{p} ({self.node_attributes.get(p,{}).get('type','N/D')})" for p in path])
+                r_log = f"Caminho (Mapa): {p_log}\nDistância: {dist} km"
+                self.log_result(r_log); messagebox.showinfo("Dijkstra", f"Caminho: {' -> '.join(path)}\nDistância: {dist} km")
+                self.mapa.destacar(path)
+        self.tarefas.submeter(self.route_cache.rota, start_n, end_n, ao_concluir=mostrar, chave='rota_mapa')
+
+    def _pick_route_node_gui(self, event, combo):
+        nome = self.mapa.ponto_em(event.x, event.y)
+        if nome is None: return
+        combo.set(f"{nome} ({self.node_attributes[nome].get('type', 'N/D')})")
 
     def _get_formatted_node_list_gui(self):
         return [f"{n_name} ({attrs.get('type', 'N/D')})" for n_name, attrs in sorted(self.node_attributes.items())]
     
     def _get_formatted_camiao_list_gui(self):
-        camioes = db_manager.obter_todos_camioes_db()
-        if camioes is None: return ["Erro ao carregar camiões"]
+        camioes = sorted(self.camioes_por_id.values(), key=ORDEM_CAMIOES[0])
         return [f"{c['matricula']} ({c.get('nome_descricao','N/A')}) - ID:{c['id']}" for c in camioes]
 
     def _get_formatted_motorista_list_gui(self):
-        motoristas = db_manager.obter_todos_motoristas_db()
-        if motoristas is None: return ["Erro ao carregar motoristas"]
+        motoristas = sorted(self.motoristas_por_id.values(), key=ORDEM_MOTORISTAS[0])
         return [f"{m['nome_completo']} (CNH: {m['cnh']}) - ID:{m['id']}" for m in motoristas]
 
     def _get_formatted_carga_list_gui(self, apenas_aptas=True): # Parâmetro para filtrar cargas
-        cargas = db_manager.obter_todas_cargas_db_detalhado()
-        if cargas is None: return ["Erro ao carregar cargas"]
-        
-        if apenas_aptas:
-            cargas_filtradas = [c for c in cargas if c.get('estado') in ['Pendente', 'Agendada']]
-        else:
-            cargas_filtradas = cargas # Para outros usos, se necessário
+        # As aptas são lidas à parte (já filtradas no servidor); cargas_por_id só tem as páginas visíveis
+        origem = self.cargas_aptas if apenas_aptas else self.cargas_por_id
+        cargas_filtradas = sorted(origem.values(), key=ORDEM_CARGAS[0], reverse=ORDEM_CARGAS[1])
 
         return [f"ID:{c['id']} - {c['descricao']} (Orig: {c.get('nome_ponto_origem','?')}, Dest: {c.get('nome_ponto_destino','?')}, Estado: {c.get('estado')})" for c in cargas_filtradas]
 
@@ -523,6 +780,7 @@ class CityGraphApp:
         if 'localizacao_camiao_combo' in self.camiao_form_widgets: map_combos.append(self.camiao_form_widgets['localizacao_camiao_combo'])
         if 'origem_carga_combo' in self.carga_form_widgets: map_combos.append(self.carga_form_widgets['origem_carga_combo'])
         if 'destino_carga_combo' in self.carga_form_widgets: map_combos.append(self.carga_form_widgets['destino_carga_combo'])
+        map_combos += [self.carga_filtro_widgets[n] for n in ('origem', 'destino') if n in self.carga_filtro_widgets]
         
         for combo_widget in map_combos:
             if combo_widget: 
@@ -559,30 +817,40 @@ class CityGraphApp:
 
     def update_graph_display_gui(self):
         self.graph_display_text.config(state=tk.NORMAL); self.graph_display_text.delete(1.0, tk.END)
-        if not self.city_graph.get_vertices(): self.graph_display_text.insert(tk.END, "Grafo vazio.");
+        if not len(self.city_graph): self.graph_display_text.insert(tk.END, "Grafo vazio.");
         else:
-            lines = []
-            for v_name, attrs in sorted(self.node_attributes.items()):
+            # Resumo + os primeiros MAX_PONTOS_TEXTO pontos por nome: o custo não cresce com o mapa
+            total = len(self.node_attributes)
+            lines = [f"{len(self.city_graph)} pontos, {self.city_graph.num_edges()} conexões.", ""]
+            for v_name, attrs in heapq.nsmallest(MAX_PONTOS_TEXTO, self.node_attributes.items()):
                 v_type, db_id = attrs.get("type","N/A"), attrs.get('id','N/A')
                 lines.append(f"{v_name} ({v_type}) (ID:{db_id}):")
                 neigh = self.city_graph.get_neighbors(v_name)
                 if not neigh: lines.append("  (Sem conexões)")
                 else:
-                    for e in sorted(neigh, key=lambda ed: ed['node']):
+                    for e in heapq.nsmallest(MAX_VIZINHOS_TEXTO, neigh, key=lambda ed: ed['node']):
                         n_attrs = self.node_attributes.get(e['node'],{}); n_type = n_attrs.get("type","N/A")
                         lines.append(f"  -> {e['node']} ({n_type}) (Dist: {e['weight']} km)")
+                    if len(neigh) > MAX_VIZINHOS_TEXTO: lines.append(f"  ... e mais {len(neigh) - MAX_VIZINHOS_TEXTO} conexões")
                 lines.append("")
+            if total > MAX_PONTOS_TEXTO: lines.append(f"... e mais {total - MAX_PONTOS_TEXTO} pontos (ver o mapa).")
             self.graph_display_text.insert(tk.END, "\n".join(lines))
         self.graph_display_text.config(state=tk.DISABLED)
 
+    @staticmethod
+    def _camiao_row_values(c):
+        return (c['id'], c['matricula'], c.get('nome_descricao',''), c.get('tipo_veiculo',''), c.get('estado',''),
+                c.get('nome_localizacao_atual', 'N/A'))
+
     def _load_camioes_gui(self):
-        for i in self.camioes_treeview.get_children(): self.camioes_treeview.delete(i)
-        camioes_data = db_manager.obter_todos_camioes_db()
+        self.tarefas.submeter(self.entidades.obter_todos_camioes_db, ao_concluir=self._fill_camioes_gui, chave='lista_camioes')
+
+    def _fill_camioes_gui(self, camioes_data):
         if camioes_data is None: messagebox.showerror("Erro BD", "Falha ao carregar camiões."); return
+        for i in self.camioes_treeview.get_children(): self.camioes_treeview.delete(i)
+        self.camioes_por_id = {c['id']: c for c in camioes_data}
         for c in camioes_data:
-            loc_nome = c.get('nome_localizacao_atual', 'N/A')
-            self.camioes_treeview.insert("", tk.END, values=(
-                c['id'], c['matricula'], c.get('nome_descricao',''), c.get('tipo_veiculo',''), c.get('estado',''), loc_nome))
+            self.camioes_treeview.insert("", tk.END, iid=str(c['id']), values=self._camiao_row_values(c))
         self.log_result(f"{len(camioes_data)} camiões carregados.")
         self._update_carga_form_combos() 
         self._update_entrega_form_combos()
@@ -591,27 +859,29 @@ class CityGraphApp:
         sel = self.camioes_treeview.selection()
         if not sel: self._clear_camiao_fields_gui(); self.selected_camiao_db_id=None; return
         self.selected_camiao_db_id = self.camioes_treeview.item(sel[0])['values'][0]
-        camiao_data = db_manager.obter_camiao_por_id_db(self.selected_camiao_db_id)
+        self.tarefas.submeter(self.entidades.obter_camiao_por_id_db, self.selected_camiao_db_id,
+                              ao_concluir=self._fill_camiao_form_gui, chave='selecao_camiao')
+
+    def _fill_camiao_form_gui(self, camiao_data):
         if not camiao_data: messagebox.showerror("Erro BD", "Camião não encontrado."); self._clear_camiao_fields_gui(); return
         
         self.camiao_form_widgets['matricula_camiao_entry'].delete(0,tk.END); self.camiao_form_widgets['matricula_camiao_entry'].insert(0, camiao_data.get('matricula',''))
         self.camiao_form_widgets['nome_camiao_entry'].delete(0,tk.END); self.camiao_form_widgets['nome_camiao_entry'].insert(0, camiao_data.get('nome_descricao',''))
         self.camiao_form_widgets['capacidade_camiao_entry'].delete(0,tk.END); self.camiao_form_widgets['capacidade_camiao_entry'].insert(0, str(camiao_data.get('capacidade','0.0') or '')) # Evita 'None'
         self.camiao_form_widgets['unidade_cap_camiao_combo'].set(camiao_data.get('unidade_capacidade','') if camiao_data.get('unidade_capacidade','') in UNIDADES_CAPACIDADE else (UNIDADES_CAPACIDADE[0] if UNIDADES_CAPACIDADE else ""))
-        self.camiao_form_widgets['tipo_veiculo_camiao_combo'].set(camiao_data.get('tipo_veiculo','') if camiao_data.get('tipo_veiculo','') in TIPOS_camiao else (TIPOS_camiao[0] if TIPOS_camiao else ""))
-        self.camiao_form_widgets['estado_camiao_combo'].set(camiao_data.get('estado','') if camiao_data.get('estado','') in ESTADOS_camiao else (ESTADOS_camiao[0] if ESTADOS_camiao else ""))
+        self.camiao_form_widgets['tipo_veiculo_camiao_combo'].set(camiao_data.get('tipo_veiculo','') if camiao_data.get('tipo_veiculo','') in TIPOS_CAMIAO else (TIPOS_CAMIAO[0] if TIPOS_CAMIAO else ""))
+        self.camiao_form_widgets['estado_camiao_combo'].set(camiao_data.get('estado','') if camiao_data.get('estado','') in ESTADOS_CAMIAO else (ESTADOS_CAMIAO[0] if ESTADOS_CAMIAO else ""))
         self.camiao_form_widgets['obs_camiao_text'].delete(1.0,tk.END); self.camiao_form_widgets['obs_camiao_text'].insert(tk.END, camiao_data.get('observacoes',''))
         
-        loc_id = camiao_data.get('localizacao_atual_ponto_id')
-        loc_str_combo = ""
-        if loc_id:
-            p_loc_data = db_manager.obter_ponto_por_id_db(loc_id)
-            if p_loc_data: loc_str_combo = f"{p_loc_data['nome']} ({p_loc_data['tipo']})"
+        # A consulta já traz o nome da localização; o tipo vem do grafo em memória
+        loc_nome = camiao_data.get('nome_localizacao_atual')
+        loc_str_combo = f"{loc_nome} ({self.node_attributes[loc_nome]['type']})" if loc_nome in self.node_attributes else ""
         self.camiao_form_widgets['localizacao_camiao_combo'].set(loc_str_combo)
 
         self.update_camiao_btn.config(state=tk.NORMAL); self.remove_camiao_btn.config(state=tk.NORMAL)
 
     def _clear_camiao_fields_gui(self):
+        self.tarefas.cancelar('selecao_camiao')
         for name, widget in self.camiao_form_widgets.items():
             if isinstance(widget, ttk.Entry): widget.delete(0, tk.END)
             elif isinstance(widget, ttk.Combobox): widget.set(widget['values'][0] if widget['values'] and name not in ['localizacao_camiao_combo'] else ("" if name == 'localizacao_camiao_combo' else (widget['values'][0] if widget['values'] else "")))
@@ -620,6 +890,19 @@ class CityGraphApp:
         self.update_camiao_btn.config(state=tk.DISABLED); self.remove_camiao_btn.config(state=tk.DISABLED)
         self.log_result("Campos do camião limpos.")
 
+    def _nearest_depot_gui(self):
+        """Põe na localização do camião o depósito mais próximo (em linha reta no mapa) da localização escolhida."""
+        combo = self.camiao_form_widgets['localizacao_camiao_combo']
+        nome = combo.get().split(" (")[0]
+        coords = self.node_attributes.get(nome, {}).get('coords')
+        if not coords or None in coords: messagebox.showinfo("Info", "Escolha primeiro a localização atual do camião."); return
+        proximos = self.indice_pontos.mais_proximos(*coords, k=1,
+                                                    filtro=lambda n: self.node_attributes.get(n, {}).get('type') == "Depósito")
+        if not proximos: messagebox.showinfo("Info", "Não há depósitos no mapa."); return
+        dist, deposito = proximos[0]
+        combo.set(f"{deposito} ({self.node_attributes[deposito]['type']})")
+        self.log_result(f"Depósito mais próximo de '{nome}': '{deposito}' ({dist:.0f} unidades do mapa).")
+
     def _add_camiao_gui(self):
         data = {name: widget.get().strip() if isinstance(widget, ttk.Entry) else \
                     (widget.get(1.0, tk.END).strip() if isinstance(widget, scrolledtext.ScrolledText) else widget.get())
@@ -634,11 +917,12 @@ class CityGraphApp:
             loc_nome = data['localizacao_camiao_combo'].split(" (")[0]
             if loc_nome in self.node_attributes: loc_id = self.node_attributes[loc_nome]['id']
         
-        camiao_id = db_manager.adicionar_camiao_db(
+        def concluido(camiao_id):
+            if camiao_id: self.log_result(f"Camião '{data['matricula_camiao_entry']}' adicionado."); self._sync_from_db(); self._clear_camiao_fields_gui()
+            else: messagebox.showerror("Erro BD", "Falha ao adicionar camião (verifique se matrícula já existe).")
+        self.tarefas.submeter(self.entidades.adicionar_camiao_db,
             data['matricula_camiao_entry'], data['nome_camiao_entry'], cap, data['unidade_cap_camiao_combo'],
-            data['tipo_veiculo_camiao_combo'], data['estado_camiao_combo'], loc_id, data['obs_camiao_text'])
-        if camiao_id: self.log_result(f"Camião '{data['matricula_camiao_entry']}' adicionado."); self._load_camioes_gui(); self._clear_camiao_fields_gui()
-        else: messagebox.showerror("Erro BD", "Falha ao adicionar camião (verifique se matrícula já existe).")
+            data['tipo_veiculo_camiao_combo'], data['estado_camiao_combo'], loc_id, data['obs_camiao_text'], ao_concluir=concluido)
 
     def _update_camiao_gui(self):
         if not self.selected_camiao_db_id: messagebox.showerror("Erro", "Nenhum camião selecionado."); return
@@ -662,27 +946,31 @@ class CityGraphApp:
             if loc_nome in self.node_attributes: loc_id = self.node_attributes[loc_nome]['id']
         data_to_update["localizacao_atual_ponto_id"] = loc_id
 
-        if db_manager.atualizar_camiao_db(self.selected_camiao_db_id, data_to_update):
-            self.log_result(f"Camião ID {self.selected_camiao_db_id} atualizado."); self._load_camioes_gui(); self._clear_camiao_fields_gui()
-        else: messagebox.showerror("Erro BD", "Falha ao atualizar camião.")
+        camiao_id = self.selected_camiao_db_id
+        def concluido(ok):
+            if ok: self.log_result(f"Camião ID {camiao_id} atualizado."); self._sync_from_db(); self._clear_camiao_fields_gui()
+            else: messagebox.showerror("Erro BD", "Falha ao atualizar camião.")
+        self.tarefas.submeter(self.entidades.atualizar_camiao_db, camiao_id, data_to_update, ao_concluir=concluido)
 
     def _remove_camiao_gui(self):
         if not self.selected_camiao_db_id: messagebox.showerror("Erro", "Nenhum camião selecionado."); return
-        mat = self.camiao_form_widgets['matricula_camiao_entry'].get()
-        if messagebox.askyesno("Confirmar", f"Remover camião {mat} (ID:{self.selected_camiao_db_id})?"):
-            if db_manager.remover_camiao_db(self.selected_camiao_db_id):
-                self.log_result(f"Camião ID {self.selected_camiao_db_id} removido."); self._load_camioes_gui(); self._clear_camiao_fields_gui()
-            else: messagebox.showerror("Erro BD", "Falha ao remover camião.")
-
-    def _load_motoristas_gui(self):
-        for i in self.motoristas_treeview.get_children(): self.motoristas_treeview.delete(i)
-        motoristas_data = db_manager.obter_todos_motoristas_db()
+        mat, camiao_id = self.camiao_form_widgets['matricula_camiao_entry'].get(), self.selected_camiao_db_id
+        if messagebox.askyesno("Confirmar", f"Remover camião {mat} (ID:{camiao_id})?"):
+            def concluido(ok):
+                if ok: self.log_result(f"Camião ID {camiao_id} removido."); self._sync_from_db(); self._clear_camiao_fields_gui()
+                else: messagebox.showerror("Erro BD", "Falha ao remover camião.")
+            self.tarefas.submeter(self.entidades.remover_camiao_db, camiao_id, ao_concluir=concluido)
+
+    @staticmethod
+    def _motorista_row_values(m):
+        return (m['id'], m.get('nome_completo',''), m.get('cnh',''), m.get('categoria_cnh',''), m.get('estado',''), m.get('telefone',''))
+
+    def _fill_motoristas_gui(self, motoristas_data):
         if motoristas_data is None: messagebox.showerror("Erro BD", "Falha ao carregar motoristas."); return
+        for i in self.motoristas_treeview.get_children(): self.motoristas_treeview.delete(i)
+        self.motoristas_por_id = {m['id']: m for m in motoristas_data}
         for m in motoristas_data:
-            self.motoristas_treeview.insert("", tk.END, values=(
-                m['id'], m.get('nome_completo',''), m.get('cnh',''),
-                m.get('categoria_cnh',''), m.get('estado',''), m.get('telefone','')
-            ))
+            self.motoristas_treeview.insert("", tk.END, iid=str(m['id']), values=self._motorista_row_values(m))
         self.log_result(f"{len(motoristas_data)} motoristas carregados.")
         self._update_carga_form_combos()
         self._update_entrega_form_combos()
@@ -691,7 +979,10 @@ class CityGraphApp:
         sel = self.motoristas_treeview.selection()
         if not sel: self._clear_motorista_fields_gui(); self.selected_motorista_db_id=None; return
         self.selected_motorista_db_id = self.motoristas_treeview.item(sel[0])['values'][0]
-        motorista_data = db_manager.obter_motorista_por_id_db(self.selected_motorista_db_id)
+        self.tarefas.submeter(self.entidades.obter_motorista_por_id_db, self.selected_motorista_db_id,
+                              ao_concluir=self._fill_motorista_form_gui, chave='selecao_motorista')
+
+    def _fill_motorista_form_gui(self, motorista_data):
         if not motorista_data: messagebox.showerror("Erro BD", "Motorista não encontrado."); self._clear_motorista_fields_gui(); return
         
         self.motorista_form_widgets['nome_motorista_entry'].delete(0,tk.END); self.motorista_form_widgets['nome_motorista_entry'].insert(0, motorista_data.get('nome_completo',''))
@@ -709,6 +1000,7 @@ class CityGraphApp:
         self.update_motorista_btn.config(state=tk.NORMAL); self.remove_motorista_btn.config(state=tk.NORMAL)
 
     def _clear_motorista_fields_gui(self):
+        self.tarefas.cancelar('selecao_motorista')
         for name, widget in self.motorista_form_widgets.items():
             if isinstance(widget, ttk.Entry):
                 widget.delete(0, tk.END)
@@ -726,12 +1018,13 @@ class CityGraphApp:
         if not data['nome_motorista_entry'] or not data['cnh_motorista_entry']: messagebox.showerror("Erro", "Nome e CNH são obrigatórios."); return
         val_cnh = data['val_cnh_motorista_entry'] if data['val_cnh_motorista_entry'] != "YYYY-MM-DD" else None
         
-        motorista_id = db_manager.adicionar_motorista_db( 
+        def concluido(motorista_id):
+            if motorista_id: self.log_result(f"Motorista '{data['nome_motorista_entry']}' adicionado."); self._sync_from_db(); self._clear_motorista_fields_gui()
+            else: messagebox.showerror("Erro BD", "Falha ao adicionar motorista (verifique CNH/Email únicos).")
+        self.tarefas.submeter(self.entidades.adicionar_motorista_db,
             data['nome_motorista_entry'], data['cnh_motorista_entry'], data['cat_cnh_motorista_combo'],
             val_cnh, data['tel_motorista_entry'], data['email_motorista_entry'],
-            data['estado_motorista_combo'], data['obs_motorista_text'])
-        if motorista_id: self.log_result(f"Motorista '{data['nome_motorista_entry']}' adicionado."); self._load_motoristas_gui(); self._clear_motorista_fields_gui()
-        else: messagebox.showerror("Erro BD", "Falha ao adicionar motorista (verifique CNH/Email únicos).")
+            data['estado_motorista_combo'], data['obs_motorista_text'], ao_concluir=concluido)
 
     def _update_motorista_gui(self):
         if not self.selected_motorista_db_id: messagebox.showerror("Erro", "Nenhum motorista selecionado."); return
@@ -748,35 +1041,136 @@ class CityGraphApp:
         val_cnh_str = self.motorista_form_widgets['val_cnh_motorista_entry'].get().strip()
         data_to_update["validade_cnh"] = val_cnh_str if val_cnh_str and val_cnh_str != "YYYY-MM-DD" else None
         
-        if db_manager.atualizar_motorista_db(self.selected_motorista_db_id, data_to_update): 
-            self.log_result(f"Motorista ID {self.selected_motorista_db_id} atualizado."); self._load_motoristas_gui(); self._clear_motorista_fields_gui()
-        else: messagebox.showerror("Erro BD", "Falha ao atualizar motorista.")
+        motorista_id = self.selected_motorista_db_id
+        def concluido(ok):
+            if ok: self.log_result(f"Motorista ID {motorista_id} atualizado."); self._sync_from_db(); self._clear_motorista_fields_gui()
+            else: messagebox.showerror("Erro BD", "Falha ao atualizar motorista.")
+        self.tarefas.submeter(self.entidades.atualizar_motorista_db, motorista_id, data_to_update, ao_concluir=concluido)
 
     def _remove_motorista_gui(self):
         if not self.selected_motorista_db_id: messagebox.showerror("Erro", "Nenhum motorista selecionado."); return
-        nome = self.motorista_form_widgets['nome_motorista_entry'].get()
-        if messagebox.askyesno("Confirmar", f"Remover motorista {nome} (ID:{self.selected_motorista_db_id})?"):
-            if db_manager.remover_motorista_db(self.selected_motorista_db_id): 
-                self.log_result(f"Motorista ID {self.selected_motorista_db_id} removido."); self._load_motoristas_gui(); self._clear_motorista_fields_gui()
-            else: messagebox.showerror("Erro BD", "Falha ao remover motorista.")
+        nome, motorista_id = self.motorista_form_widgets['nome_motorista_entry'].get(), self.selected_motorista_db_id
+        if messagebox.askyesno("Confirmar", f"Remover motorista {nome} (ID:{motorista_id})?"):
+            def concluido(ok):
+                if ok: self.log_result(f"Motorista ID {motorista_id} removido."); self._sync_from_db(); self._clear_motorista_fields_gui()
+                else: messagebox.showerror("Erro BD", "Falha ao remover motorista.")
+            self.tarefas.submeter(self.entidades.remover_motorista_db, motorista_id, ao_concluir=concluido)
+
+    @staticmethod
+    def _carga_row_values(c):
+        return (c['id'], c.get('descricao',''), c.get('nome_ponto_origem',''), c.get('nome_ponto_destino',''),
+                c.get('estado',''), c.get('matricula_camiao','N/A'), c.get('nome_motorista','N/A'))
 
     def _load_cargas_gui(self):
+        """Recarrega a primeira página da lista (com o filtro atual) e as cargas aptas para entrega."""
+        filtro, geracao = dict(self.filtro_cargas), self._reset_cargas_paging()
+        def aplicar(dados):
+            if geracao == self._cargas_geracao: self._fill_cargas_gui(dados)
+        self.tarefas.submeter(self._fetch_cargas, filtro, ao_concluir=aplicar, chave='lista_cargas')
+
+    def _fetch_cargas(self, filtro):
+        """Thread de trabalho: (primeira página com `filtro`, todas as cargas aptas para entrega)."""
+        return (self.entidades.obter_cargas_filtradas_db(limite=db_manager.PAGINA_CARGAS, **filtro),
+                self.entidades.obter_cargas_filtradas_db(estados=ESTADOS_APTOS_ENTREGA, limite=None))
+
+    def _reset_cargas_paging(self) -> int:
+        """Descarta páginas pedidas para o filtro anterior; retorna a nova geração da lista."""
+        self.tarefas.cancelar('pagina_cargas')
+        self._cargas_geracao += 1
+        self._cargas_ultima_chave, self._cargas_fim, self._cargas_a_carregar = None, True, False
+        return self._cargas_geracao
+
+    def _fill_cargas_gui(self, dados):
+        pagina, aptas = dados
+        if pagina is None or aptas is None: messagebox.showerror("Erro BD", "Falha ao carregar cargas."); return
         for i in self.cargas_treeview.get_children(): self.cargas_treeview.delete(i)
-        cargas_data = db_manager.obter_todas_cargas_db_detalhado() 
-        if cargas_data is None: messagebox.showerror("Erro BD", "Falha ao carregar cargas."); return
-        for c in cargas_data:
-            self.cargas_treeview.insert("", tk.END, values=(
-                c['id'], c.get('descricao',''), c.get('nome_ponto_origem',''), c.get('nome_ponto_destino',''),
-                c.get('estado',''), c.get('matricula_camiao','N/A'), c.get('nome_motorista','N/A')
-            ))
-        self.log_result(f"{len(cargas_data)} cargas carregadas.")
+        self.cargas_por_id, self.cargas_aptas = {}, {c['id']: c for c in aptas}
+        self._append_cargas_gui(pagina)
+        self.log_result(f"{len(pagina)} cargas carregadas" + ("." if self._cargas_fim else " (as seguintes ao descer na lista)."))
         self._update_entrega_form_combos() 
 
+    def _append_cargas_gui(self, pagina):
+        # Substitui o dicionário em vez de o alterar: _merge_dependent_cargas pode estar a lê-lo noutra thread
+        self.cargas_por_id = {**self.cargas_por_id, **{c['id']: c for c in pagina}}
+        for c in pagina:
+            if not self.cargas_treeview.exists(str(c['id'])):
+                self.cargas_treeview.insert("", tk.END, iid=str(c['id']), values=self._carga_row_values(c))
+        if pagina: self._cargas_ultima_chave = ORDEM_CARGAS[0](pagina[-1])
+        self._cargas_fim = len(pagina) < db_manager.PAGINA_CARGAS
+
+    def _load_more_cargas_gui(self):
+        """Pede a página seguinte (keyset: depois da última linha lida) quando a lista chega ao fim."""
+        if self._cargas_fim or self._cargas_a_carregar: return
+        self._cargas_a_carregar = True
+        filtro, apos, geracao = dict(self.filtro_cargas), self._cargas_ultima_chave, self._cargas_geracao
+        def aplicar(pagina):
+            if geracao != self._cargas_geracao: return
+            self._cargas_a_carregar = False
+            if pagina is None: self.log_result("Erro BD: falha ao carregar mais cargas."); return
+            self._append_cargas_gui(pagina)
+        def falhar(erro):
+            if geracao == self._cargas_geracao: self._cargas_a_carregar = False
+            self._on_task_error(erro)
+        self.tarefas.submeter(lambda: self.entidades.obter_cargas_filtradas_db(apos=apos, limite=db_manager.PAGINA_CARGAS, **filtro),
+                              ao_concluir=aplicar, ao_falhar=falhar, chave='pagina_cargas')
+
+    def _on_cargas_scroll(self, primeiro, ultimo):
+        self.cargas_scrollbar.set(primeiro, ultimo)
+        if float(ultimo) >= 0.95: self._load_more_cargas_gui()
+
+    def _apply_cargas_delta(self, delta):
+        """Aplica uma delta de cargas às aptas para entrega e às linhas visíveis (filtro atual, páginas já lidas)."""
+        for c_id in delta.removidos: self.cargas_aptas.pop(c_id, None)
+        for c in delta.alterados:
+            if c.get('estado') in ESTADOS_APTOS_ENTREGA: self.cargas_aptas[c['id']] = c
+            else: self.cargas_aptas.pop(c['id'], None)
+        visiveis, fora = [], set(delta.removidos)
+        for c in delta.alterados:
+            na_janela = self._cargas_fim or ORDEM_CARGAS[0](c) >= self._cargas_ultima_chave
+            if na_janela and self._carga_no_filtro(c): visiveis.append(c)
+            else: fora.add(c['id'])
+        self._apply_treeview_delta(self.cargas_treeview, self.cargas_por_id, Delta(visiveis, fora), self._carga_row_values, *ORDEM_CARGAS)
+
+    def _carga_no_filtro(self, c) -> bool:
+        """O mesmo critério de obter_cargas_filtradas_db, para as linhas que chegam pela sincronização."""
+        f, criada = self.filtro_cargas, c.get('data_criacao')
+        data = criada.date() if isinstance(criada, datetime.datetime) else criada
+        return ((not f.get('estados') or c.get('estado') in f['estados']) and
+                (not f.get('desde') or data >= f['desde']) and (not f.get('ate') or data <= f['ate']) and
+                (not f.get('cliente') or (c.get('cliente_nome') or "").casefold().startswith(f['cliente'].casefold())) and
+                (f.get('origem_id') is None or c.get('ponto_origem_id') == f['origem_id']) and
+                (f.get('destino_id') is None or c.get('ponto_destino_id') == f['destino_id']))
+
+    def _apply_carga_filter_gui(self):
+        w, filtro = self.carga_filtro_widgets, {}
+        if w['estado'].get() not in ("", FILTRO_TODOS): filtro['estados'] = (w['estado'].get(),)
+        if w['cliente'].get().strip(): filtro['cliente'] = w['cliente'].get().strip()
+        for campo in ('desde', 'ate'):
+            texto = w[campo].get().strip()
+            if texto and texto != "YYYY-MM-DD":
+                try: filtro[campo] = datetime.date.fromisoformat(texto)
+                except ValueError: messagebox.showerror("Erro", f"Data inválida '{texto}' (use YYYY-MM-DD)."); return
+        for campo in ('origem', 'destino'):
+            nome = w[campo].get().split(" (")[0]
+            if nome in self.node_attributes: filtro[f'{campo}_id'] = self.node_attributes[nome]['id']
+        self.filtro_cargas = filtro
+        self._load_cargas_gui()
+
+    def _clear_carga_filter_gui(self):
+        w = self.carga_filtro_widgets
+        w['estado'].set(FILTRO_TODOS); w['cliente'].delete(0, tk.END); w['origem'].set(""); w['destino'].set("")
+        for campo in ('desde', 'ate'): w[campo].delete(0, tk.END); self._add_placeholder(None, w[campo], "YYYY-MM-DD")
+        if self.filtro_cargas: self.filtro_cargas = {}; self._load_cargas_gui()
+
     def _on_carga_select(self, event=None):
         sel = self.cargas_treeview.selection()
         if not sel: self._clear_carga_fields_gui(); self.selected_carga_db_id=None; return
         self.selected_carga_db_id = self.cargas_treeview.item(sel[0])['values'][0]
-        carga_data = db_manager.obter_carga_por_id_db(self.selected_carga_db_id) 
+        # A versão detalhada tem as mesmas colunas e é servida pelas linhas da lista em cache
+        self.tarefas.submeter(self.entidades.obter_carga_por_id_db_detalhado, self.selected_carga_db_id,
+                              ao_concluir=self._fill_carga_form_gui, chave='selecao_carga')
+
+    def _fill_carga_form_gui(self, carga_data):
         if not carga_data: messagebox.showerror("Erro BD", "Carga não encontrada."); self._clear_carga_fields_gui(); return
 
         self.carga_form_widgets['desc_carga_entry'].delete(0,tk.END); self.carga_form_widgets['desc_carga_entry'].insert(0, carga_data.get('descricao',''))
@@ -808,6 +1202,7 @@ class CityGraphApp:
         self.update_carga_btn.config(state=tk.NORMAL); self.remove_carga_btn.config(state=tk.NORMAL)
 
     def _clear_carga_fields_gui(self):
+        self.tarefas.cancelar('selecao_carga')
         for name, widget in self.carga_form_widgets.items():
             if isinstance(widget, ttk.Entry):
                 widget.delete(0, tk.END)
@@ -838,12 +1233,13 @@ class CityGraphApp:
         cam_id = int(data['camiao_carga_combo'].split("ID:")[-1]) if data['camiao_carga_combo'] != "Nenhum" else None
         mot_id = int(data['motorista_carga_combo'].split("ID:")[-1]) if data['motorista_carga_combo'] != "Nenhum" else None
 
-        carga_id = db_manager.adicionar_carga_db( 
+        def concluido(carga_id):
+            if carga_id: self.log_result(f"Carga '{data['desc_carga_entry']}' adicionada."); self._sync_from_db(); self._clear_carga_fields_gui()
+            else: messagebox.showerror("Erro BD", "Falha ao adicionar carga.")
+        self.tarefas.submeter(self.entidades.adicionar_carga_db,
             data['desc_carga_entry'], data['tipo_carga_combo'], peso, vol, p_o_id, p_d_id,
             data['cliente_carga_entry'], dt_col, dt_ent, data['estado_carga_combo'],
-            cam_id, mot_id, data['obs_carga_text'] )
-        if carga_id: self.log_result(f"Carga '{data['desc_carga_entry']}' adicionada."); self._load_cargas_gui(); self._clear_carga_fields_gui()
-        else: messagebox.showerror("Erro BD", "Falha ao adicionar carga.")
+            cam_id, mot_id, data['obs_carga_text'], ao_concluir=concluido)
 
     def _update_carga_gui(self):
         if not self.selected_carga_db_id: messagebox.showerror("Erro", "Nenhuma carga selecionada."); return
@@ -869,68 +1265,95 @@ class CityGraphApp:
         data_to_update["camiao_atribuido_id"] = int(self.carga_form_widgets['camiao_carga_combo'].get().split("ID:")[-1]) if self.carga_form_widgets['camiao_carga_combo'].get() != "Nenhum" else None
         data_to_update["motorista_atribuido_id"] = int(self.carga_form_widgets['motorista_carga_combo'].get().split("ID:")[-1]) if self.carga_form_widgets['motorista_carga_combo'].get() != "Nenhum" else None
 
-        if db_manager.atualizar_carga_db(self.selected_carga_db_id, data_to_update): 
-            self.log_result(f"Carga ID {self.selected_carga_db_id} atualizada."); self._load_cargas_gui(); self._clear_carga_fields_gui()
-        else: messagebox.showerror("Erro BD", "Falha ao atualizar carga.")
+        carga_id = self.selected_carga_db_id
+        def concluido(ok):
+            if ok: self.log_result(f"Carga ID {carga_id} atualizada."); self._sync_from_db(); self._clear_carga_fields_gui()
+            else: messagebox.showerror("Erro BD", "Falha ao atualizar carga.")
+        self.tarefas.submeter(self.entidades.atualizar_carga_db, carga_id, data_to_update, ao_concluir=concluido)
 
     def _remove_carga_gui(self):
         if not self.selected_carga_db_id: messagebox.showerror("Erro", "Nenhuma carga selecionada."); return
-        desc = self.carga_form_widgets['desc_carga_entry'].get()
-        if messagebox.askyesno("Confirmar", f"Remover carga {desc} (ID:{self.selected_carga_db_id})?"):
-            if db_manager.remover_carga_db(self.selected_carga_db_id): 
-                self.log_result(f"Carga ID {self.selected_carga_db_id} removida."); self._load_cargas_gui(); self._clear_carga_fields_gui()
-            else: messagebox.showerror("Erro BD", "Falha ao remover carga.")
+        desc, carga_id = self.carga_form_widgets['desc_carga_entry'].get(), self.selected_carga_db_id
+        if messagebox.askyesno("Confirmar", f"Remover carga {desc} (ID:{carga_id})?"):
+            def concluido(ok):
+                if ok: self.log_result(f"Carga ID {carga_id} removida."); self._sync_from_db(); self._clear_carga_fields_gui()
+                else: messagebox.showerror("Erro BD", "Falha ao remover carga.")
+            self.tarefas.submeter(self.entidades.remover_carga_db, carga_id, ao_concluir=concluido)
 
     def _on_entrega_carga_selected(self, event=None):
+        self.tarefas.cancelar('rota_entrega')
         self.iniciar_entrega_btn.config(state=tk.DISABLED) 
         self.entrega_rota_details_text.config(state=tk.NORMAL); self.entrega_rota_details_text.delete(1.0, tk.END); self.entrega_rota_details_text.config(state=tk.DISABLED)
-        self.redraw_canvas_gui(canvas_widget=self.entrega_map_canvas, node_attrs_override={}) 
+        self.entrega_mapa.mostrar({}) 
 
         selected_carga_str = self.entrega_carga_combo.get()
         if not selected_carga_str:
+            self.tarefas.cancelar('entrega_carga')
             self.entrega_origem_label.config(text="N/A"); self.entrega_destino_label.config(text="N/A"); return
-        try:
-            carga_id = int(selected_carga_str.split("ID:")[1].split(" -")[0])
-            carga_data = db_manager.obter_carga_por_id_db_detalhado(carga_id) 
-            if carga_data:
-                self.entrega_origem_label.config(text=f"{carga_data.get('nome_ponto_origem','N/A')} (ID:{carga_data.get('ponto_origem_id')})")
-                self.entrega_destino_label.config(text=f"{carga_data.get('nome_ponto_destino','N/A')} (ID:{carga_data.get('ponto_destino_id')})")
-                mot_id, cam_id = carga_data.get('motorista_atribuido_id'), carga_data.get('camiao_atribuido_id')
-                mot_val = next((m for m in self.entrega_motorista_combo['values'] if f"ID:{mot_id}" in m), "Nenhum")
-                self.entrega_motorista_combo.set(mot_val)
-                cam_val = next((c for c in self.entrega_camiao_combo['values'] if f"ID:{cam_id}" in c), "Nenhum")
-                self.entrega_camiao_combo.set(cam_val)
-            else: self.entrega_origem_label.config(text="Erro dados carga."); self.entrega_destino_label.config(text="")
-        except Exception as e: self.log_result(f"Erro seleção carga entrega: {e}"); self.entrega_origem_label.config(text="Erro"); self.entrega_destino_label.config(text="")
+        try: carga_id = int(selected_carga_str.split("ID:")[1].split(" -")[0])
+        except (IndexError, ValueError) as e: self._on_entrega_carga_error(e); return
+        self.entrega_origem_label.config(text="A carregar..."); self.entrega_destino_label.config(text="")
+        # Uma seleção nova cancela a leitura da anterior (chave 'entrega_carga')
+        self.tarefas.submeter(self.entidades.obter_carga_por_id_db_detalhado, carga_id, ao_concluir=self._fill_entrega_carga_gui,
+                              ao_falhar=self._on_entrega_carga_error, chave='entrega_carga')
+
+    def _fill_entrega_carga_gui(self, carga_data):
+        if carga_data:
+            self.entrega_origem_label.config(text=f"{carga_data.get('nome_ponto_origem','N/A')} (ID:{carga_data.get('ponto_origem_id')})")
+            self.entrega_destino_label.config(text=f"{carga_data.get('nome_ponto_destino','N/A')} (ID:{carga_data.get('ponto_destino_id')})")
+            mot_id, cam_id = carga_data.get('motorista_atribuido_id'), carga_data.get('camiao_atribuido_id')
+            mot_val = next((m for m in self.entrega_motorista_combo['values'] if f"ID:{mot_id}" in m), "Nenhum")
+            self.entrega_motorista_combo.set(mot_val)
+            cam_val = next((c for c in self.entrega_camiao_combo['values'] if f"ID:{cam_id}" in c), "Nenhum")
+            self.entrega_camiao_combo.set(cam_val)
+        else: self.entrega_origem_label.config(text="Erro dados carga."); self.entrega_destino_label.config(text="")
+
+    def _on_entrega_carga_error(self, e):
+        self.log_result(f"Erro seleção carga entrega: {e}"); self.entrega_origem_label.config(text="Erro"); self.entrega_destino_label.config(text="")
 
     def _calcular_rota_entrega_gui(self):
         self.iniciar_entrega_btn.config(state=tk.DISABLED)
         self.entrega_rota_details_text.config(state=tk.NORMAL); self.entrega_rota_details_text.delete(1.0, tk.END)
         carga_str = self.entrega_carga_combo.get()
-        if not carga_str: messagebox.showerror("Erro", "Selecione uma carga."); return
-        try:
-            carga_id = int(carga_str.split("ID:")[1].split(" -")[0])
-            carga_data = db_manager.obter_carga_por_id_db_detalhado(carga_id) 
-            if not carga_data: messagebox.showerror("Erro", "Dados da carga não encontrados."); return
+        if not carga_str: messagebox.showerror("Erro", "Selecione uma carga."); self.entrega_rota_details_text.config(state=tk.DISABLED); return
+        try: carga_id = int(carga_str.split("ID:")[1].split(" -")[0])
+        except (IndexError, ValueError) as e: self._on_rota_entrega_error(e); return
+        self.entrega_rota_details_text.insert(tk.END, "A calcular rota..."); self.entrega_rota_details_text.config(state=tk.DISABLED)
+
+        def calcular():
+            """Thread de trabalho: (mensagem de erro, None) ou (None, (origem, destino, dist, caminho))."""
+            carga_data = self.entidades.obter_carga_por_id_db_detalhado(carga_id)
+            if not carga_data: return "Dados da carga não encontrados.", None
             o_nome, d_nome = carga_data.get('nome_ponto_origem'), carga_data.get('nome_ponto_destino')
-            if not o_nome or not d_nome: messagebox.showerror("Erro", "Origem/Destino da carga não definidos."); return
-            if o_nome not in self.city_graph.get_vertices() or d_nome not in self.city_graph.get_vertices():
-                messagebox.showerror("Erro Grafo", f"Ponto '{o_nome}' ou '{d_nome}' não existe no grafo."); 
-                self.entrega_rota_details_text.insert(tk.END, "Erro: Pontos não no grafo."); self.entrega_rota_details_text.config(state=tk.DISABLED); return
-            dist, path = dijkstra(self.city_graph, o_nome, d_nome)
+            if not o_nome or not d_nome: return "Origem/Destino da carga não definidos.", None
+            if o_nome not in self.city_graph or d_nome not in self.city_graph:
+                return f"Ponto '{o_nome}' ou '{d_nome}' não existe no grafo.", None
+            return None, (o_nome, d_nome, *self.route_cache.rota(o_nome, d_nome))
+        self.tarefas.submeter(calcular, ao_concluir=self._show_rota_entrega_gui, ao_falhar=self._on_rota_entrega_error, chave='rota_entrega')
+
+    def _show_rota_entrega_gui(self, resultado):
+        erro, rota = resultado
+        self.entrega_rota_details_text.config(state=tk.NORMAL); self.entrega_rota_details_text.delete(1.0, tk.END)
+        try:
+            if erro:
+                self.entrega_rota_details_text.insert(tk.END, f"Erro: {erro}"); messagebox.showerror("Erro", erro); return
+            o_nome, d_nome, dist, path = rota
             if dist == math.inf:
                 msg = f"Rota de '{o_nome}' para '{d_nome}' não calculada."
                 self.entrega_rota_details_text.insert(tk.END, msg); messagebox.showinfo("Rota", msg)
-                self.redraw_canvas_gui(canvas_widget=self.entrega_map_canvas, node_attrs_override={p:self.node_attributes[p] for p in [o_nome,d_nome] if p in self.node_attributes})
+                self.entrega_mapa.mostrar({p:self.node_attributes[p] for p in [o_nome,d_nome] if p in self.node_attributes})
             else:
                 msg = f"Rota: {' -> '.join(path)}\nDistância: {dist} km"
                 self.entrega_rota_details_text.insert(tk.END, msg); messagebox.showinfo("Rota", msg)
                 nodes_path_attrs = {n_name: self.node_attributes[n_name] for n_name in path if n_name in self.node_attributes}
-                self.redraw_canvas_gui(highlight_path=path, canvas_widget=self.entrega_map_canvas, node_attrs_override=nodes_path_attrs)
+                self.entrega_mapa.mostrar(nodes_path_attrs, path)
                 self.iniciar_entrega_btn.config(state=tk.NORMAL) 
-        except Exception as e: self.log_result(f"Erro calc rota entrega: {e}"); messagebox.showerror("Erro", f"Erro: {e}")
         finally: self.entrega_rota_details_text.config(state=tk.DISABLED)
 
+    def _on_rota_entrega_error(self, e):
+        self.entrega_rota_details_text.config(state=tk.NORMAL); self.entrega_rota_details_text.delete(1.0, tk.END); self.entrega_rota_details_text.config(state=tk.DISABLED)
+        self.log_result(f"Erro calc rota entrega: {e}"); messagebox.showerror("Erro", f"Erro: {e}")
+
     def _iniciar_entrega_gui(self):
         carga_str, mot_str, cam_str = self.entrega_carga_combo.get(), self.entrega_motorista_combo.get(), self.entrega_camiao_combo.get()
         if not carga_str or mot_str == "Nenhum" or cam_str == "Nenhum":
@@ -938,18 +1361,24 @@ class CityGraphApp:
         try:
             carga_id = int(carga_str.split("ID:")[1].split(" -")[0])
             mot_id = int(mot_str.split("ID:")[-1]); cam_id = int(cam_str.split("ID:")[-1])
-            db_manager.atualizar_carga_db(carga_id, {"estado": "Em Trânsito", "motorista_atribuido_id": mot_id, "camiao_atribuido_id": cam_id})
-            db_manager.atualizar_motorista_db(mot_id, {"estado": "Em Rota"})
-            db_manager.atualizar_camiao_db(cam_id, {"estado": "Em Rota", "localizacao_atual_ponto_id": None}) 
+        except (IndexError, ValueError) as e: self.log_result(f"Erro iniciar entrega: {e}"); messagebox.showerror("Erro", f"Falha: {e}"); return
+        def iniciar():
+            self.entidades.atualizar_carga_db(carga_id, {"estado": "Em Trânsito", "motorista_atribuido_id": mot_id, "camiao_atribuido_id": cam_id})
+            self.entidades.atualizar_motorista_db(mot_id, {"estado": "Em Rota"})
+            self.entidades.atualizar_camiao_db(cam_id, {"estado": "Em Rota", "localizacao_atual_ponto_id": None}) 
+        def concluido(_):
             self.log_result(f"Entrega Carga ID:{carga_id} iniciada (Mot:{mot_id}, Cam:{cam_id}).")
             messagebox.showinfo("Entrega Iniciada", f"Entrega Carga ID:{carga_id} iniciada.")
-            self._load_all_initial_data() # Recarrega tudo para refletir estados
+            self._sync_from_db() # Aplica só as alterações de estado
             self.iniciar_entrega_btn.config(state=tk.DISABLED)
             self.entrega_rota_details_text.config(state=tk.NORMAL); self.entrega_rota_details_text.delete(1.0, tk.END); self.entrega_rota_details_text.config(state=tk.DISABLED)
-            self.redraw_canvas_gui(canvas_widget=self.entrega_map_canvas, node_attrs_override={})
-        except Exception as e: self.log_result(f"Erro iniciar entrega: {e}"); messagebox.showerror("Erro", f"Falha: {e}")
+            self.entrega_mapa.mostrar({})
+        def falhou(e): self.log_result(f"Erro iniciar entrega: {e}"); messagebox.showerror("Erro", f"Falha: {e}")
+        self.iniciar_entrega_btn.config(state=tk.DISABLED)
+        self.tarefas.submeter(iniciar, ao_concluir=concluido, ao_falhar=falhou)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # no executável do PyInstaller os processos dos Pools não voltam a abrir a interface
     main_root = tk.Tk()
     app = CityGraphApp(main_root)
     main_root.mainloop()
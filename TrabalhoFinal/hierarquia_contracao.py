@@ -0,0 +1,300 @@
+"""
+Contraction Hierarchies (CH) sobre o Graph.
+O pré-processamento contrai os vértices por ordem de importância, adicionando
+atalhos que preservam as distâncias; as consultas fazem uma busca bidirecional
+só "para cima" na hierarquia e desempacotam os atalhos no caminho final.
+"""
+import array
+import heapq
+import math
+import os
+import pickle
+import threading
+import zlib
+from graph import Graph
+from caminho_mais_curto import dijkstra_bidirecional
+
+VERSAO_FORMATO = 1
+LIMITE_TESTEMUNHA = 500   # vértices assentados por busca de testemunha
+
+class HierarquiaContracao:
+    def __init__(self, nomes, assinatura, up_csr, down_csr, meios):
+        self.nomes = nomes
+        self.ids = {nome: i for i, nome in enumerate(nomes)}
+        self.assinatura = assinatura
+        self.up_csr = up_csr        # arcos u->w com rank[w] > rank[u] (busca para a frente)
+        self.down_csr = down_csr    # arcos x->u com rank[x] > rank[u], guardados em u (busca para trás)
+        self.meios = meios          # (a, b) -> vértice contraído que o atalho a->b substitui
+
+    @classmethod
+    def construir(cls, graph: Graph):
+        nomes = list(graph.names)
+        origens, destinos, pesos, bidir = (array.array(a.typecode, a) for a in graph.edges())
+        return cls._construir(nomes, origens, destinos, pesos, bidir)
+
+    @classmethod
+    def _construir(cls, nomes, origens, destinos, pesos, bidir):
+        n = len(nomes)
+        saida = [dict() for _ in range(n)]
+        entrada = [dict() for _ in range(n)]
+        arcos = {}
+        def juntar_arco(a, b, peso, meio):
+            if a == b or peso >= arcos.get((a, b), (math.inf,))[0]:
+                return
+            arcos[(a, b)] = (peso, meio)
+            saida[a][b] = peso; entrada[b][a] = peso
+        for e in range(len(pesos)):
+            juntar_arco(origens[e], destinos[e], pesos[e], -1)
+            if bidir[e]: juntar_arco(destinos[e], origens[e], pesos[e], -1)
+
+        contraidos = [False] * n
+        vizinhos_contraidos = [0] * n
+
+        def atalhos_necessarios(v):
+            atalhos = []
+            for u, w_uv in entrada[v].items():
+                alvos = {w: w_uv + w_vw for w, w_vw in saida[v].items() if w != u}
+                if not alvos: continue
+                testemunhas = _busca_testemunha(saida, u, v, alvos, max(alvos.values()))
+                for w, via_v in alvos.items():
+                    if testemunhas.get(w, math.inf) > via_v:
+                        atalhos.append((u, w, via_v))
+            return atalhos
+
+        def prioridade(v, atalhos):
+            # Diferença de arestas + vizinhos já contraídos (espalha a contração pelo mapa).
+            return 2 * (len(atalhos) - len(entrada[v]) - len(saida[v])) + vizinhos_contraidos[v]
+
+        fila = [(prioridade(v, atalhos_necessarios(v)), v) for v in range(n)]
+        heapq.heapify(fila)
+        rank = [0] * n
+        proximo_rank = 0
+        while fila:
+            _, v = heapq.heappop(fila)
+            if contraidos[v]: continue
+            atalhos = atalhos_necessarios(v)
+            nova = prioridade(v, atalhos)
+            if fila and nova > fila[0][0]:
+                heapq.heappush(fila, (nova, v)); continue
+            for u, w, peso in atalhos:
+                juntar_arco(u, w, peso, v)
+            for u in entrada[v]:
+                del saida[u][v]; vizinhos_contraidos[u] += 1
+            for w in saida[v]:
+                del entrada[w][v]; vizinhos_contraidos[w] += 1
+            contraidos[v] = True
+            rank[v] = proximo_rank; proximo_rank += 1
+
+        up = [[] for _ in range(n)]
+        down = [[] for _ in range(n)]
+        meios = {}
+        for (a, b), (peso, meio) in arcos.items():
+            if rank[b] > rank[a]: up[a].append((b, peso))
+            else: down[b].append((a, peso))
+            if meio != -1: meios[(a, b)] = meio
+        return cls(nomes, _assinatura(nomes, origens, destinos, pesos, bidir), _para_csr(up), _para_csr(down), meios)
+
+    def consulta(self, start_node: str, end_node: str):
+        """Mesmo contrato de dijkstra: (distância, caminho) ou (math.inf, [])."""
+        start, end = self.ids.get(start_node), self.ids.get(end_node)
+        if start is None or end is None:
+            return math.inf, []
+        if start == end:
+            return 0, [start_node]
+
+        dist_f, pred_f = _busca_ascendente(self.up_csr, start)
+        dist_b, pred_b = _busca_ascendente(self.down_csr, end)
+        best, meeting = math.inf, -1
+        for v, d in dist_f.items():
+            total = d + dist_b.get(v, math.inf)
+            if total < best: best, meeting = total, v
+        if meeting == -1:
+            return math.inf, []
+
+        ids_caminho = []
+        atual = meeting
+        while atual != -1:
+            ids_caminho.append(atual); atual = pred_f[atual]
+        ids_caminho.reverse()
+        atual = pred_b[meeting]
+        while atual != -1:
+            ids_caminho.append(atual); atual = pred_b[atual]
+        return best, [self.nomes[v] for v in self._desempacotar(ids_caminho)]
+
+    def _desempacotar(self, ids_caminho):
+        resultado = [ids_caminho[0]]
+        for i in range(len(ids_caminho) - 1):
+            pilha = [(ids_caminho[i], ids_caminho[i + 1])]
+            while pilha:
+                a, b = pilha.pop()
+                meio = self.meios.get((a, b))
+                if meio is None: resultado.append(b)
+                else: pilha.append((meio, b)); pilha.append((a, meio))
+        return resultado
+
+    def valida_para(self, graph: Graph) -> bool:
+        return self.assinatura == _assinatura(graph.names, *graph.edges())
+
+    def guardar(self, caminho_ficheiro: str):
+        dados = {'versao': VERSAO_FORMATO, 'nomes': self.nomes, 'assinatura': self.assinatura,
+                'up': self.up_csr, 'down': self.down_csr, 'meios': self.meios}
+        temporario = caminho_ficheiro + ".tmp"
+        with open(temporario, 'wb') as f: pickle.dump(dados, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho_ficheiro)
+
+    @classmethod
+    def carregar(cls, caminho_ficheiro: str):
+        """
+        Retorna a hierarquia guardada, ou None se não existir, for de outra versão ou
+        não puder ser lida (ficheiro truncado, de outra versão do Python, ...): reconstrói-se.
+        """
+        try:
+            with open(caminho_ficheiro, 'rb') as f: dados = pickle.load(f)
+            if not isinstance(dados, dict) or dados.get('versao') != VERSAO_FORMATO:
+                return None
+            return cls(dados['nomes'], dados['assinatura'], dados['up'], dados['down'], dados['meios'])
+        except Exception as err:  # qualquer falha a ler a cache equivale a não a ter
+            if not isinstance(err, FileNotFoundError): print(f"Aviso: hierarquia guardada ignorada: {err!r}")
+            return None
+
+class MotorCH:
+    """
+    Motor de rotas com o contrato de dijkstra (graph, origem, destino), para
+    usar como CacheRotas(motor=...). Enquanto a hierarquia não corresponde ao
+    grafo atual (p.ex. logo após add_edge) responde com dijkstra_bidirecional
+    e reconstrói a hierarquia numa thread em segundo plano.
+    """
+    def __init__(self, caminho_ficheiro=None, reserva=dijkstra_bidirecional):
+        self.caminho_ficheiro = caminho_ficheiro
+        self.reserva = reserva
+        self.hierarquia = None
+        self._graph = None
+        self._validado = None  # (graph, nº de vértices, nº de arestas) para que a hierarquia foi construída/validada
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pendente = False
+
+    @property
+    def pronto(self) -> bool:
+        """
+        True se a hierarquia corresponde ao grafo atual. Só se confia nela para o mesmo
+        objeto Graph em que foi validada (valida_para compara a assinatura) ou construída;
+        como um Graph só cresce, basta depois comparar as contagens.
+        """
+        validado = self._validado
+        return self.hierarquia is not None and validado is not None and validado[0] is self._graph and \
+            (len(self._graph), self._graph.num_edges()) == validado[1:]
+
+    def hierarquia_para(self, graph: Graph):
+        """
+        A hierarquia atual ou a do disco, se corresponder a `graph`; senão None. Não altera
+        o motor (pode correr numa thread de trabalho antes de `graph` ser adotado).
+        """
+        hierarquia = self.hierarquia
+        if hierarquia is None and self.caminho_ficheiro:
+            hierarquia = HierarquiaContracao.carregar(self.caminho_ficheiro)
+        return hierarquia if hierarquia is not None and hierarquia.valida_para(graph) else None
+
+    def preparar(self, graph: Graph, hierarquia=None):
+        """
+        Passa a servir `graph`; chamar quando ele já é o grafo em uso. `hierarquia` vem de
+        hierarquia_para(graph); sem ela, reconstrói em segundo plano.
+        """
+        with self._lock:
+            self._graph = graph
+            if hierarquia is not None:
+                self.hierarquia, self._validado = hierarquia, (graph, len(graph), graph.num_edges())
+                self._pendente = False  # uma reconstrução em curso é de um grafo anterior
+            else:
+                self._validado = None  # até à reconstrução responde a reserva, nunca a hierarquia antiga
+        if hierarquia is None: self.agendar_reconstrucao(graph)
+
+    def agendar_reconstrucao(self, graph: Graph):
+        self._graph = graph
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._pendente = True; return
+            self._iniciar_thread(graph)
+
+    def _iniciar_thread(self, graph: Graph):
+        nomes = list(graph.names)
+        arrays = [array.array(a.typecode, a) for a in graph.edges()]
+        self._pendente = False
+        self._thread = threading.Thread(target=self._reconstruir, args=(graph, nomes, arrays), daemon=True)
+        self._thread.start()
+
+    def _reconstruir(self, graph, nomes, arrays):
+        hierarquia = HierarquiaContracao._construir(nomes, *arrays)
+        with self._lock:
+            if graph is self._graph:
+                self.hierarquia, self._validado = hierarquia, (graph, len(nomes), len(arrays[2]))
+                if self.caminho_ficheiro:
+                    try: hierarquia.guardar(self.caminho_ficheiro)
+                    except OSError as err: print(f"Aviso: falha ao guardar hierarquia: {err}")
+            if self._pendente and self._graph is not None:
+                self._iniciar_thread(self._graph)
+
+    def __call__(self, graph: Graph, start_node: str, end_node: str):
+        if graph is self._graph and self.pronto:
+            return self.hierarquia.consulta(start_node, end_node)
+        return self.reserva(graph, start_node, end_node)
+
+def _busca_testemunha(saida, origem, ignorado, alvos, limite):
+    """Dijkstra limitado de `origem` sem passar por `ignorado`; pára ao cobrir os alvos."""
+    dist = {origem: 0}
+    fila = [(0, origem)]
+    por_assentar = set(alvos)
+    assentados = 0
+    while fila and por_assentar and assentados < LIMITE_TESTEMUNHA:
+        d, u = heapq.heappop(fila)
+        if d > dist[u]: continue
+        if d > limite: break
+        assentados += 1
+        por_assentar.discard(u)
+        for w, peso in saida[u].items():
+            if w == ignorado: continue
+            nd = d + peso
+            if nd < dist.get(w, math.inf):
+                dist[w] = nd; heapq.heappush(fila, (nd, w))
+    return dist
+
+def _busca_ascendente(csr, start):
+    offsets, targets, weights = csr
+    dist, pred = {start: 0}, {start: -1}
+    fila = [(0, start)]
+    while fila:
+        d, u = heapq.heappop(fila)
+        if d > dist[u]: continue
+        for i in range(offsets[u], offsets[u + 1]):
+            w, nd = targets[i], d + weights[i]
+            if nd < dist.get(w, math.inf):
+                dist[w] = nd; pred[w] = u; heapq.heappush(fila, (nd, w))
+    return dist, pred
+
+def _para_csr(listas):
+    offsets = array.array('i', [0])
+    targets, weights = array.array('i'), array.array('d')
+    for lista in listas:
+        for w, peso in lista:
+            targets.append(w); weights.append(peso)
+        offsets.append(len(targets))
+    return offsets, targets, weights
+
+def _assinatura(nomes, origens, destinos, pesos, bidir):
+    crc = zlib.crc32("\x00".join(map(str, nomes)).encode('utf-8'))
+    for a in (origens, destinos, pesos, bidir):
+        crc = zlib.crc32(a.tobytes(), crc)
+    return (len(nomes), len(pesos), crc)
+
+if __name__ == "__main__":
+    # Pré-processamento offline: python hierarquia_contracao.py [ficheiro_saida]
+    import sys
+    import time
+    import database_manager as db_manager
+    destino = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "hierarquia_rotas.ch")
+    grafo = Graph.from_id_rows(db_manager.iterar_tabela_db('pontos', ('id', 'nome'), ordem='nome'),
+                               db_manager.iterar_tabela_db('conexoes', db_manager.COLUNAS_ARESTAS, ordem='id'))
+    inicio = time.perf_counter()
+    hierarquia = HierarquiaContracao.construir(grafo)
+    hierarquia.guardar(destino)
+    print(f"{len(grafo)} pontos, {len(hierarquia.meios)} atalhos, {time.perf_counter() - inicio:.1f}s -> {destino}")
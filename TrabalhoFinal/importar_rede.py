@@ -0,0 +1,228 @@
+"""
+Importador em massa de redes rodoviárias para `pontos`/`conexoes`.
+Formatos (lidos em streaming, um registo de cada vez):
+- CSV de pontos:    nome;tipo;coord_x;coord_y
+- CSV de conexões:  origem;destino;distancia[;bidirecional]
+  (separador ';' ou ',', detetado pelo cabeçalho)
+- GeoJSON: FeatureCollection ou uma Feature por linha. Point -> ponto
+  (propriedades nome, tipo); LineString -> conexão (propriedades origem,
+  destino e opcionalmente distancia/bidirecional).
+- OSM XML: as vias com tag highway tornam-se conexões entre nós consecutivos
+  (só as coordenadas dos nós ficam em memória, para medir os troços).
+Os registos são carregados em lotes transacionais via database_manager e o
+progresso é guardado em <ficheiro>.progresso para retomar após uma falha.
+Uso: python importar_rede.py ficheiro [ficheiro ...] [--lote N] [--recomecar]
+"""
+import csv
+import json
+import math
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+import database_manager as db_manager
+
+TAMANHO_LOTE = 5000
+ESCALA_COORD = 1000  # graus lon/lat -> coordenadas inteiras de pontos.coord_x/coord_y
+TIPOS_PONTO = ('Depósito', 'Cidade')
+VERDADEIRO = {'1', 'true', 'sim', 'yes', 's', 'y'}
+
+# --- Leitores (geradores de registos) ---
+# Registos: ('ponto', nome, tipo, x, y) e ('conexao', origem, destino, distancia, bidirecional)
+
+def ler_csv(caminho: str):
+    with open(caminho, newline='', encoding='utf-8-sig') as f:
+        cabecalho = f.readline()
+        separador = ';' if cabecalho.count(';') >= cabecalho.count(',') else ','
+        colunas = [c.strip().lower() for c in next(csv.reader([cabecalho], delimiter=separador))]
+        for linha in csv.DictReader(f, fieldnames=colunas, delimiter=separador):
+            if 'origem' in linha and 'destino' in linha:
+                bidir = linha.get('bidirecional')
+                yield ('conexao', linha['origem'].strip(), linha['destino'].strip(), float(linha['distancia']),
+                       True if bidir in (None, '') else bidir.strip().lower() in VERDADEIRO)
+            elif 'nome' in linha:
+                yield ('ponto', linha['nome'].strip(), _tipo(linha.get('tipo')), _inteiro(linha.get('coord_x')), _inteiro(linha.get('coord_y')))
+
+def ler_geojson(caminho: str):
+    for feature in _features_geojson(caminho):
+        geometria, props = feature.get('geometry') or {}, feature.get('properties') or {}
+        coords = geometria.get('coordinates')
+        if geometria.get('type') == 'Point' and props.get('nome'):
+            yield ('ponto', props['nome'], _tipo(props.get('tipo')), _escalar(coords[0]), _escalar(coords[1]))
+        elif geometria.get('type') == 'LineString' and props.get('origem') and props.get('destino'):
+            dist = props.get('distancia')
+            if dist is None: dist = sum(_haversine_km(a, b) for a, b in zip(coords, coords[1:]))
+            bidir = props.get('bidirecional', True)
+            yield ('conexao', props['origem'], props['destino'], float(dist),
+                   bidir if isinstance(bidir, bool) else str(bidir).lower() in VERDADEIRO)
+
+def _features_geojson(caminho: str, tamanho_bloco: int = 1 << 16):
+    """Extrai as Features uma a uma sem carregar o documento inteiro."""
+    decoder = json.JSONDecoder()
+    with open(caminho, encoding='utf-8') as f:
+        # Lê blocos até saber o formato: a primeira linha completa é uma Feature
+        # (sequencial) ou encontrou-se a chave "features" e o '[' da lista
+        buffer, sequencial, inicio, abertura = '', None, -1, -1
+        while True:
+            if sequencial is None: sequencial = _primeira_linha_e_feature(buffer)
+            if sequencial: break
+            if inicio == -1: inicio = buffer.find('"features"')
+            if inicio != -1: abertura = buffer.find('[', inicio)
+            if abertura != -1: break
+            bloco = f.read(tamanho_bloco)
+            if not bloco: break
+            buffer += bloco
+        if abertura == -1:
+            if inicio != -1: raise ValueError(f"GeoJSON inválido (sem lista de features): {caminho}")
+            # Uma Feature por linha (GeoJSON sequencial), ou um documento só com uma Feature
+            for linha in _linhas(buffer, f, tamanho_bloco):
+                linha = linha.strip().lstrip('\x1e')
+                if linha: yield json.loads(linha)
+            return
+        pos = abertura + 1
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,': pos += 1
+            if pos < len(buffer) and buffer[pos] == ']': return
+            try:
+                feature, pos_fim = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                bloco = f.read(tamanho_bloco)
+                if not bloco: raise
+                buffer, pos = buffer[pos:] + bloco, 0; continue
+            yield feature
+            pos = pos_fim
+
+def _primeira_linha_e_feature(buffer: str):
+    """True/False se a primeira linha de `buffer` é/não é uma Feature inteira; None se ainda não está completa."""
+    corpo = buffer.lstrip()
+    fim = corpo.find('\n')
+    if fim == -1: return None
+    try: objeto = json.loads(corpo[:fim].strip().lstrip('\x1e'))
+    except ValueError: return False
+    return isinstance(objeto, dict) and objeto.get('type') == 'Feature'
+
+def _linhas(inicio: str, f, tamanho_bloco: int):
+    pendente = inicio
+    for bloco in iter(lambda: f.read(tamanho_bloco), ''):
+        pendente += bloco
+        *completas, pendente = pendente.split('\n')
+        yield from completas
+    yield from pendente.split('\n')
+
+def ler_osm(caminho: str):
+    coords_nos, emitidos, raiz = {}, set(), None
+    for evento, elem in ET.iterparse(caminho, events=('start', 'end')):
+        if evento == 'start':
+            if raiz is None: raiz = elem
+            continue
+        if elem.tag == 'node':
+            coords_nos[elem.get('id')] = (float(elem.get('lon')), float(elem.get('lat')))
+        elif elem.tag == 'way':
+            tags = {t.get('k'): t.get('v') for t in elem.iter('tag')}
+            refs = [nd.get('ref') for nd in elem.iter('nd') if nd.get('ref') in coords_nos]
+            if 'highway' in tags and len(refs) > 1:
+                unico_sentido = tags.get('oneway') in ('yes', '1', 'true')
+                for ref in refs:
+                    if ref not in emitidos:
+                        emitidos.add(ref); lon, lat = coords_nos[ref]
+                        yield ('ponto', f"osm:{ref}", 'Cidade', _escalar(lon), _escalar(lat))
+                for a, b in zip(refs, refs[1:]):
+                    yield ('conexao', f"osm:{a}", f"osm:{b}", round(_haversine_km(coords_nos[a], coords_nos[b]), 2), not unico_sentido)
+        if elem.tag in ('node', 'way', 'relation'):
+            elem.clear(); raiz.clear()  # a raiz guardaria os elementos já lidos (vazios) até ao fim
+
+LEITORES = {'.csv': ler_csv, '.geojson': ler_geojson, '.json': ler_geojson, '.osm': ler_osm, '.xml': ler_osm}
+
+# --- Carregamento em lotes ---
+
+class Importador:
+    """
+    Consome registos e grava-os em lotes transacionais. Os nomes são
+    resolvidos para ids em memória (pré-carregados da BD), os pontos já
+    existentes são saltados e as conexões repetidas são ignoradas pelo
+    índice único idx_origem_destino.
+    """
+    def __init__(self, tamanho_lote: int = TAMANHO_LOTE):
+        self.tamanho_lote = tamanho_lote
+        self.ids = db_manager.obter_ids_pontos_db()
+        self._pontos, self._conexoes = {}, []
+        self.pontos_inseridos = self.conexoes_inseridas = 0
+
+    def importar(self, caminho: str, recomecar: bool = False):
+        leitor = LEITORES.get(os.path.splitext(caminho)[1].lower())
+        if leitor is None: raise ValueError(f"Formato não suportado: {caminho}")
+        ficheiro_progresso = caminho + ".progresso"
+        ja_gravados = 0 if recomecar else _ler_progresso(ficheiro_progresso)
+        if ja_gravados: print(f"A retomar {caminho} a partir do registo {ja_gravados}.")
+
+        inicio, n = time.perf_counter(), 0
+        for n, registo in enumerate(leitor(caminho), start=1):
+            if n <= ja_gravados: continue
+            self._adicionar(registo)
+            if len(self._pontos) >= self.tamanho_lote or len(self._conexoes) >= self.tamanho_lote:
+                self._gravar(); _escrever_progresso(ficheiro_progresso, n)
+                decorrido = time.perf_counter() - inicio
+                print(f"  {n} registos ({(n - ja_gravados) / decorrido:,.0f} registos/s)")
+        self._gravar()
+        if os.path.exists(ficheiro_progresso): os.remove(ficheiro_progresso)
+        decorrido = max(time.perf_counter() - inicio, 1e-9)
+        print(f"{caminho}: {n} registos em {decorrido:.1f}s ({(n - ja_gravados) / decorrido:,.0f} registos/s); "
+              f"{self.pontos_inseridos} pontos e {self.conexoes_inseridas} conexões inseridos no total.")
+
+    def _adicionar(self, registo):
+        if registo[0] == 'ponto':
+            _, nome, tipo, x, y = registo
+            if nome not in self.ids: self._pontos[nome] = (nome, tipo, x, y)
+        else:
+            _, origem, destino, dist, bidir = registo
+            for nome in (origem, destino):
+                if nome not in self.ids and nome not in self._pontos: self._pontos[nome] = (nome, 'Cidade', None, None)
+            self._conexoes.append((origem, destino, dist, bidir))
+
+    def _gravar(self):
+        if self._pontos:
+            novos = db_manager.adicionar_pontos_bulk(list(self._pontos.values()))
+            if novos is None: raise RuntimeError("Falha ao gravar lote de pontos.")
+            self.ids.update(novos); self.pontos_inseridos += len(novos); self._pontos = {}
+        if self._conexoes:
+            linhas = [(self.ids[o], self.ids[d], dist, bidir) for o, d, dist, bidir in self._conexoes if o != d]
+            inseridas = db_manager.adicionar_conexoes_bulk(linhas, ignorar_duplicados=True)
+            if inseridas < 0: raise RuntimeError("Falha ao gravar lote de conexões.")
+            self.conexoes_inseridas += inseridas; self._conexoes = []
+
+def _ler_progresso(caminho: str) -> int:
+    try:
+        with open(caminho, encoding='utf-8') as f: return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def _escrever_progresso(caminho: str, n: int):
+    with open(caminho + ".tmp", 'w', encoding='utf-8') as f: f.write(str(n))
+    os.replace(caminho + ".tmp", caminho)
+
+def _tipo(valor) -> str:
+    return valor if valor in TIPOS_PONTO else 'Cidade'
+
+def _inteiro(valor):
+    return int(float(valor)) if valor not in (None, '') else None
+
+def _escalar(grau: float) -> int:
+    return int(round(grau * ESCALA_COORD))
+
+def _haversine_km(a, b) -> float:
+    lon1, lat1, lon2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Importa redes rodoviárias (CSV/GeoJSON/OSM) para a base de dados.")
+    parser.add_argument('ficheiros', nargs='+')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE)
+    parser.add_argument('--recomecar', action='store_true', help="ignora o progresso guardado de uma execução anterior")
+    args = parser.parse_args()
+    importador = Importador(args.lote)
+    for ficheiro in args.ficheiros:
+        try: importador.importar(ficheiro, args.recomecar)
+        except (OSError, ValueError, RuntimeError) as err:
+            print(f"Erro ao importar {ficheiro}: {err}"); sys.exit(1)
@@ -0,0 +1,175 @@
+"""
+Índice espacial em grelha uniforme sobre coordenadas do mapa.
+Cada item (um ponto ou o retângulo envolvente de uma conexão) fica registado nas
+células que toca, por isso inserir, mover e remover só mexem nessas células e as
+consultas (retângulo, raio, k mais próximos) só visitam as células da região pedida,
+em vez de percorrer todos os pontos. Uma grelha aguenta bem alterações incrementais
+(ao contrário de uma k-d tree, que desequilibra); o lado da célula é escolhido na
+construção para ~POR_CELULA pontos por célula.
+Não é thread-safe: ou é usado só pela thread do Tk, ou construído numa thread de
+trabalho e entregue já pronto.
+"""
+import heapq
+import math
+
+LADO_PADRAO = 60.0
+POR_CELULA = 2            # ocupação média pretendida ao escolher o lado da célula
+MAX_CELULAS_ITEM = 256    # itens maiores (p.ex. conexões muito longas) ficam numa lista sempre verificada
+
+class IndiceEspacial:
+    """
+    Chaves arbitrárias (hasháveis) associadas a um retângulo (x0, y0, x1, y1); um ponto
+    é um retângulo degenerado. As distâncias são até ao retângulo (zero se dentro).
+    """
+    def __init__(self, lado_celula: float = LADO_PADRAO):
+        self.lado = float(lado_celula)
+        self._celulas = {}      # (i, j) -> set de chaves
+        self._caixas = {}       # chave -> (x0, y0, x1, y1)
+        self._grandes = set()
+        self._limites = None    # (i0, j0, i1, j1) das células já usadas; só cresce
+
+    @classmethod
+    def de_pontos(cls, pontos, lado_celula: float = None):
+        """Índice com os (chave, x, y) de `pontos`; sem `lado_celula`, escolhe-o pela densidade."""
+        pontos = list(pontos)
+        indice = cls(lado_celula or _lado_para(pontos))
+        for chave, x, y in pontos: indice.inserir(chave, x, y)
+        return indice
+
+    @classmethod
+    def de_atributos(cls, atributos, lado_celula: float = None):
+        """Índice dos pontos de node_attributes (nome -> {'coords': (x, y), ...}) que têm coords."""
+        return cls.de_pontos(((nome, a['coords'][0], a['coords'][1]) for nome, a in atributos.items()
+                              if a.get('coords') and None not in a['coords']), lado_celula)
+
+    def __len__(self):
+        return len(self._caixas)
+
+    def __contains__(self, chave):
+        return chave in self._caixas
+
+    def caixa(self, chave):
+        return self._caixas.get(chave)
+
+    # --- Alterações ---
+
+    def inserir(self, chave, x0: float, y0: float, x1: float = None, y1: float = None):
+        """Regista `chave` no ponto (x0, y0) ou no retângulo até (x1, y1); se já existir, é movida."""
+        if chave in self._caixas: self.remover(chave)
+        if x1 is None: x1, y1 = x0, y0
+        caixa = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        self._caixas[chave] = caixa
+        i0, j0, i1, j1 = self._celulas_de(caixa)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > MAX_CELULAS_ITEM: self._grandes.add(chave); return
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                self._celulas.setdefault((i, j), set()).add(chave)
+        lim = self._limites
+        self._limites = (i0, j0, i1, j1) if lim is None else (min(lim[0], i0), min(lim[1], j0), max(lim[2], i1), max(lim[3], j1))
+
+    def remover(self, chave):
+        caixa = self._caixas.pop(chave, None)
+        if caixa is None: return
+        if chave in self._grandes: self._grandes.discard(chave); return
+        i0, j0, i1, j1 = self._celulas_de(caixa)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                celula = self._celulas.get((i, j))
+                if celula is None: continue
+                celula.discard(chave)
+                if not celula: del self._celulas[(i, j)]
+
+    # --- Consultas ---
+
+    def no_retangulo(self, x0: float, y0: float, x1: float, y1: float):
+        """Conjunto das chaves cujo retângulo interseta (x0, y0)-(x1, y1)."""
+        encontrados = {c for c in self._grandes if _intersetam(self._caixas[c], x0, y0, x1, y1)}
+        if self._limites is None: return encontrados
+        i0, j0, i1, j1 = self._celulas_de((x0, y0, x1, y1))
+        li0, lj0, li1, lj1 = self._limites
+        i0, j0, i1, j1 = max(i0, li0), max(j0, lj0), min(i1, li1), min(j1, lj1)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._celulas):  # região maior que o ocupado: percorre as células que existem
+            celulas = (c for (i, j), c in self._celulas.items() if i0 <= i <= i1 and j0 <= j <= j1)
+        else:
+            celulas = (self._celulas.get((i, j)) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1))
+        caixas = self._caixas
+        for celula in celulas:
+            if not celula: continue
+            for chave in celula:
+                if chave not in encontrados and _intersetam(caixas[chave], x0, y0, x1, y1): encontrados.add(chave)
+        return encontrados
+
+    def no_raio(self, x: float, y: float, raio: float, filtro=None):
+        """[(distância, chave)] a até `raio` de (x, y), da mais próxima para a mais afastada."""
+        candidatos = self.no_retangulo(x - raio, y - raio, x + raio, y + raio)
+        resultado = [(_distancia(self._caixas[c], x, y), c) for c in candidatos if filtro is None or filtro(c)]
+        return sorted((r for r in resultado if r[0] <= raio), key=lambda r: r[0])
+
+    def mais_proximos(self, x: float, y: float, k: int = 1, filtro=None):
+        """
+        [(distância, chave)] das `k` chaves mais próximas de (x, y) (só as aceites por
+        `filtro`, se dado), da mais próxima para a mais afastada. Procura em anéis de
+        células à volta de (x, y) e pára quando o anel seguinte já não pode ter nada mais perto.
+        """
+        if k <= 0: return []
+        melhores, vistos, caixas = [], set(), self._caixas  # heap de máximos: (-distância, n, chave)
+        def considerar(chave):
+            if chave in vistos: return
+            vistos.add(chave)
+            if filtro is not None and not filtro(chave): return
+            d = _distancia(caixas[chave], x, y)
+            if len(melhores) < k: heapq.heappush(melhores, (-d, len(vistos), chave))
+            elif d < -melhores[0][0]: heapq.heapreplace(melhores, (-d, len(vistos), chave))
+        for chave in self._grandes: considerar(chave)
+        if self._limites is not None:
+            ci, cj = self._celula(x), self._celula(y)
+            li0, lj0, li1, lj1 = self._limites
+            primeiro = max(li0 - ci, ci - li1, lj0 - cj, cj - lj1, 0)
+            ultimo = max(ci - li0, li1 - ci, cj - lj0, lj1 - cj)
+            for r in range(primeiro, ultimo + 1):
+                # Qualquer célula do anel r fica a pelo menos (r - 1) * lado de (x, y)
+                if len(melhores) == k and -melhores[0][0] < (r - 1) * self.lado: break
+                for celula in self._anel(ci, cj, r):
+                    for chave in celula: considerar(chave)
+        return sorted(((-d, chave) for d, _, chave in melhores), key=lambda r: r[0])
+
+    # --- Internos ---
+
+    def _celula(self, v: float) -> int:
+        return math.floor(v / self.lado)
+
+    def _celulas_de(self, caixa):
+        return self._celula(caixa[0]), self._celula(caixa[1]), self._celula(caixa[2]), self._celula(caixa[3])
+
+    def _anel(self, ci: int, cj: int, r: int):
+        """Células ocupadas à distância (de Chebyshev, em células) exatamente `r` de (ci, cj)."""
+        li0, lj0, li1, lj1 = self._limites
+        celulas = self._celulas
+        if r == 0:
+            celula = celulas.get((ci, cj))
+            if celula: yield celula
+            return
+        for j in (cj - r, cj + r):
+            if lj0 <= j <= lj1:
+                for i in range(max(ci - r, li0), min(ci + r, li1) + 1):
+                    celula = celulas.get((i, j))
+                    if celula: yield celula
+        for i in (ci - r, ci + r):
+            if li0 <= i <= li1:
+                for j in range(max(cj - r + 1, lj0), min(cj + r - 1, lj1) + 1):
+                    celula = celulas.get((i, j))
+                    if celula: yield celula
+
+def _lado_para(pontos) -> float:
+    if len(pontos) < 2: return LADO_PADRAO
+    xs, ys = [p[1] for p in pontos], [p[2] for p in pontos]
+    area = max(max(xs) - min(xs), 1.0) * max(max(ys) - min(ys), 1.0)
+    return max(1.0, math.sqrt(area * POR_CELULA / len(pontos)))
+
+def _intersetam(caixa, x0, y0, x1, y1) -> bool:
+    return caixa[0] <= x1 and caixa[2] >= x0 and caixa[1] <= y1 and caixa[3] >= y0
+
+def _distancia(caixa, x, y) -> float:
+    dx = caixa[0] - x if x < caixa[0] else (x - caixa[2] if x > caixa[2] else 0.0)
+    dy = caixa[1] - y if y < caixa[1] else (y - caixa[3] if y > caixa[3] else 0.0)
+    return math.hypot(dx, dy)
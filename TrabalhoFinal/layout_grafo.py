@@ -0,0 +1,244 @@
+"""
+Layout do mapa por forças (Fruchterman–Reingold): as conexões puxam os pontos e
+todos os pontos se repelem. Com NumPy a repulsão usa uma aproximação Barnes–Hut
+sobre uma quadtree em grelha (nível a nível, vetorizada): cada ponto interage
+com os centros de massa das células bem separadas e só com os pontos das células
+vizinhas um a um, O(n log n) por iteração. Sem NumPy usa a variante em grelha do
+artigo original (repulsão só até 2k), em Python puro. As duas chegam a escalas
+diferentes, por isso um layout completo é no fim escalado pela conexão mediana e
+as coordenadas ficam da mesma ordem de grandeza com ou sem NumPy.
+Corre fora da thread do Tk; os resultados são coordenadas inteiras, como na BD.
+"""
+import collections
+import math
+import random
+from graph import Graph
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional; sem ele usa-se a versão em Python puro
+    np = None
+
+DISTANCIA_IDEAL = 60.0       # k: distância ideal entre pontos ligados (unidades do mapa)
+ITERACOES = 80
+ITERACOES_INCREMENTAIS = 30
+MARGEM = 25                  # canto superior esquerdo do layout completo
+LOTE_PONTOS = 4096           # pontos por lote na repulsão (limita a memória)
+
+def calcular_layout(graph: Graph, coords=None, iteracoes: int = ITERACOES, semente=None):
+    """
+    {nome: (x, y)} para todos os pontos de `graph`. `coords` (nome -> (x, y)) dá as
+    posições de partida; as que faltarem são aleatórias. O resultado começa em MARGEM.
+    """
+    rng = random.Random(semente)
+    nomes, pos, arestas = _preparar(graph, coords or {}, (), rng)
+    if not nomes: return {}
+    lado = DISTANCIA_IDEAL * math.sqrt(max(len(nomes), 1))
+    for i, p in enumerate(pos):
+        if p is None: pos[i] = (rng.uniform(0, lado), rng.uniform(0, lado))
+    pos = _iterar(pos, list(range(len(nomes))), arestas, iteracoes, lado / 10, rng)
+    return _normalizar(nomes, _escalar(pos, arestas), range(len(nomes)))
+
+def posicionar_novos(graph: Graph, coords, novos, arestas_extra=(), iteracoes: int = ITERACOES_INCREMENTAIS, semente=None):
+    """
+    {nome: (x, y)} só para `novos` (e para pontos de `graph` sem coords), sem mexer nos
+    restantes: cada um começa no centro dos vizinhos já posicionados e depois as forças
+    afinam a posição. Nomes em `novos` ainda fora do grafo e `arestas_extra` (pares de
+    nomes) entram como se lá estivessem, p.ex. pontos e conexões de uma sincronização.
+    """
+    rng = random.Random(semente)
+    nomes, pos, arestas = _preparar(graph, coords, novos, rng, arestas_extra)
+    novos = set(novos)
+    moveis = [i for i, nome in enumerate(nomes) if pos[i] is None or nome in novos]
+    if not moveis: return {}
+    for i in moveis: pos[i] = None
+    fixos = len(nomes) - len(moveis)
+    _colocar_junto_dos_vizinhos(pos, arestas, rng)
+    if fixos: t0 = DISTANCIA_IDEAL
+    else: t0 = DISTANCIA_IDEAL * math.sqrt(len(nomes)) / 10  # nada posicionado: é um layout completo
+    pos = _iterar(pos, moveis, arestas, iteracoes, t0, rng)
+    if not fixos: return _normalizar(nomes, _escalar(pos, arestas), moveis)
+    return {nomes[i]: (int(round(pos[i][0])), int(round(pos[i][1]))) for i in moveis}
+
+# --- Preparação ---
+
+def _preparar(graph, coords, novos, rng, arestas_extra=()):
+    """(nomes, posições ou None, arestas (u, v, fator)) com ids densos; pontos coincidentes são afastados um pouco."""
+    nomes = list(graph.names)
+    ids = {nome: i for i, nome in enumerate(nomes)}
+    for nome in list(novos) + [n for par in arestas_extra for n in par]:
+        if nome not in ids: ids[nome] = len(nomes); nomes.append(nome)
+    pos = []
+    for nome in nomes:
+        c = coords.get(nome)
+        if isinstance(c, dict): c = c.get('coords')
+        pos.append(None if c is None or None in c else (c[0] + rng.uniform(-0.5, 0.5), c[1] + rng.uniform(-0.5, 0.5)))
+    origens, destinos, pesos, _ = graph.edges()
+    arestas = [(origens[e], destinos[e], pesos[e]) for e in range(len(pesos)) if origens[e] != destinos[e]]
+    arestas += [(ids[u], ids[v], None) for u, v in arestas_extra if u != v]
+    conhecidos = sorted(w for _, _, w in arestas if w)
+    mediana = conhecidos[len(conhecidos) // 2] if conhecidos else 1.0
+    # Conexões mais longas (em km) puxam menos, ficando mais compridas no mapa
+    arestas = [(u, v, min(4.0, max(0.25, w / mediana)) if w else 1.0) for u, v, w in arestas]
+    return nomes, pos, arestas
+
+def _colocar_junto_dos_vizinhos(pos, arestas, rng):
+    """Dá posição aos pontos None, em largura a partir dos já posicionados (centro dos vizinhos + ruído)."""
+    vizinhos = collections.defaultdict(list)
+    for u, v, _ in arestas: vizinhos[u].append(v); vizinhos[v].append(u)
+    colocados = [p for p in pos if p is not None]
+    if colocados:
+        xs, ys = [p[0] for p in colocados], [p[1] for p in colocados]
+        caixa = (min(xs), min(ys), max(max(xs) - min(xs), DISTANCIA_IDEAL), max(max(ys) - min(ys), DISTANCIA_IDEAL))
+    else:
+        lado = DISTANCIA_IDEAL * math.sqrt(len(pos)); caixa = (0.0, 0.0, lado, lado)
+    fila = collections.deque(i for i, p in enumerate(pos) if p is None and any(pos[j] is not None for j in vizinhos[i]))
+    while True:
+        while fila:
+            i = fila.popleft()
+            if pos[i] is not None: continue
+            perto = [pos[j] for j in vizinhos[i] if pos[j] is not None]
+            x, y = sum(p[0] for p in perto) / len(perto), sum(p[1] for p in perto) / len(perto)
+            pos[i] = (x + rng.uniform(-1, 1) * DISTANCIA_IDEAL / 2, y + rng.uniform(-1, 1) * DISTANCIA_IDEAL / 2)
+            fila.extend(j for j in vizinhos[i] if pos[j] is None)
+        # Componentes sem nenhum ponto posicionado: um ponto ao acaso na caixa, e continua a partir dele
+        livre = next((i for i, p in enumerate(pos) if p is None), None)
+        if livre is None: return
+        pos[livre] = (caixa[0] + rng.uniform(0, caixa[2]), caixa[1] + rng.uniform(0, caixa[3]))
+        fila.extend(j for j in vizinhos[livre] if pos[j] is None)
+
+def _escalar(pos, arestas):
+    """
+    Num layout completo, amplia/reduz tudo para que a conexão mediana meça DISTANCIA_IDEAL.
+    As duas variantes chegam a equilíbrios de escala diferente (a de Python puro corta a
+    repulsão a 2k, a de NumPy não); assim as coordenadas guardadas não dependem de haver NumPy.
+    """
+    comprimentos = sorted(math.hypot(pos[u][0] - pos[v][0], pos[u][1] - pos[v][1]) for u, v, _ in arestas)
+    mediana = comprimentos[len(comprimentos) // 2] if comprimentos else 0.0
+    if mediana <= 0: return pos
+    fator = DISTANCIA_IDEAL / mediana
+    return [(x * fator, y * fator) for x, y in pos]
+
+def _normalizar(nomes, pos, indices):
+    min_x, min_y = min(p[0] for p in pos), min(p[1] for p in pos)
+    return {nomes[i]: (int(round(pos[i][0] - min_x + MARGEM)), int(round(pos[i][1] - min_y + MARGEM))) for i in indices}
+
+def _iterar(pos, moveis, arestas, iteracoes, t0, rng):
+    if np is not None: return _iterar_np(pos, moveis, arestas, iteracoes, t0)
+    return _iterar_py(pos, moveis, arestas, iteracoes, t0)
+
+# --- NumPy: Fruchterman–Reingold com repulsão Barnes–Hut ---
+
+def _iterar_np(pos, moveis, arestas, iteracoes, t0):
+    k = DISTANCIA_IDEAL
+    p = np.array(pos, dtype=np.float64)
+    moveis = np.asarray(moveis, dtype=np.int64)
+    e = np.array(arestas, dtype=np.float64).reshape(-1, 3)
+    u, v, fator = e[:, 0].astype(np.int64), e[:, 1].astype(np.int64), e[:, 2]
+    movel = np.zeros(len(p), dtype=bool); movel[moveis] = True
+    util = movel[u] | movel[v]
+    u, v, fator = u[util], v[util], fator[util]
+    n = len(p)
+    for it in range(iteracoes):
+        t = t0 * (1 - it / iteracoes) + 0.5
+        forca = np.zeros((n, 2))
+        forca[moveis] = _repulsao_np(p, moveis, k)
+        d = p[u] - p[v]
+        dist = np.sqrt((d * d).sum(1)) + 1e-9
+        f = d * (dist / (k * fator))[:, None]  # atração d²/k na direção da aresta
+        for eixo in (0, 1):
+            forca[:, eixo] += np.bincount(v, f[:, eixo], n) - np.bincount(u, f[:, eixo], n)
+        desl = forca[moveis]
+        norma = np.sqrt((desl * desl).sum(1)) + 1e-9
+        p[moveis] += desl * (np.minimum(norma, t) / norma)[:, None]
+    return [tuple(x) for x in p.tolist()]
+
+def _repulsao_np(p, moveis, k):
+    """Forças de repulsão k²/d sobre os pontos `moveis` (array len(moveis) x 2)."""
+    n = len(p)
+    minimo = p.min(0)
+    lado = max(float((p.max(0) - minimo).max()), 1e-6) * (1 + 1e-9)
+    rel = (p - minimo) / lado
+    profundidade = max(2, min(10, math.ceil(math.log(max(n, 4) / 2, 4))))  # ~2 pontos por célula no fundo
+    niveis = []
+    for nivel in range(2, profundidade + 1):
+        g = 1 << nivel
+        cel = np.minimum((rel * g).astype(np.int64), g - 1)
+        plano = cel[:, 1] * g + cel[:, 0]
+        massa = np.bincount(plano, minlength=g * g).astype(np.float64)
+        ocupada = massa > 0
+        cx = np.divide(np.bincount(plano, p[:, 0], g * g), massa, out=np.zeros(g * g), where=ocupada)
+        cy = np.divide(np.bincount(plano, p[:, 1], g * g), massa, out=np.zeros(g * g), where=ocupada)
+        niveis.append((g, cel, plano, massa, cx, cy))
+    g, cel_fundo, plano_fundo, massa_fundo, _, _ = niveis[-1]
+    ordem = np.argsort(plano_fundo, kind='stable')
+    contagem = massa_fundo.astype(np.int64)
+    inicio = np.cumsum(contagem) - contagem
+
+    k2 = k * k
+    filhos = np.array([(ox, oy) for ox in range(-2, 4) for oy in range(-2, 4)])   # filhos dos 3x3 vizinhos da mãe
+    vizinhas = np.array([(ox, oy) for ox in (-1, 0, 1) for oy in (-1, 0, 1)])
+    forca = np.zeros((len(moveis), 2))
+    for a in range(0, len(moveis), LOTE_PONTOS):
+        lote = moveis[a:a + LOTE_PONTOS]
+        pl = p[lote]
+        f = np.zeros((len(lote), 2))
+        # Campo distante: filhos dos vizinhos da célula-mãe que não são vizinhos da célula do ponto
+        for g, cel, _, massa, cx, cy in niveis:
+            c = cel[lote]
+            ax = 2 * (c[:, :1] >> 1) + filhos[:, 0]; ay = 2 * (c[:, 1:] >> 1) + filhos[:, 1]
+            ok = (ax >= 0) & (ax < g) & (ay >= 0) & (ay < g) & ((np.abs(ax - c[:, :1]) > 1) | (np.abs(ay - c[:, 1:]) > 1))
+            celula = np.where(ok, ay * g + ax, 0)
+            dx, dy = pl[:, :1] - cx[celula], pl[:, 1:] - cy[celula]
+            peso = np.where(ok, k2 * massa[celula], 0.0) / (dx * dx + dy * dy + 1e-9)
+            f[:, 0] += (dx * peso).sum(1); f[:, 1] += (dy * peso).sum(1)
+        # Campo próximo: ponto a ponto com as células vizinhas (e a própria) do nível mais fino
+        c = cel_fundo[lote]
+        ax, ay = c[:, :1] + vizinhas[:, 0], c[:, 1:] + vizinhas[:, 1]
+        ok = (ax >= 0) & (ax < g) & (ay >= 0) & (ay < g)
+        linhas = np.nonzero(ok)[0]
+        celula = (ay * g + ax)[ok]
+        quantos = contagem[celula]
+        total = int(quantos.sum())
+        if total:
+            rep_linhas = np.repeat(linhas, quantos)
+            desloc = np.arange(total) - np.repeat(np.cumsum(quantos) - quantos, quantos)
+            outros = ordem[np.repeat(inicio[celula], quantos) + desloc]
+            d = pl[rep_linhas] - p[outros]
+            peso = (outros != lote[rep_linhas]) * k2 / ((d * d).sum(1) + 1e-9)
+            for eixo in (0, 1):
+                f[:, eixo] += np.bincount(rep_linhas, d[:, eixo] * peso, len(lote))
+        forca[a:a + len(lote)] = f
+    return forca
+
+# --- Python puro: variante em grelha (repulsão só até 2k) ---
+
+def _iterar_py(pos, moveis, arestas, iteracoes, t0):
+    k = DISTANCIA_IDEAL; k2, alcance = k * k, 2 * k
+    pos = [list(p) for p in pos]
+    movel = set(moveis)
+    arestas = [a for a in arestas if a[0] in movel or a[1] in movel]
+    for it in range(iteracoes):
+        t = t0 * (1 - it / iteracoes) + 0.5
+        grelha = collections.defaultdict(list)
+        for i, (x, y) in enumerate(pos): grelha[(int(x // alcance), int(y // alcance))].append(i)
+        forca = {i: [0.0, 0.0] for i in moveis}
+        for i in moveis:
+            x, y = pos[i]; gx, gy = int(x // alcance), int(y // alcance); fi = forca[i]
+            for ox in (-1, 0, 1):
+                for oy in (-1, 0, 1):
+                    for j in grelha.get((gx + ox, gy + oy), ()):
+                        if j == i: continue
+                        dx, dy = x - pos[j][0], y - pos[j][1]
+                        d2 = dx * dx + dy * dy + 1e-9
+                        if d2 < alcance * alcance: fi[0] += dx * k2 / d2; fi[1] += dy * k2 / d2
+        for u, v, fator in arestas:
+            dx, dy = pos[u][0] - pos[v][0], pos[u][1] - pos[v][1]
+            s = math.hypot(dx, dy) / (k * fator)
+            if u in forca: forca[u][0] -= dx * s; forca[u][1] -= dy * s
+            if v in forca: forca[v][0] += dx * s; forca[v][1] += dy * s
+        for i, (fx, fy) in forca.items():
+            norma = math.hypot(fx, fy) + 1e-9
+            passo = min(norma, t) / norma
+            pos[i][0] += fx * passo; pos[i][1] += fy * passo
+    return [tuple(p) for p in pos]
@@ -0,0 +1,96 @@
+"""
+Matriz de distâncias muitos-para-muitos (ex.: camiões x origens de cargas).
+Em vez de N x M consultas ponto-a-ponto, faz uma busca por origem que pára
+assim que todos os destinos pedidos estão assentados.
+Com processos > 1 usa um Pool: o programa que a chama deve fazer
+multiprocessing.freeze_support() no seu `if __name__ == "__main__":` (como
+gui.py e rotas_em_lote.py), senão o executável congelado abre-se de novo em cada processo.
+"""
+import array
+import heapq
+import math
+import multiprocessing
+from graph import Graph
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional; sem ele a matriz é uma lista de array('d')
+    np = None
+
+_CSR = None  # adjacência partilhada pelos processos trabalhadores
+
+def distance_matrix(graph: Graph, sources, targets, processos: int = 1):
+    """
+    Matriz densa len(sources) x len(targets) com as distâncias mínimas
+    (math.inf quando não há caminho ou o ponto não existe no grafo).
+    Com processos > 1 as origens são repartidas por um Pool de processos.
+    Retorna numpy.ndarray se o NumPy estiver instalado.
+    """
+    ids_origem = [graph.index_of(s) for s in sources]
+    ids_alvo = [graph.index_of(t) for t in targets]
+    tarefas = [(s, ids_alvo) for s in ids_origem]
+    csr = graph.csr()
+
+    if processos and processos > 1 and len(tarefas) > 1:
+        with multiprocessing.Pool(processos, initializer=inicializar_trabalhador, initargs=(csr,)) as pool:
+            linhas = pool.map(_linha, tarefas, chunksize=max(1, len(tarefas) // (4 * processos)))
+    else:
+        inicializar_trabalhador(csr)
+        linhas = [_linha(t) for t in tarefas]
+
+    if np is not None:
+        matriz = np.empty((len(sources), len(targets)))
+        for i, l in enumerate(linhas): matriz[i] = np.frombuffer(l, dtype=np.float64)
+        return matriz
+    return linhas
+
+def distancias_camioes_para_cargas(graph: Graph, camioes, cargas, processos: int = 1):
+    """
+    Recebe linhas de obter_todos_camioes_db() e obter_todas_cargas_db_detalhado();
+    considera camiões com localização e cargas 'Pendente'/'Agendada'.
+    Retorna (ids_camioes, ids_cargas, matriz) com a distância de cada camião à origem de cada carga.
+    """
+    camioes = [c for c in camioes if c.get('nome_localizacao_atual')]
+    cargas = [c for c in cargas if c.get('estado') in ('Pendente', 'Agendada')]
+    matriz = distance_matrix(graph, [c['nome_localizacao_atual'] for c in camioes],
+                            [c['nome_ponto_origem'] for c in cargas], processos)
+    return [c['id'] for c in camioes], [c['id'] for c in cargas], matriz
+
+def inicializar_trabalhador(csr):
+    """Initializer do Pool: guarda a adjacência CSR uma vez por processo."""
+    global _CSR
+    _CSR = csr
+
+def csr_do_trabalhador():
+    return _CSR
+
+def _linha(tarefa):
+    origem, alvos = tarefa
+    linha = array.array('d', [math.inf]) * len(alvos)
+    if origem is None:
+        return linha
+    dist, _ = dijkstra_multialvo(_CSR, origem, {a for a in alvos if a is not None})
+    for j, alvo in enumerate(alvos):
+        if alvo is not None: linha[j] = dist.get(alvo, math.inf)
+    return linha
+
+def dijkstra_multialvo(csr, start, alvos):
+    """
+    Dijkstra a partir de `start` que termina quando todos os `alvos` estão
+    assentados. Retorna (distâncias, predecessores); as distâncias dos alvos
+    alcançáveis são finais, as dos restantes vértices podem ser provisórias.
+    """
+    offsets, targets, weights = csr
+    distances = {start: 0}
+    predecessors = {start: -1}
+    por_assentar = set(alvos)
+    fila = [(0, start)]
+    while fila and por_assentar:
+        d, u = heapq.heappop(fila)
+        if d > distances[u]: continue
+        por_assentar.discard(u)
+        for i in range(offsets[u], offsets[u + 1]):
+            v, nd = targets[i], d + weights[i]
+            if nd < distances.get(v, math.inf):
+                distances[v] = nd; predecessors[v] = u; heapq.heappush(fila, (nd, v))
+    return distances, predecessors
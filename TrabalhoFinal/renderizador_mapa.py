@@ -0,0 +1,296 @@
+"""
+Desenho do mapa num tk.Canvas em modo retido.
+Cada ponto e cada conexão guardam os ids dos seus itens no canvas e as alterações
+(ponto ou conexão nova, caminho destacado) só mexem nos itens afetados, em vez de
+apagar e recriar tudo. Só é criado o que está dentro da vista (culling, com consultas
+a índices espaciais em vez de percorrer o mapa todo); a roda do rato faz zoom,
+arrastar desloca a vista e um duplo clique ajusta a vista ao mapa.
+Com pouco zoom os nomes não são desenhados e os pontos ficam mais pequenos.
+As coordenadas dos pontos (atributos[nome]['coords']) são coordenadas do mapa:
+ecrã = mapa * escala + origem.
+"""
+import tkinter as tk
+from indice_espacial import IndiceEspacial
+
+RAIO_NO = 15
+TAMANHO_LETRA = 8
+ESCALA_MIN, ESCALA_MAX = 0.02, 8.0
+ESCALA_MIN_ROTULOS = 0.6  # abaixo desta escala os nomes dos pontos não são desenhados
+FATOR_ZOOM = 1.2
+CORES_TIPO = {"Depósito": "khaki", "Cidade": "lightgreen"}
+COR_PADRAO = "skyblue"
+
+class RenderizadorMapa:
+    """
+    `atributos` é o dict nome -> {'coords': (x, y), 'type': ...} da GUI (partilhado,
+    não copiado): depois de o alterar chama-se adicionar_no/adicionar_aresta/atualizar.
+    O índice espacial dos pontos dado a carregar() também é de quem chama, que o
+    mantém a par de `atributos` antes dessas chamadas; o das conexões é interno.
+    Com desenhar_arestas=False só são desenhados os pontos e o caminho destacado.
+    Usar apenas a partir da thread do Tk.
+    """
+    def __init__(self, canvas: tk.Canvas, cor_destaque: str = "orangered", desenhar_arestas: bool = True,
+                 mensagem_vazio: str = "Grafo vazio", raio: int = RAIO_NO, tamanho_letra: int = TAMANHO_LETRA):
+        self.canvas = canvas
+        self.cor_destaque = cor_destaque
+        self.desenhar_arestas = desenhar_arestas
+        self.mensagem_vazio = mensagem_vazio
+        self.raio, self.fonte = raio, ("Arial", tamanho_letra, "bold")
+        self.graph, self.atributos = None, {}
+        self.indice, self._indice_arestas = IndiceEspacial(), IndiceEspacial()
+        self.escala, self.origem_x, self.origem_y = 1.0, 0.0, 0.0
+        self._nos = {}             # nome -> [oval, texto ou None]
+        self._arestas = {}         # (vid menor, vid maior) -> linha
+        self._chaves_arestas = set()
+        self._destaque, self._destaque_nos = [], set()
+        self._destaque_arestas = []  # pares (u, v) de uma rede destacada (p.ex. entre depósitos)
+        self._agendado, self._recoordenar = False, False
+        self._arrasto = None
+        canvas.bind("<ButtonPress-1>", self._ao_premir)
+        canvas.bind("<B1-Motion>", self._ao_arrastar)
+        canvas.bind("<Double-Button-1>", lambda e: self.ajustar_vista())
+        canvas.bind("<MouseWheel>", lambda e: self.zoom(FATOR_ZOOM if e.delta > 0 else 1 / FATOR_ZOOM, e.x, e.y))
+        canvas.bind("<Button-4>", lambda e: self.zoom(FATOR_ZOOM, e.x, e.y))
+        canvas.bind("<Button-5>", lambda e: self.zoom(1 / FATOR_ZOOM, e.x, e.y))
+        canvas.bind("<Configure>", lambda e: self._agendar())
+
+    # --- Conteúdo ---
+
+    def carregar(self, graph, atributos, indice: IndiceEspacial = None):
+        """
+        Substitui o mapa todo (carga completa ou novo layout); mantém o zoom e a posição da
+        vista. `indice` é o índice espacial dos pontos de `atributos` (criado se não for dado).
+        """
+        self.graph, self.atributos = graph, atributos
+        self.indice = indice if indice is not None else IndiceEspacial.de_atributos(atributos)
+        self.canvas.delete("mapa")
+        self._nos, self._arestas = {}, {}
+        self._chaves_arestas = set()
+        if graph is not None and self.desenhar_arestas:
+            origens, destinos, _, _ = graph.edges()
+            self._chaves_arestas = {(u, v) if u < v else (v, u) for u, v in zip(origens, destinos)}
+        self._indexar_arestas()
+        self._destaque, self._destaque_nos, self._destaque_arestas = [], set(), []
+        self._atualizar_visiveis()
+
+    def mostrar(self, atributos, caminho=None):
+        """Mostra só estes pontos (sem conexões de fundo) e, se dado, o caminho destacado."""
+        self.carregar(None, atributos)
+        self.destacar(caminho)
+
+    def adicionar_no(self, nome):
+        self._atualizar_mensagem()
+        if nome not in self._nos and self._no_visivel(nome, self._vista()): self._criar_no(nome); self._ordenar_camadas()
+
+    def adicionar_aresta(self, u, v):
+        if self.graph is None or not self.desenhar_arestas: return
+        a, b = self.graph.index_of(u), self.graph.index_of(v)
+        if a is None or b is None: return
+        chave = (a, b) if a < b else (b, a)
+        if chave in self._chaves_arestas: return
+        self._chaves_arestas.add(chave)
+        self._indexar_aresta(chave)
+        if self._aresta_visivel(chave, self._vista()): self._criar_aresta(chave); self._ordenar_camadas()
+
+    def atualizar(self):
+        """Reposiciona e repinta os itens visíveis (coordenadas ou tipos de pontos alterados)."""
+        self._indexar_arestas()  # as caixas das conexões dependem das coords dos pontos
+        self._atualizar_visiveis(recoordenar=True)
+        for nome in self._nos: self._pintar_no(nome)
+
+    def destacar(self, caminho=None, arestas=None):
+        """
+        Destaca o caminho (lista de nomes) com setas e/ou uma rede (pares (u, v), sem
+        setas); None ou [] limpa o destaque anterior.
+        """
+        anteriores = self._destaque_nos
+        self._destaque = list(caminho or [])
+        self._destaque_arestas = list(arestas or [])
+        self._destaque_nos = set(self._destaque).union(*self._destaque_arestas)
+        for nome in anteriores ^ self._destaque_nos:
+            if nome in self._nos: self._pintar_no(nome)
+        self._desenhar_destaque()
+        self._ordenar_camadas()
+
+    def ponto_em(self, x: float, y: float):
+        """Nome do ponto desenhado sob (x, y) do ecrã (o mais próximo, se vários), ou None."""
+        raio = self._raio_ecra() / self.escala
+        proximos = self.indice.no_raio((x - self.origem_x) / self.escala, (y - self.origem_y) / self.escala, raio,
+                                       filtro=lambda nome: nome in self.atributos)
+        return proximos[0][1] if proximos else None
+
+    # --- Vista ---
+
+    def zoom(self, fator: float, x: float, y: float):
+        """Zoom centrado no ponto (x, y) do ecrã."""
+        escala = min(ESCALA_MAX, max(ESCALA_MIN, self.escala * fator))
+        if escala == self.escala: return
+        self.origem_x = x - (x - self.origem_x) * escala / self.escala
+        self.origem_y = y - (y - self.origem_y) * escala / self.escala
+        self.escala = escala
+        self._agendar(recoordenar=True)
+
+    def deslocar(self, dx: float, dy: float):
+        self.origem_x += dx; self.origem_y += dy
+        self.canvas.move("mapa", dx, dy)  # os itens existentes movem-se no Tk; falta só criar/apagar os das margens
+        self._agendar()
+
+    def ajustar_vista(self, margem: int = 20):
+        """Escolhe escala e origem para que todos os pontos caibam no canvas."""
+        coords = [a['coords'] for a in self.atributos.values() if a.get('coords') and None not in a['coords']]
+        if not coords: return
+        largura, altura = self._tamanho()
+        xs, ys = [c[0] for c in coords], [c[1] for c in coords]
+        largura_mapa, altura_mapa = max(xs) - min(xs) or 1, max(ys) - min(ys) or 1
+        self.escala = min(ESCALA_MAX, max(ESCALA_MIN, min((largura - 2 * margem) / largura_mapa, (altura - 2 * margem) / altura_mapa)))
+        self.origem_x = (largura - largura_mapa * self.escala) / 2 - min(xs) * self.escala
+        self.origem_y = (altura - altura_mapa * self.escala) / 2 - min(ys) * self.escala
+        self._agendar(recoordenar=True)
+
+    def _ao_premir(self, evento):
+        self._arrasto = (evento.x, evento.y)
+
+    def _ao_arrastar(self, evento):
+        if self._arrasto is None: return
+        dx, dy = evento.x - self._arrasto[0], evento.y - self._arrasto[1]
+        self._arrasto = (evento.x, evento.y)
+        self.deslocar(dx, dy)
+
+    def _agendar(self, recoordenar: bool = False):
+        """Junta várias alterações de vista (roda do rato, arrasto) numa só atualização."""
+        self._recoordenar = self._recoordenar or recoordenar
+        if not self._agendado:
+            self._agendado = True
+            self.canvas.after_idle(self._executar_agendado)
+
+    def _executar_agendado(self):
+        self._agendado = False
+        recoordenar, self._recoordenar = self._recoordenar, False
+        self._atualizar_visiveis(recoordenar)
+
+    # --- Internos ---
+
+    def _tamanho(self):
+        largura, altura = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if largura <= 1: largura, altura = int(self.canvas.cget('width')), int(self.canvas.cget('height'))
+        return largura, altura
+
+    def _vista(self):
+        """Retângulo visível em coordenadas do mapa, com uma margem do raio dos pontos."""
+        largura, altura = self._tamanho()
+        margem = self.raio / self.escala
+        return (-self.origem_x / self.escala - margem, -self.origem_y / self.escala - margem,
+                (largura - self.origem_x) / self.escala + margem, (altura - self.origem_y) / self.escala + margem)
+
+    def _ecra(self, coords):
+        return coords[0] * self.escala + self.origem_x, coords[1] * self.escala + self.origem_y
+
+    def _coords(self, nome):
+        atributos = self.atributos.get(nome)
+        coords = atributos.get('coords') if atributos else None
+        return None if coords is None or None in coords else coords
+
+    def _no_visivel(self, nome, vista):
+        coords = self._coords(nome)
+        return coords is not None and vista[0] <= coords[0] <= vista[2] and vista[1] <= coords[1] <= vista[3]
+
+    def _aresta_visivel(self, chave, vista):
+        names = self.graph.names
+        a, b = self._coords(names[chave[0]]), self._coords(names[chave[1]])
+        if a is None or b is None: return False
+        return (min(a[0], b[0]) <= vista[2] and max(a[0], b[0]) >= vista[0] and
+                min(a[1], b[1]) <= vista[3] and max(a[1], b[1]) >= vista[1])
+
+    def _indexar_arestas(self):
+        self._indice_arestas = IndiceEspacial(self.indice.lado)
+        for chave in self._chaves_arestas: self._indexar_aresta(chave)
+
+    def _indexar_aresta(self, chave):
+        names = self.graph.names
+        a, b = self._coords(names[chave[0]]), self._coords(names[chave[1]])
+        if a is not None and b is not None: self._indice_arestas.inserir(chave, a[0], a[1], b[0], b[1])
+
+    def _com_rotulos(self):
+        return self.escala >= ESCALA_MIN_ROTULOS
+
+    def _raio_ecra(self):
+        return max(2.0, self.raio * min(1.0, self.escala))
+
+    def _atualizar_visiveis(self, recoordenar: bool = False):
+        """Cria os itens que entraram na vista, apaga os que saíram e, se pedido, reposiciona os restantes."""
+        self._atualizar_mensagem()
+        vista = self._vista()
+        visiveis = {nome for nome in self.indice.no_retangulo(*vista) if nome in self.atributos}
+        for nome in [n for n in self._nos if n not in visiveis]:
+            for item in self._nos.pop(nome):
+                if item is not None: self.canvas.delete(item)
+        for nome in visiveis:
+            if nome not in self._nos: self._criar_no(nome)
+            elif recoordenar: self._posicionar_no(nome)
+
+        if self.graph is not None:
+            arestas_visiveis = self._indice_arestas.no_retangulo(*vista)
+            for chave in [c for c in self._arestas if c not in arestas_visiveis]:
+                self.canvas.delete(self._arestas.pop(chave))
+            for chave in arestas_visiveis:
+                linha = self._arestas.get(chave)
+                if linha is None: self._criar_aresta(chave)
+                elif recoordenar: self.canvas.coords(linha, *self._pontas_aresta(chave))
+        if recoordenar or self._destaque_arestas: self._desenhar_destaque()  # a rede destacada também tem culling
+        self._ordenar_camadas()
+
+    def _atualizar_mensagem(self):
+        self.canvas.delete("mensagem")
+        if not self.atributos:
+            largura, altura = self._tamanho()
+            self.canvas.create_text(largura / 2, altura / 2, text=self.mensagem_vazio, font=("Arial", 12), fill="grey", tags="mensagem")
+
+    def _criar_no(self, nome):
+        x, y = self._ecra(self._coords(nome))
+        r = self._raio_ecra()
+        oval = self.canvas.create_oval(x - r, y - r, x + r, y + r, outline="black", width=1.5, tags=("mapa", "no"))
+        texto = self.canvas.create_text(x, y, text=nome, font=self.fonte, tags=("mapa", "rotulo")) if self._com_rotulos() else None
+        self._nos[nome] = [oval, texto]
+        self._pintar_no(nome)
+
+    def _posicionar_no(self, nome):
+        itens = self._nos[nome]
+        x, y = self._ecra(self._coords(nome))
+        r = self._raio_ecra()
+        self.canvas.coords(itens[0], x - r, y - r, x + r, y + r)
+        if self._com_rotulos():
+            if itens[1] is None:
+                itens[1] = self.canvas.create_text(x, y, text=nome, font=self.fonte, tags=("mapa", "rotulo")); self._pintar_no(nome)
+            else: self.canvas.coords(itens[1], x, y)
+        elif itens[1] is not None:
+            self.canvas.delete(itens[1]); itens[1] = None
+
+    def _pintar_no(self, nome):
+        oval, texto = self._nos[nome]
+        destacado = nome in self._destaque_nos
+        cor = self.cor_destaque if destacado else CORES_TIPO.get(self.atributos[nome].get('type'), COR_PADRAO)
+        self.canvas.itemconfigure(oval, fill=cor)
+        if texto is not None: self.canvas.itemconfigure(texto, fill="white" if destacado else "black")
+
+    def _pontas_aresta(self, chave):
+        names = self.graph.names
+        return (*self._ecra(self._coords(names[chave[0]])), *self._ecra(self._coords(names[chave[1]])))
+
+    def _criar_aresta(self, chave):
+        self._arestas[chave] = self.canvas.create_line(*self._pontas_aresta(chave), fill="lightgrey", width=1.5, tags=("mapa", "aresta"))
+
+    def _desenhar_destaque(self):
+        self.canvas.delete("destaque")
+        for u, v in zip(self._destaque, self._destaque[1:]):
+            a, b = self._coords(u), self._coords(v)
+            if a is None or b is None: continue
+            self.canvas.create_line(*self._ecra(a), *self._ecra(b), fill="blue", width=3, arrow=tk.LAST, tags=("mapa", "destaque"))
+        vista = self._vista()
+        for u, v in self._destaque_arestas:
+            a, b = self._coords(u), self._coords(v)
+            if a is None or b is None or not (min(a[0], b[0]) <= vista[2] and max(a[0], b[0]) >= vista[0] and
+                                              min(a[1], b[1]) <= vista[3] and max(a[1], b[1]) >= vista[1]): continue
+            self.canvas.create_line(*self._ecra(a), *self._ecra(b), fill=self.cor_destaque, width=3, tags=("mapa", "destaque"))
+
+    def _ordenar_camadas(self):
+        for tag in ("destaque", "no", "rotulo"): self.canvas.tag_raise(tag)
@@ -0,0 +1,89 @@
+"""
+Cálculo em lote das rotas de todas as cargas 'Pendente'/'Agendada'.
+As cargas são agrupadas por ponto de origem e cada origem distinta faz uma
+única busca (que pára ao assentar todos os destinos do grupo). As buscas são
+repartidas por um Pool de processos que recebe uma cópia só de leitura da
+adjacência CSR do grafo.
+Uso: python rotas_em_lote.py [saida.csv] [--processos N]
+"""
+import collections
+import csv
+import math
+import multiprocessing
+import time
+from graph import Graph
+from matriz_distancias import inicializar_trabalhador, csr_do_trabalhador, dijkstra_multialvo
+
+ESTADOS_A_ROTEAR = ('Pendente', 'Agendada')
+
+def calcular_rotas_cargas(graph: Graph, cargas, processos: int = 1):
+    """
+    `cargas` são linhas de obter_todas_cargas_db_detalhado(); as que não estão
+    em ESTADOS_A_ROTEAR são ignoradas. Retorna {carga_id: (distância, caminho)},
+    com (math.inf, []) quando não há rota ou o ponto não está no grafo.
+    """
+    grupos = collections.defaultdict(list)
+    resultados = {}
+    for c in cargas:
+        if c.get('estado') not in ESTADOS_A_ROTEAR: continue
+        origem, destino = graph.index_of(c.get('nome_ponto_origem')), graph.index_of(c.get('nome_ponto_destino'))
+        if origem is None or destino is None: resultados[c['id']] = (math.inf, []); continue
+        grupos[origem].append((c['id'], destino))
+
+    tarefas = [(origem, [d for _, d in lista]) for origem, lista in grupos.items()]
+    csr = graph.csr()
+    if processos and processos > 1 and len(tarefas) > 1:
+        with multiprocessing.Pool(processos, initializer=inicializar_trabalhador, initargs=(csr,)) as pool:
+            caminhos_por_origem = pool.map(_rotas_da_origem, tarefas, chunksize=max(1, len(tarefas) // (4 * processos)))
+    else:
+        inicializar_trabalhador(csr)
+        caminhos_por_origem = [_rotas_da_origem(t) for t in tarefas]
+
+    names = graph.names
+    for (origem, lista), rotas in zip(grupos.items(), caminhos_por_origem):
+        for carga_id, destino in lista:
+            dist, ids = rotas[destino]
+            resultados[carga_id] = (dist, [names[v] for v in ids])
+    return resultados
+
+def _rotas_da_origem(tarefa):
+    """Executa no trabalhador: caminhos (em ids) da origem para cada destino do grupo."""
+    origem, destinos = tarefa
+    dist, pred = dijkstra_multialvo(csr_do_trabalhador(), origem, set(destinos))
+    rotas = {}
+    for destino in destinos:
+        if destino not in dist: rotas[destino] = (math.inf, []); continue
+        caminho, atual = [], destino
+        while atual != -1:
+            caminho.append(atual); atual = pred[atual]
+        caminho.reverse()
+        rotas[destino] = (dist[destino], caminho)
+    return rotas
+
+def escrever_resultados_csv(caminho_ficheiro: str, cargas, resultados):
+    por_id = {c['id']: c for c in cargas}
+    with open(caminho_ficheiro, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.writer(f, delimiter=';')
+        escritor.writerow(['carga_id', 'descricao', 'origem', 'destino', 'distancia_km', 'rota'])
+        for carga_id, (dist, caminho) in sorted(resultados.items()):
+            c = por_id.get(carga_id, {})
+            escritor.writerow([carga_id, c.get('descricao', ''), c.get('nome_ponto_origem', ''), c.get('nome_ponto_destino', ''),
+                               '' if dist == math.inf else f"{dist:.2f}", ' -> '.join(caminho)])
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    import argparse
+    import database_manager as db_manager
+    parser = argparse.ArgumentParser(description="Calcula as rotas de todas as cargas pendentes/agendadas.")
+    parser.add_argument('saida', nargs='?', default='rotas_cargas.csv')
+    parser.add_argument('--processos', type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    grafo = Graph.from_id_rows(db_manager.iterar_tabela_db('pontos', ('id', 'nome'), ordem='nome'),
+                               db_manager.iterar_tabela_db('conexoes', db_manager.COLUNAS_ARESTAS, ordem='id'))
+    cargas = db_manager.obter_cargas_filtradas_db(estados=ESTADOS_A_ROTEAR, limite=None) or []
+    inicio = time.perf_counter()
+    resultados = calcular_rotas_cargas(grafo, cargas, args.processos)
+    escrever_resultados_csv(args.saida, cargas, resultados)
+    sem_rota = sum(1 for d, _ in resultados.values() if d == math.inf)
+    print(f"{len(resultados)} cargas roteadas ({sem_rota} sem rota) em {time.perf_counter() - inicio:.2f}s -> {args.saida}")
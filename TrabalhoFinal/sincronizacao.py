@@ -0,0 +1,103 @@
+"""
+Sincronização incremental com a base de dados.
+Os triggers de database_manager registam cada INSERT/UPDATE/DELETE na tabela
+`alteracoes`; o SincronizadorBD lê apenas as entradas novas desde a última
+sincronização e devolve, por tabela, as linhas alteradas e os ids removidos.
+Os ids de `alteracoes` são atribuídos no INSERT mas só ficam visíveis no COMMIT, por
+isso uma transação mais lenta pode aparecer depois de ids maiores já lidos: os ids em
+falta abaixo do último visto ficam como lacunas e voltam a ser pedidos durante
+PRAZO_LACUNAS segundos (uma transação desfeita deixa uma lacuna que nunca se preenche).
+"""
+from collections import namedtuple
+import threading
+import time
+import database_manager as db_manager
+
+Delta = namedtuple('Delta', ['alterados', 'removidos'])  # linhas (dicts) atuais, ids removidos
+
+PRAZO_LACUNAS = 60.0     # segundos durante os quais um id em falta ainda pode aparecer
+MAX_LACUNAS = 1000       # acima disto esquecem-se as lacunas mais antigas
+JANELA_MARCACAO = 1000   # ids antes da marca onde se procuram lacunas (transações ainda abertas)
+
+_OBTER_POR_IDS = {
+    'pontos': db_manager.obter_pontos_por_ids_db,
+    'conexoes': db_manager.obter_conexoes_por_ids_db,
+    'camioes': db_manager.obter_camioes_por_ids_db,
+    'motoristas': db_manager.obter_motoristas_por_ids_db,
+    'cargas': db_manager.obter_cargas_por_ids_db_detalhado,
+}
+
+class SincronizadorBD:
+    """Pode ser usado a partir de threads de trabalho; as chamadas são serializadas."""
+    def __init__(self):
+        self.ultimo_id = None  # maior id já lido
+        self.ativo = None   # verificado na primeira marcação
+        self._lacunas = {}  # id em falta abaixo de ultimo_id -> instante até ao qual é pedido
+        self._lock = threading.Lock()
+
+    def marcar(self):
+        """
+        Regista a posição atual do registo de alterações. Chamar ANTES de uma
+        carga completa: o que mudar durante a carga volta a ser aplicado na
+        sincronização seguinte (as deltas são idempotentes).
+        """
+        with self._lock:
+            if self.ativo is None: self.ativo = db_manager.alteracoes_ativas_db()
+            self.ultimo_id, self._lacunas = None, {}
+            if not self.ativo: return
+            ultimo = db_manager.obter_ultima_alteracao_db()
+            if ultimo is None: return
+            inicio = max(0, ultimo - JANELA_MARCACAO)
+            recentes = db_manager.obter_alteracoes_db(inicio)
+            if recentes is None: return
+            self._registar_lacunas(inicio, {e[0] for e in recentes if e[0] <= ultimo}, ultimo)
+            self.ultimo_id = ultimo
+
+    def alteracoes(self):
+        """
+        {tabela: Delta} com as tabelas que mudaram desde a última chamada, ou
+        None se a sincronização incremental não estiver disponível (sem
+        triggers, sem marcar() prévio ou erro de BD) e for precisa uma carga completa.
+        """
+        with self._lock:
+            return self._alteracoes()
+
+    def _alteracoes(self):
+        if self.ultimo_id is None: return None
+        agora = time.monotonic()
+        self._lacunas = {i: prazo for i, prazo in self._lacunas.items() if prazo > agora}
+        entradas = db_manager.obter_alteracoes_db(self.ultimo_id, sorted(self._lacunas))
+        if entradas is None: return None
+        if not entradas: return {}
+
+        ultima_op = {}  # (tabela, id) -> operação mais recente
+        for _, tabela, registo_id, operacao in entradas:
+            ultima_op[(tabela, registo_id)] = operacao
+        por_tabela = {}
+        for (tabela, registo_id), operacao in ultima_op.items():
+            if tabela not in _OBTER_POR_IDS: continue
+            alterar, remover = por_tabela.setdefault(tabela, (set(), set()))
+            (remover if operacao == 'D' else alterar).add(registo_id)
+
+        deltas = {}
+        for tabela, (alterar, remover) in por_tabela.items():
+            linhas = _OBTER_POR_IDS[tabela](sorted(alterar))
+            if linhas is None: return None
+            encontrados = {l['id'] for l in linhas}
+            deltas[tabela] = Delta(linhas, remover | (alterar - encontrados))  # alterado e já removido entretanto
+        ids = {e[0] for e in entradas}
+        for i in ids: self._lacunas.pop(i, None)
+        novos = {i for i in ids if i > self.ultimo_id}
+        if novos:
+            fim = max(novos)
+            self._registar_lacunas(self.ultimo_id, novos, fim)
+            self.ultimo_id = fim
+        return deltas
+
+    def _registar_lacunas(self, desde_id, vistos, ate_id):
+        """Os ids em (desde_id, ate_id] que não estão em `vistos` passam a lacunas."""
+        prazo = time.monotonic() + PRAZO_LACUNAS
+        for i in range(desde_id + 1, ate_id + 1):
+            if i not in vistos: self._lacunas[i] = prazo
+        if len(self._lacunas) > MAX_LACUNAS:
+            for i in sorted(self._lacunas)[:len(self._lacunas) - MAX_LACUNAS]: del self._lacunas[i]
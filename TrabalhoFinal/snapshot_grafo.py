@@ -0,0 +1,92 @@
+"""
+Snapshot binário do mapa (nomes, ids da BD, tipos, coordenadas, arestas e
+adjacência CSR) para arrancar sem reconstruir o grafo a partir da BD.
+O ficheiro guarda o carimbo de obter_versao_mapa_db(); só é usado enquanto o
+carimbo da BD for o mesmo.
+
+Formato: cabeçalho fixo seguido de secções contíguas alinhadas a 8 bytes, cada
+uma o conteúdo bruto de um array na ordem de bytes nativa. A leitura faz mmap
+do ficheiro e copia cada secção diretamente para um array (sem parsing).
+"""
+import array
+import mmap
+import os
+import struct
+import sys
+from graph import Graph
+
+MAGIC = b'GRAFOSNP'
+VERSAO_FORMATO = 1
+TIPOS_PONTO = ('Depósito', 'Cidade')
+SEM_COORD = -2**31
+_CABECALHO = struct.Struct('<8sBB2xIIIII')  # magic, versão, ordem de bytes, n, m, arcos, tam. carimbo, tam. nomes
+_ORDEM = 0 if sys.byteorder == 'little' else 1
+
+def guardar_snapshot(caminho_ficheiro: str, graph: Graph, node_attributes, carimbo: str):
+    names = graph.names
+    tipos = array.array('b', (_indice_tipo(node_attributes.get(n, {}).get('type')) for n in names))
+    ids, coords = array.array('i'), array.array('i')
+    for n in names:
+        attrs = node_attributes.get(n, {})
+        ids.append(attrs.get('id') or 0)
+        x, y = attrs.get('coords') or (None, None)
+        coords.append(SEM_COORD if x is None else int(x)); coords.append(SEM_COORD if y is None else int(y))
+    edge_u, edge_v, edge_w, edge_bidir = graph.edges()
+    offsets, targets, weights = graph.csr()
+    bytes_carimbo = carimbo.encode('utf-8')
+    bytes_nomes = "\x00".join(names).encode('utf-8')
+
+    temporario = caminho_ficheiro + ".tmp"
+    with open(temporario, 'wb') as f:
+        f.write(_CABECALHO.pack(MAGIC, VERSAO_FORMATO, _ORDEM, len(names), len(edge_u), len(targets),
+                                len(bytes_carimbo), len(bytes_nomes)))
+        for seccao in (bytes_carimbo, bytes_nomes, ids, tipos, coords, edge_u, edge_v, edge_w, edge_bidir,
+                       offsets, targets, weights):
+            dados = seccao if isinstance(seccao, bytes) else seccao.tobytes()
+            f.write(dados); f.write(b'\x00' * (-len(dados) % 8))
+    os.replace(temporario, caminho_ficheiro)
+
+def carregar_snapshot(caminho_ficheiro: str, carimbo: str):
+    """Retorna (graph, node_attributes), ou None se o ficheiro faltar, for inválido ou de outra versão do mapa."""
+    try:
+        with open(caminho_ficheiro, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _ler(mm, carimbo)
+    except (OSError, ValueError, struct.error, UnicodeDecodeError):
+        return None
+
+def _ler(mm, carimbo: str):
+    magic, versao, ordem, n, m, arcos, tam_carimbo, tam_nomes = _CABECALHO.unpack_from(mm, 0)
+    if magic != MAGIC or versao != VERSAO_FORMATO or ordem != _ORDEM:
+        return None
+    vista = memoryview(mm)
+    pos = _CABECALHO.size
+    def seccao(tamanho):
+        nonlocal pos
+        inicio, pos = pos, pos + tamanho + (-tamanho % 8)
+        if inicio + tamanho > len(mm): raise ValueError("snapshot truncado")
+        return vista[inicio:inicio + tamanho]
+    def ler_array(typecode, quantidade):
+        a = array.array(typecode)
+        a.frombytes(seccao(quantidade * a.itemsize))
+        return a
+    try:
+        if bytes(seccao(tam_carimbo)).decode('utf-8') != carimbo:
+            return None
+        texto_nomes = bytes(seccao(tam_nomes)).decode('utf-8')
+        names = texto_nomes.split("\x00") if n else []
+        ids, tipos, coords = ler_array('i', n), ler_array('b', n), ler_array('i', 2 * n)
+        edges = (ler_array('i', m), ler_array('i', m), ler_array('d', m), ler_array('b', m))
+        csr = (ler_array('i', n + 1), ler_array('i', arcos), ler_array('d', arcos))
+    finally:
+        vista.release()
+    if len(names) != n:
+        return None
+    node_attributes = {}
+    for i, nome in enumerate(names):
+        x, y = coords[2 * i], coords[2 * i + 1]
+        node_attributes[nome] = {'id': ids[i], 'type': TIPOS_PONTO[tipos[i]],
+                                 'coords': (None if x == SEM_COORD else x, None if y == SEM_COORD else y)}
+    return Graph.from_arrays(names, *edges, csr=csr), node_attributes
+
+def _indice_tipo(tipo) -> int:
+    return TIPOS_PONTO.index(tipo) if tipo in TIPOS_PONTO else TIPOS_PONTO.index('Cidade')
@@ -0,0 +1,60 @@
+"""
+Verificação com EXPLAIN de que as consultas frequentes de database_manager usam
+os índices criados pelas migrações (corre initialize_database() primeiro).
+É uma ferramenta manual, não um teste: precisa de um MySQL com dados e nada a corre
+automaticamente, por isso deve ser corrida depois de mexer nas consultas de
+database_manager ou nas MIGRACOES. Correr sobre uma BD com dados representativos:
+numa tabela quase vazia o MySQL pode preferir ler a tabela toda.
+Uso: python verificar_indices.py   (código de saída 1 se alguma consulta não usar o índice esperado)
+"""
+import datetime
+import sys
+import mysql.connector
+import database_manager as db_manager
+
+# (descrição, tabela/alias no EXPLAIN, (sql, parâmetros), índices aceites)
+CONSULTAS = (
+    ("camiões disponíveis", 'ca', db_manager._sql_camioes_por_estado(('Disponível',)), {'idx_camioes_estado'}),
+    ("motoristas disponíveis", 'motoristas', db_manager._sql_motoristas_por_estado(('Disponível',)), {'idx_motoristas_estado'}),
+    ("página de cargas", 'cg', db_manager._sql_cargas_filtradas(), {'idx_cargas_data'}),
+    ("página seguinte de cargas", 'cg', db_manager._sql_cargas_filtradas(apos=(datetime.datetime.now(), 1 << 30)), {'idx_cargas_data'}),
+    ("cargas por estado", 'cg', db_manager._sql_cargas_filtradas(estados=('Pendente',)), {'idx_cargas_estado_data'}),
+    ("cargas aptas para entrega", 'cg', db_manager._sql_cargas_filtradas(estados=('Pendente', 'Agendada'), limite=None),
+     {'idx_cargas_estado_data', 'idx_cargas_estado_entrega'}),
+    ("cargas por cliente", 'cg', db_manager._sql_cargas_filtradas(cliente="A"), {'idx_cargas_cliente_data'}),
+    ("cargas por origem", 'cg', db_manager._sql_cargas_filtradas(origem_id=1), {'idx_cargas_origem_data'}),
+    ("cargas por destino", 'cg', db_manager._sql_cargas_filtradas(destino_id=1), {'idx_cargas_destino_data'}),
+    ("cargas atrasadas", 'cg', db_manager._sql_cargas_atrasadas(datetime.date.today(), db_manager.ESTADOS_CARGA_EM_ABERTO),
+     {'idx_cargas_estado_entrega'}),
+    ("conexões de entrada", 'c', db_manager._sql_conexoes_de_entrada(1), {'idx_conexoes_destino_origem'}),
+)
+
+def explicar(cursor, sql: str, params: tuple, alias: str):
+    """Linha do EXPLAIN referente a `alias` (dict com 'key', 'type', 'rows', 'Extra', ...)."""
+    cursor.execute("EXPLAIN " + sql, params)
+    linhas = cursor.fetchall()
+    return next((l for l in linhas if l.get('table') == alias), None)
+
+def verificar():
+    """Lista de (descrição, ok, índice usado, tipo de acesso, linhas estimadas)."""
+    resultados = []
+    with db_manager.db_cursor(dictionary=True) as (conn, cursor):
+        if not cursor: raise RuntimeError("Sem ligação à base de dados.")
+        cursor.execute("ANALYZE TABLE pontos, conexoes, camioes, motoristas, cargas"); cursor.fetchall()
+        for descricao, alias, (sql, params), aceites in CONSULTAS:
+            linha = explicar(cursor, sql, params, alias) or {}
+            usados = set((linha.get('key') or "").split(","))  # index_merge junta vários índices
+            resultados.append((descricao, bool(usados & aceites), linha.get('key'), linha.get('type'), linha.get('rows')))
+    return resultados
+
+if __name__ == "__main__":
+    if not db_manager.initialize_database(): sys.exit("Falha ao inicializar a base de dados.")
+    try: resultados = verificar()
+    except (RuntimeError, mysql.connector.Error) as err: sys.exit(f"Erro: {err}")
+    print(f"\n{'consulta':<28} {'índice':<30} {'acesso':<8} {'linhas':>8}")
+    for descricao, ok, chave, tipo, linhas in resultados:
+        print(f"{descricao:<28} {str(chave):<30} {str(tipo):<8} {str(linhas):>8}  {'OK' if ok else 'FALHA'}")
+    falhas = [r[0] for r in resultados if not r[1]]
+    if falhas:
+        print(f"\n{len(falhas)} consulta(s) sem o índice esperado: {', '.join(falhas)}"); sys.exit(1)
+    print("\nTodas as consultas usam os índices esperados.")